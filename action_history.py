@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Хранение истории действий по месяцам.
+
+В основной БД (таблица actions) остаются только действия последних
+hot_days дней, поэтому файл основной БД не растет вместе с историей и
+помещается в кэш страниц. Более старые действия переносятся в архивные
+БД по месяцам (<БД>.actions-ГГГГ-ММ.db) и одновременно учитываются в
+дневных итогах action_rollups (питомец, день, тип действия, число).
+Архивы старше retention_months удаляются целиком, итоги остаются.
+
+Перенос идет частями по возрастанию id, как и запись действий, поэтому
+индекс по времени не нужен. Повторный запуск после сбоя безопасен:
+строки копируются в архив с сохранением id (повторная вставка
+игнорируется), а удаление из actions и учет в итогах фиксируются одной
+транзакцией.
+
+Поэтому итоги точно указывают, в архивах каких месяцев есть действия
+питомца: чтение истории открывает только эти архивы, а для питомца без
+перенесенных действий не открывает ни одного.
+"""
+
+import glob
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List
+
+from pet_manager import utcnow
+
+HOT_DAYS = 30
+RETENTION_MONTHS = 12
+CHUNK_SIZE = 50000
+
+ARCHIVE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS actions (
+        id INTEGER PRIMARY KEY,
+        pet_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        action_type TEXT NOT NULL,
+        timestamp TIMESTAMP
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_actions_pet_timestamp ON actions (pet_id, timestamp)',
+]
+
+SQL_OLDEST_ACTIONS = '''
+    SELECT id, pet_id, user_id, action_type, timestamp FROM actions
+    WHERE id > ? ORDER BY id LIMIT ?
+'''
+
+SQL_ARCHIVE_ACTIONS = '''
+    INSERT OR IGNORE INTO actions (id, pet_id, user_id, action_type, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+SQL_DELETE_ARCHIVED = '''
+    DELETE FROM actions WHERE id BETWEEN ? AND ? AND timestamp < ?
+'''
+
+SQL_ADD_ROLLUPS = '''
+    INSERT INTO action_rollups (pet_id, day, action_type, count) VALUES (?, ?, ?, ?)
+    ON CONFLICT (pet_id, day, action_type) DO UPDATE SET count = count + excluded.count
+'''
+
+SQL_ARCHIVED_RECENT_ACTIONS = '''
+    SELECT * FROM actions WHERE pet_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?
+'''
+
+SQL_ARCHIVED_ACTIONS_BEFORE = '''
+    SELECT * FROM actions WHERE pet_id = ? AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC LIMIT ?
+'''
+
+ARCHIVE_MONTH = re.compile(r'\.actions-(\d{4}-\d{2})\.db$')
+
+# Как долго список архивов берется из памяти, если итоги называют
+# месяц, которого в нем нет (архив мог создать другой процесс), секунд
+ARCHIVE_LIST_TTL = 5.0
+
+# Путь основной БД -> (время чтения каталога, {месяц: путь})
+_archive_lists: Dict[str, tuple] = {}
+_archive_lists_lock = threading.Lock()
+
+
+def archive_path(db_path: str, month: str) -> str:
+    """Файл архива месяца ГГГГ-ММ рядом с основной БД"""
+    base, _ = os.path.splitext(db_path)
+    return f"{base}.actions-{month}.db"
+
+
+def list_archives(db_path: str) -> Dict[str, str]:
+    """Архивы основной БД: месяц -> путь, по возрастанию месяца"""
+    return _cached_archives(db_path, max_age=0.0)
+
+
+def _cached_archives(db_path: str, max_age: float = None) -> Dict[str, str]:
+    """Список архивов из памяти, если он прочитан не раньше max_age
+    секунд назад (None - без ограничения)"""
+    with _archive_lists_lock:
+        cached = _archive_lists.get(db_path)
+    if cached is not None and (max_age is None or time.monotonic() - cached[0] < max_age):
+        return cached[1]
+    archives = _scan_archives(db_path)
+    with _archive_lists_lock:
+        _archive_lists[db_path] = (time.monotonic(), archives)
+    return archives
+
+
+def _scan_archives(db_path: str) -> Dict[str, str]:
+    base, _ = os.path.splitext(db_path)
+    archives = {}
+    for path in glob.glob(glob.escape(base) + '.actions-*.db'):
+        match = ARCHIVE_MONTH.search(path)
+        if match:
+            archives[match.group(1)] = path
+    return dict(sorted(archives.items()))
+
+
+def _open_archive(db_path: str, month: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(archive_path(db_path, month))
+    for statement in ARCHIVE_SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def _month(moment: datetime, months_back: int = 0) -> str:
+    """Месяц (ГГГГ-ММ), отстоящий от moment на months_back назад"""
+    index = moment.year * 12 + moment.month - 1 - months_back
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def compact_actions(db, now: datetime = None, hot_days: int = HOT_DAYS,
+                    retention_months: int = RETENTION_MONTHS,
+                    chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Перенос действий старше hot_days в архивы и удаление старых архивов.
+
+    retention_months - сколько месяцев архивов хранить, считая текущий;
+    None хранит архивы бессрочно.
+    """
+    if now is None:
+        now = utcnow()
+    # Сравнение строк: отметки в формате CURRENT_TIMESTAMP упорядочены
+    cutoff = (now - timedelta(days=hot_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    started = time.monotonic()
+    result = {'archived': 0, 'rollups': 0, 'chunks': 0, 'dropped_archives': []}
+    if db.action_log is not None:
+        db.action_log.flush()
+
+    archives = {}
+    try:
+        last_id = 0
+        while True:
+            with db.pool.connection() as conn:
+                rows = conn.execute(SQL_OLDEST_ACTIONS, (last_id, chunk_size)).fetchall()
+            # Действия пишутся по возрастанию времени: первое свежее
+            # действие означает, что старые в этой части закончились
+            old = []
+            for row in rows:
+                if row[4] >= cutoff:
+                    break
+                old.append(row)
+            if not old:
+                break
+
+            by_month = {}
+            for row in old:
+                by_month.setdefault(row[4][:7], []).append(row)
+            for month, month_rows in by_month.items():
+                archive = archives.get(month)
+                if archive is None:
+                    archive = archives[month] = _open_archive(db.db_path, month)
+                with archive:
+                    archive.executemany(SQL_ARCHIVE_ACTIONS, month_rows)
+
+            rollups = Counter((pet_id, timestamp[:10], action_type)
+                              for _, pet_id, _, action_type, timestamp in old)
+            params = [(*key, count) for key, count in rollups.items()]
+
+            def write(conn, first=old[0][0], last=old[-1][0], params=params):
+                conn.execute(SQL_DELETE_ARCHIVED, (first, last, cutoff))
+                conn.executemany(SQL_ADD_ROLLUPS, params)
+
+            db._write(write)
+            result['archived'] += len(old)
+            result['rollups'] += len(params)
+            result['chunks'] += 1
+            last_id = old[-1][0]
+            if len(old) < len(rows) or len(rows) < chunk_size:
+                break
+    finally:
+        for archive in archives.values():
+            archive.close()
+
+    if retention_months is not None:
+        oldest_kept = _month(now, retention_months - 1)
+        for month, path in list_archives(db.db_path).items():
+            if month < oldest_kept:
+                os.remove(path)
+                result['dropped_archives'].append(month)
+
+    # Список архивов, запомненный для чтения истории, устарел
+    with _archive_lists_lock:
+        _archive_lists.pop(db.db_path, None)
+
+    result['seconds'] = time.monotonic() - started
+    return result
+
+
+def archived_actions(db_path: str, pet_id: int, limit: int, before: tuple = None,
+                     months: Iterable[str] = None) -> List[Dict]:
+    """Действия питомца из архивов от новых к старым, строго раньше
+    before=(timestamp, id); месяцы новее before не открываются.
+
+    months - месяцы (ГГГГ-ММ), в архивах которых есть действия питомца
+    (по action_rollups); открываются только их архивы. None - все архивы.
+    """
+    if months is None:
+        archives = list_archives(db_path)
+        months = list(archives)
+    else:
+        archives = _cached_archives(db_path)
+        if any(month not in archives for month in months):
+            # Архив создан после чтения списка, или архив старого месяца
+            # удален по сроку хранения: каталог перечитывается не чаще
+            # раза в ARCHIVE_LIST_TTL
+            archives = _cached_archives(db_path, ARCHIVE_LIST_TTL)
+
+    actions = []
+    for month in sorted(months, reverse=True):
+        path = archives.get(month)
+        if path is None or (before is not None and month > before[0][:7]):
+            continue
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        except sqlite3.OperationalError:
+            # Архив удален после чтения списка
+            continue
+        try:
+            if before is None:
+                cursor = conn.execute(SQL_ARCHIVED_RECENT_ACTIONS, (pet_id, limit - len(actions)))
+            else:
+                cursor = conn.execute(SQL_ARCHIVED_ACTIONS_BEFORE,
+                                      (pet_id, *before, limit - len(actions)))
+            columns = [description[0] for description in cursor.description]
+            actions.extend(dict(zip(columns, row)) for row in cursor.fetchall())
+        finally:
+            conn.close()
+        if len(actions) >= limit:
+            break
+    return actions
+
+if __name__ == '__main__':
+    # Обслуживающий проход: python action_history.py [путь к БД]
+    from database import Database
+
+    db = Database(sys.argv[1] if len(sys.argv) > 1 else 'pets.db')
+    retention = os.environ.get('ACTIONS_RETENTION_MONTHS', str(RETENTION_MONTHS))
+    try:
+        result = compact_actions(
+            db,
+            hot_days=int(os.environ.get('ACTIONS_HOT_DAYS', HOT_DAYS)),
+            retention_months=int(retention) if retention else None,
+        )
+    finally:
+        db.close()
+    print(f"✅ История действий сжата: перенесено {result['archived']}, "
+          f"итогов {result['rollups']}, удалено архивов {len(result['dropped_archives'])}, "
+          f"{result['seconds']:.2f} с")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Отложенная запись журнала действий.
+
+Строки таблицы actions никто не читает сразу после действия, поэтому в
+буферизованном режиме они не входят в транзакцию изменения питомца:
+строки копятся в памяти и записываются одним executemany, когда их
+набирается max_batch или самой старой исполняется max_delay секунд.
+При сбое процесса теряются действия не более чем за max_delay (плюс
+время самой записи); при остановке буфер сбрасывается полностью.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+# Режимы журнала действий (ACTION_LOG_MODE)
+MODES = ('sync', 'buffered')
+
+
+def current_timestamp() -> str:
+    """Время действия в формате CURRENT_TIMESTAMP SQLite: отметка ставится
+    при действии, а не при записи буфера"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ActionLogBuffer:
+    """Буфер строк (pet_id, user_id, action_type, timestamp) с фоновым сбросом.
+
+    write(rows) записывает список строк одной транзакцией. Сброс из потока
+    и явный flush() не выполняются одновременно, поэтому после flush() в
+    БД есть все строки, добавленные до его вызова.
+    """
+
+    def __init__(self, write, max_delay: float = 0.05, max_batch: int = 1000):
+        self.write = write
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+
+        self._rows = []
+        self._first_at = 0.0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        self._metrics = {
+            'enqueued': 0,
+            'flushed': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'largest_flush': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='action-log', daemon=True)
+        self._thread.start()
+
+    def add(self, rows: List[tuple]):
+        """Постановка строк в буфер"""
+        if not rows:
+            return
+        with self._cond:
+            if not self._rows:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            self._rows.extend(rows)
+            self._metrics['enqueued'] += len(rows)
+            if len(self._rows) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self) -> int:
+        """Синхронная запись всего буфера; возвращает число строк"""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._rows = self._rows, []
+            return self._write_rows(rows)
+
+    def _write_rows(self, rows: List[tuple]) -> int:
+        """Запись строк (под _flush_lock); при ошибке строки возвращаются в буфер"""
+        if not rows:
+            return 0
+        started = time.monotonic()
+        try:
+            self.write(rows)
+        except Exception:
+            with self._cond:
+                self._rows[:0] = rows
+                self._first_at = time.monotonic()
+                self._metrics['failed_flushes'] += 1
+            raise
+
+        elapsed = (time.monotonic() - started) * 1000
+        with self._cond:
+            metrics = self._metrics
+            metrics['flushed'] += len(rows)
+            metrics['flushes'] += 1
+            metrics['largest_flush'] = max(metrics['largest_flush'], len(rows))
+            metrics['last_flush_ms'] = elapsed
+            metrics['max_flush_ms'] = max(metrics['max_flush_ms'], elapsed)
+            metrics['total_flush_ms'] += elapsed
+        return len(rows)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._rows and not self._stopping:
+                    self._cond.wait()
+                # Ждем, пока самой старой строке не исполнится max_delay
+                # или буфер не заполнится
+                while not self._stopping and len(self._rows) < self.max_batch:
+                    remaining = self._first_at + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Ошибка записи журнала действий: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики буфера: глубина очереди и время записи"""
+        with self._cond:
+            stats = dict(self._metrics)
+            stats['queue_depth'] = len(self._rows)
+        total = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = total / stats['flushes'] if stats['flushes'] else 0.0
+        stats['mode'] = 'buffered'
+        stats['max_delay_ms'] = self.max_delay * 1000
+        return stats
+
+    def close(self):
+        """Остановка потока и запись оставшихся строк"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            with self._cond:
+                lost = len(self._rows)
+            print(f"❌ Журнал действий не записан, потеряно строк: {lost}: {e}")
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Обработчики /api/* маршрутов, не зависящие от HTTP сервера.
+
+Каждый обработчик принимает контекст приложения, параметры строки
+запроса и тело запроса и возвращает пару (HTTP статус, ответ).
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from pet_events import EventStream, TooManySubscribers
+from responses import JSONTemplate
+from routing import Router
+
+# Наибольшее число действий в одном запросе /api/pet/actions/batch
+MAX_BATCH_ACTIONS = 500
+
+# Размер страницы истории действий /api/pet/actions
+ACTIONS_PAGE_SIZE = 50
+MAX_ACTIONS_PAGE_SIZE = 500
+
+# Строки выгрузки NDJSON собираются в части примерно такого размера
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Постоянные части частых ответов и демо-ответов кодируются один раз
+HEALTH_RESPONSE = JSONTemplate({'status': 'ok', 'version': '1.0.0'}, ('timestamp',))
+DEMO_USER_RESPONSE = JSONTemplate(
+    {'has_couple': False, 'couple_id': None, 'events': False, 'demo_mode': True}, ('user_id',))
+DEMO_COUPLE_RESPONSE = JSONTemplate({'couple': None, 'demo_mode': True}, ('user_id',))
+DEMO_PET_RESPONSE = JSONTemplate({'pet': None, 'demo_mode': True}, ('couple_id',))
+
+
+class APIError(Exception):
+    """Ошибка запроса, которую сервер отдает через send_error"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class StreamResponse:
+    """Ответ, тело которого отдается частями (Transfer-Encoding: chunked).
+
+    chunks - итератор байтовых строк; сервер запрашивает следующую часть
+    только после отправки предыдущей, поэтому тело целиком в памяти
+    не собирается.
+    """
+
+    def __init__(self, chunks, content_type: str):
+        self.chunks = chunks
+        self.content_type = content_type
+
+
+class ETagged:
+    """Ответ с ETag, построенным из версии ресурса.
+
+    Если If-None-Match запроса совпадает с etag, сервер отвечает 304 и
+    build() не вызывается: тело не строится и не сериализуется.
+    """
+
+    def __init__(self, etag: str, build):
+        self.etag = etag
+        self.build = build
+
+    def matches(self, if_none_match: str) -> bool:
+        """Совпадает ли etag с одним из тегов заголовка If-None-Match"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag == '*' or tag == self.etag:
+                return True
+        return False
+
+
+def encode_cursor(action: dict) -> str:
+    """Непрозрачный курсор страницы: ключ (timestamp, id) последнего действия"""
+    key = f"{action['timestamp']}|{action['id']}"
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Ключ (timestamp, id) из курсора encode_cursor; испорченный курсор - 400"""
+    try:
+        # UnicodeEncodeError и UnicodeDecodeError - подклассы ValueError
+        key = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, action_id = key.rsplit('|', 1)
+    except (ValueError, binascii.Error):
+        raise APIError(400, "invalid cursor")
+    # int() принимает пробелы, знак и подчеркивания, а id должен
+    # помещаться в INTEGER SQLite
+    if not (action_id.isascii() and action_id.isdigit()) or len(action_id) > 18:
+        raise APIError(400, "invalid cursor")
+    return timestamp, int(action_id)
+
+
+def ndjson_chunks(rows, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Строки NDJSON, собранные в части не меньше chunk_size байт"""
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def health(app, params, data):
+    """Проверка здоровья сервера"""
+    return 200, HEALTH_RESPONSE.render(timestamp=datetime.now().isoformat())
+
+
+def get_user(app, params, data):
+    """Получение информации о пользователе"""
+    user_id = int(params.get('user_id', [0])[0])
+
+    if user_id == 0:
+        raise APIError(400, "user_id required")
+
+    if not app.db:
+        # Демо-режим
+        response = DEMO_USER_RESPONSE.render(user_id=user_id)
+    else:
+        # Реальный режим
+        couple = app.db.get_user_couple(user_id)
+        response = {
+            'user_id': user_id,
+            'has_couple': couple is not None,
+            'couple_id': couple['id'] if couple else None,
+            # Доступен ли /api/pet/stream на этом сервере
+            'events': app.events is not None,
+            'demo_mode': False
+        }
+
+    return 200, response
+
+
+def create_couple(app, params, data):
+    """Создание пары"""
+    user1_id = data.get('user1_id')
+    user2_id = data.get('user2_id')
+    user1_name = data.get('user1_name', 'Пользователь 1')
+    user2_name = data.get('user2_name', 'Пользователь 2')
+
+    if not user1_id or not user2_id:
+        raise APIError(400, "user1_id and user2_id required")
+
+    try:
+        if not app.db:
+            # Демо-режим
+            couple_id = int(f"{user1_id}{user2_id}")
+            response = {
+                'success': True,
+                'couple_id': couple_id,
+                'message': 'Пара создана успешно! (Демо-режим)',
+                'demo_mode': True
+            }
+        else:
+            # Реальный режим
+            couple_id = app.db.create_couple(user1_id, user2_id, user1_name, user2_name)
+            response = {
+                'success': True,
+                'couple_id': couple_id,
+                'message': 'Пара создана успешно!',
+                'demo_mode': False
+            }
+
+        return 200, response
+
+    except Exception as e:
+        response = {
+            'success': False,
+            'error': str(e),
+            'demo_mode': app.db is None
+        }
+        return 400, response
+
+
+def get_couple(app, params, data):
+    """Получение информации о паре пользователя"""
+    user_id = int(params.get('user_id', [0])[0])
+
+    if user_id == 0:
+        raise APIError(400, "user_id required")
+
+    if not app.db:
+        # Демо-режим
+        return 200, DEMO_COUPLE_RESPONSE.render(user_id=user_id)
+
+    couple = app.db.get_user_couple(user_id)
+    if not couple:
+        raise APIError(404, "Couple not found")
+
+    return 200, ETagged(f'"c{couple.id}.{couple.version}"',
+                        lambda: {**couple, 'demo_mode': False})
+
+
+def get_pet(app, params, data):
+    """Получение питомца пары с текущими показателями"""
+    couple_id = int(params.get('couple_id', [0])[0])
+
+    if couple_id == 0:
+        raise APIError(400, "couple_id required")
+
+    if not app.db:
+        # Демо-режим
+        return 200, DEMO_PET_RESPONSE.render(couple_id=couple_id)
+
+    pet = app.pm.get_pet_status(couple_id)
+    if not pet:
+        raise APIError(404, "Pet not found")
+
+    # Показатели убывают и без записи в БД, поэтому в ETag кроме версии
+    # входят отображаемые (округленные) значения
+    etag = f'"p{pet.id}.{pet.version}.{pet.hunger}.{pet.happiness}.{pet.energy}"'
+    return 200, ETagged(etag, lambda: {**pet.to_api(), 'demo_mode': False})
+
+
+def create_pet(app, params, data):
+    """Создание питомца для пары"""
+    couple_id = data.get('couple_id')
+    pet_type = data.get('pet_type')
+    pet_name = data.get('pet_name')
+
+    if not couple_id:
+        raise APIError(400, "couple_id required")
+
+    if not app.db:
+        # Демо-режим
+        pet_id = int(f"{couple_id}001")
+        return 200, {
+            'success': True,
+            'pet_id': pet_id,
+            'pet': {
+                'id': pet_id,
+                'couple_id': couple_id,
+                'name': pet_name or 'Питомец',
+                'type': pet_type or 'cat',
+                'level': 1,
+                'experience': 0,
+                'hunger': 100,
+                'happiness': 100,
+                'energy': 100,
+                'created_at': datetime.now().isoformat()
+            },
+            'message': 'Питомец создан успешно! (Демо-режим)',
+            'demo_mode': True
+        }
+
+    pet = app.pm.create_pet_for_couple(couple_id, pet_type, pet_name)
+    return 200, {
+        'success': True,
+        'pet_id': pet['id'],
+        'pet': {**pet, 'couple_id': couple_id},
+        'message': 'Питомец создан успешно!',
+        'demo_mode': False
+    }
+
+
+def pet_action(app, params, data):
+    """Выполнение действия с питомцем пары"""
+    couple_id = data.get('couple_id')
+    user_id = data.get('user_id')
+    action = data.get('action', 'feed')
+
+    if not app.db:
+        # Демо-режим
+        if not couple_id:
+            raise APIError(400, "couple_id required")
+        return 200, {
+            'success': True,
+            'action': action,
+            'couple_id': couple_id,
+            'message': f'Действие "{action}" выполнено! (Демо-режим)',
+            'demo_mode': True
+        }
+
+    if not couple_id or not user_id:
+        raise APIError(400, "couple_id and user_id required")
+
+    result = app.pm.perform_action(couple_id, user_id, action)
+    if 'error' in result:
+        return 400, {'success': False, 'error': result['error'], 'demo_mode': False}
+
+    return 200, {**result, 'demo_mode': False}
+
+
+def pet_actions_batch(app, params, data):
+    """Выполнение списка действий с питомцами одной транзакцией.
+
+    Тело: {"actions": [{"couple_id", "user_id", "action"}, ...]}. Ответ
+    содержит результат каждого действия в том же порядке; ошибка одного
+    действия (нет питомца, неизвестное действие) не отменяет остальные.
+    """
+    actions = data.get('actions')
+    if not isinstance(actions, list) or not actions:
+        raise APIError(400, "actions list required")
+    if len(actions) > MAX_BATCH_ACTIONS:
+        raise APIError(400, f"at most {MAX_BATCH_ACTIONS} actions per batch")
+
+    items = []
+    for index, item in enumerate(actions):
+        if not isinstance(item, dict) or not item.get('couple_id') or not item.get('user_id'):
+            raise APIError(400, f"actions[{index}]: couple_id and user_id required")
+        items.append((item['couple_id'], item['user_id'], item.get('action', 'feed')))
+
+    if not app.db:
+        # Демо-режим
+        results = [{
+            'success': True,
+            'action': action,
+            'couple_id': couple_id,
+            'message': f'Действие "{action}" выполнено! (Демо-режим)',
+        } for couple_id, user_id, action in items]
+        return 200, {'success': True, 'results': results, 'demo_mode': True}
+
+    results = []
+    for (couple_id, user_id, action), result in zip(items, app.pm.perform_actions(items)):
+        if 'error' in result:
+            result = {'success': False, 'error': result['error']}
+        results.append({**result, 'couple_id': couple_id})
+
+    return 200, {
+        'success': all(result['success'] for result in results),
+        'results': results,
+        'demo_mode': False
+    }
+
+
+def pet_actions(app, params, data):
+    """История действий с питомцем пары, от новых к старым.
+
+    Страницы по limit действий; next_cursor передается параметром cursor
+    для следующей страницы, на последней странице он null. format=ndjson
+    выгружает всю историю потоком NDJSON без пагинации.
+    """
+    couple_id = int(params.get('couple_id', [0])[0])
+    if couple_id == 0:
+        raise APIError(400, "couple_id required")
+
+    export = params.get('format', ['json'])[0] == 'ndjson'
+    limit = int(params.get('limit', [ACTIONS_PAGE_SIZE])[0])
+    if not 0 < limit <= MAX_ACTIONS_PAGE_SIZE:
+        raise APIError(400, f"limit must be between 1 and {MAX_ACTIONS_PAGE_SIZE}")
+    cursor = params.get('cursor', [None])[0]
+    before = decode_cursor(cursor) if cursor else None
+
+    if not app.db:
+        # Демо-режим
+        if export:
+            return 200, StreamResponse(iter(()), 'application/x-ndjson')
+        return 200, {'couple_id': couple_id, 'actions': [], 'next_cursor': None, 'demo_mode': True}
+
+    pet = app.db.get_pet(couple_id)
+    if not pet:
+        raise APIError(404, "Pet not found")
+
+    if export:
+        return 200, StreamResponse(ndjson_chunks(app.db.iter_actions(pet.id)), 'application/x-ndjson')
+
+    # Лишнее действие показывает, есть ли следующая страница
+    actions = app.db.get_actions_page(pet.id, before, limit + 1)
+    more = len(actions) > limit
+    del actions[limit:]
+    return 200, {
+        'couple_id': couple_id,
+        'actions': actions,
+        'next_cursor': encode_cursor(actions[-1]) if more else None,
+        'demo_mode': False
+    }
+
+
+def pet_stream(app, params, data):
+    """Поток изменений питомца пары (Server-Sent Events).
+
+    Событие pet с состоянием питомца приходит сразу после каждого
+    изменения; id события - версия питомца. Last-Event-ID (заголовок или
+    параметр last_event_id) с текущей версией не повторяет состояние.
+    """
+    couple_id = int(params.get('couple_id', [0])[0])
+    if couple_id == 0:
+        raise APIError(400, "couple_id required")
+
+    if not app.db:
+        # Демо-режим: изменений, о которых можно сообщать, нет
+        raise APIError(503, "event stream unavailable in demo mode")
+    if app.events is None:
+        # Сервер с пулом потоков без STREAM_THREADED=1
+        raise APIError(503, "event stream disabled on this server")
+
+    try:
+        subscription = app.events.subscribe(couple_id)
+    except TooManySubscribers:
+        raise APIError(503, "too many event streams")
+
+    # Питомец читается после подписки: изменение между ними не теряется.
+    # Показатели - с затуханием на момент чтения, как в GET /api/pet
+    pet = app.pm.get_pet_status(couple_id)
+    if not pet:
+        app.events.unsubscribe(subscription)
+        raise APIError(404, "Pet not found")
+
+    return 200, EventStream(app.events, subscription, pet,
+                            lambda: app.pm.get_pet_status(couple_id),
+                            params.get('last_event_id', [None])[0])
+
+
+def metrics(app, params, data):
+    """Метрики пула соединений, очереди записи, кэшей, CORS и сжатия"""
+    if not app.db:
+        return 200, {'cors': app.cors.stats(), 'compression': app.compression.stats(),
+                     'demo_mode': True}
+
+    response = {**app.db.stats(), 'cors': app.cors.stats(),
+                'compression': app.compression.stats(), 'demo_mode': False}
+    if app.scheduler is not None:
+        response['notifications'] = app.scheduler.stats()
+    if app.events is not None:
+        response['events'] = app.events.stats()
+    return 200, response
+
+
+router = Router()
+router.add('GET', '/api/health', health)
+router.add('GET', '/api/metrics', metrics)
+router.add('GET', '/api/user', get_user)
+router.add('GET', '/api/couple', get_couple)
+router.add('GET', '/api/pet', get_pet)
+router.add('GET', '/api/pet/actions', pet_actions)
+router.add('GET', '/api/pet/stream', pet_stream)
+router.add('GET', '/api/pet/{couple_id:int}', get_pet)
+router.add('POST', '/api/couple/create', create_couple)
+router.add('POST', '/api/pet/create', create_pet)
+router.add('POST', '/api/pet/action', pet_action)
+router.add('POST', '/api/pet/actions/batch', pet_actions_batch)
@@ -3,190 +3,134 @@
 API сервер для Telegram Mini App (Продакшен версия)
 """
 
-import json
 import sqlite3
 import os
-from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
 import sys
 
 # Добавляем путь к модулям
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import api_endpoints
+from api_endpoints import APIError, ETagged, StreamResponse
+from app_context import AppContext, storage_backend
+from pet_events import STREAM_HEADERS, EventStream
+from responses import etag_block
+from serving import RoutedRequestHandler, serve, server_settings
+
 try:
-    from database import Database
-    from pet_manager import PetManager
     from config import PET_TYPES, ACTIONS
 except ImportError:
-    print("⚠️ Модули не найдены, используем демо-режим")
     # Демо-версия без зависимостей
     PET_TYPES = {"cat": {"emoji": "🐱", "name": "Котик"}}
     ACTIONS = {"feed": {"name": "Покормить"}}
 
-class MiniAppAPIHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        # Инициализируем базу данных при создании обработчика
-        try:
-            self.db = Database('pets.db')
-            self.pm = PetManager(self.db)
-            print("✅ База данных инициализирована")
-        except Exception as e:
-            print(f"⚠️ Ошибка инициализации БД: {e}")
-            self.db = None
-            self.pm = None
-        super().__init__(*args, **kwargs)
+class MiniAppAPIHandler(RoutedRequestHandler):
+    router = api_endpoints.router
     
-    def do_OPTIONS(self):
-        """Обработка CORS preflight запросов"""
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.end_headers()
+    # База данных и менеджер питомцев берутся из контекста приложения,
+    # который создается один раз в run_api_server
+    @property
+    def db(self):
+        return self.server.app.db
     
-    def send_cors_headers(self):
-        """Отправка CORS заголовков"""
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.send_header('Content-Type', 'application/json')
+    @property
+    def pm(self):
+        return self.server.app.pm
     
-    def do_GET(self):
-        """Обработка GET запросов"""
-        parsed_url = urlparse(self.path)
-        path = parsed_url.path
-        query_params = parse_qs(parsed_url.query)
-        
-        try:
-            if path == '/api/health':
-                self.handle_health()
-            elif path == '/api/user':
-                self.handle_get_user(query_params)
-            elif path == '/api/couple':
-                self.handle_get_couple(query_params)
-            elif path == '/api/pet':
-                self.handle_get_pet(query_params)
-            else:
-                self.send_error(404, "Not Found")
-        except Exception as e:
-            self.send_error(500, str(e))
+    @property
+    def cors(self):
+        return self.server.app.cors
     
-    def do_POST(self):
-        """Обработка POST запросов"""
-        parsed_url = urlparse(self.path)
-        path = parsed_url.path
-        
-        try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length > 0:
-                post_data = self.rfile.read(content_length)
-                data = json.loads(post_data.decode('utf-8'))
-            else:
-                data = {}
-            
-            if path == '/api/couple/create':
-                self.handle_create_couple(data)
-            elif path == '/api/pet/create':
-                self.handle_create_pet(data)
-            elif path == '/api/pet/action':
-                self.handle_pet_action(data)
-            else:
-                self.send_error(404, "Not Found")
-        except Exception as e:
-            self.send_error(500, str(e))
+    @property
+    def compression(self):
+        return self.server.app.compression
     
-    def handle_health(self):
-        """Проверка здоровья сервера"""
-        response = {
-            'status': 'ok',
-            'timestamp': datetime.now().isoformat(),
-            'version': '1.0.0'
-        }
-        
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+    def send_cors_headers(self, content_type: str = 'application/json'):
+        """Отправка CORS заголовков (для потоковых ответов)"""
+        for name, value in self.cors.pairs(self.headers.get('Origin')):
+            self.send_header(name, value)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
     
-    def handle_get_user(self, params):
-        """Получение информации о пользователе"""
-        user_id = int(params.get('user_id', [0])[0])
-        
-        if user_id == 0:
-            self.send_error(400, "user_id required")
+    def call_route(self, endpoint, params, data):
+        """Вызов обработчика маршрута и отправка его JSON ответа"""
+        try:
+            status, response = endpoint(self.server.app, params, data)
+        except APIError as e:
+            self.send_error(e.status, e.message)
             return
         
-        if not self.db:
-            # Демо-режим
-            response = {
-                'user_id': user_id,
-                'has_couple': False,
-                'couple_id': None,
-                'demo_mode': True
-            }
-        else:
-            # Реальный режим
-            couple = self.db.get_user_couple(user_id)
-            response = {
-                'user_id': user_id,
-                'has_couple': couple is not None,
-                'couple_id': couple['id'] if couple else None,
-                'demo_mode': False
-            }
+        if isinstance(response, StreamResponse):
+            chunks, encoding = self.compression.stream(response.chunks,
+                                                       self.headers.get('Accept-Encoding'))
+            self.send_response(status)
+            self.send_cors_headers(response.content_type)
+            if encoding is not None:
+                self.send_header('Content-Encoding', encoding)
+            if self.compression.encodings:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.send_chunked(chunks)
+            return
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
-    
-    def handle_create_couple(self, data):
-        """Создание пары"""
-        user1_id = data.get('user1_id')
-        user2_id = data.get('user2_id')
-        user1_name = data.get('user1_name', 'Пользователь 1')
-        user2_name = data.get('user2_name', 'Пользователь 2')
+        if isinstance(response, EventStream):
+            self.send_event_stream(status, response)
+            return
         
-        if not user1_id or not user2_id:
-            self.send_error(400, "user1_id and user2_id required")
+        if isinstance(response, ETagged):
+            if response.matches(self.headers.get('If-None-Match')):
+                self.send_prepared(304, self.json_headers(), None, etag_block(response.etag))
+                return
+            self.send_json(status, response.build(), etag=response.etag)
             return
         
+        self.send_json(status, response)
+    
+    def send_event_stream(self, status: int, stream: EventStream):
+        """Поток Server-Sent Events; занимает рабочий поток до отключения
+        клиента, после чего соединение закрывается"""
+        self.send_response(status)
+        self.send_cors_headers(None)
+        for name, value in STREAM_HEADERS:
+            self.send_header(name, value)
         try:
-            if not self.db:
-                # Демо-режим
-                couple_id = int(f"{user1_id}{user2_id}")
-                response = {
-                    'success': True,
-                    'couple_id': couple_id,
-                    'message': 'Пара создана успешно! (Демо-режим)',
-                    'demo_mode': True
-                }
-            else:
-                # Реальный режим
-                couple_id = self.db.create_couple(user1_id, user2_id, user1_name, user2_name)
-                response = {
-                    'success': True,
-                    'couple_id': couple_id,
-                    'message': 'Пара создана успешно!',
-                    'demo_mode': False
-                }
-            
-            self.send_response(200)
-            self.send_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
-            
-        except Exception as e:
-            response = {
-                'success': False,
-                'error': str(e),
-                'demo_mode': self.db is None
-            }
-            
-            self.send_response(400)
-            self.send_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
+            self.send_chunked(stream.events(self.headers.get('Last-Event-ID')))
+        finally:
+            stream.close()
+            self.close_connection = True
+    
+def create_app(settings: dict, db_path: str = None) -> AppContext:
+    """Контекст обслуживающего процесса.
+
+    В режиме prefork кэш чтения отключен: он свой у каждого процесса, и
+    изменение, выполненное в одном процессе, другие отдавали бы (в том
+    числе как 304 по старому ETag) до истечения CACHE_TTL. Проверка
+    версии строки по БД стоила бы того же запроса, что и чтение без кэша.
+    """
+    app = AppContext.create(db_path, read_cache=settings['mode'] != 'prefork')
+    configure_event_streams(app, settings)
+    return app
+
+def configure_event_streams(app: AppContext, settings: dict):
+    """Потоки событий на сервере с пулом потоков.
+
+    Каждый поток событий занимает рабочий поток на все время подключения,
+    поэтому по умолчанию они отключены (клиент узнает об этом из поля
+    events ответа /api/user и не подписывается); для них предназначен
+    async_api_server.py. STREAM_THREADED=1 включает их с пределом в
+    половину SERVER_THREADS; в режиме single поток один, и потоки
+    событий не включаются.
+    """
+    if app.events is None:
+        return
+    enabled = os.environ.get('STREAM_THREADED', '0') == '1'
+    threads = settings['threads'] if settings['mode'] != 'single' else 0
+    limit = min(app.events.max_subscribers, threads // 2)
+    if not enabled or limit == 0:
+        app.disable_events()
+        return
+    app.events.max_subscribers = limit
+    # Действия, выполненные в других процессах, хаб не видит
+    app.events.poll_storage = settings['mode'] == 'prefork'
 
 def run_api_server(port=None):
     """Запуск API сервера"""
@@ -196,12 +140,24 @@ def run_api_server(port=None):
     print(f"🚀 Запуск API сервера на порту {port}")
     print(f"📡 Переменные окружения: PORT={os.environ.get('PORT', 'не задан')}")
     
+    def setup(httpd):
+        # Контекст создается в каждом обслуживающем процессе: соединения
+        # SQLite и поток записи нельзя переносить через fork
+        app = create_app(settings)
+        httpd.app = app
+        return app.close
+    
+    settings = server_settings()
+    if settings['mode'] == 'prefork' and storage_backend() == 'memory':
+        # Состояние хранилища в памяти принадлежит одному процессу
+        print("⚠️ STORAGE_BACKEND=memory несовместим с SERVER_MODE=prefork, используем threaded")
+        settings['mode'] = 'threaded'
+    
     try:
         server_address = ('0.0.0.0', port)
-        httpd = HTTPServer(server_address, MiniAppAPIHandler)
         print(f"✅ API сервер запущен на {server_address}")
         print(f"🔗 Health check: http://0.0.0.0:{port}/api/health")
-        httpd.serve_forever()
+        serve(server_address, MiniAppAPIHandler, setup, settings)
     except Exception as e:
         print(f"❌ Ошибка запуска сервера: {e}")
         raise
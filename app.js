@@ -13,6 +13,7 @@ tg.setBackgroundColor('#667eea');
 let currentUser = null;
 let currentPet = null;
 let currentCouple = null;
+let petEvents = null;
 
 // Конфигурация
 const PET_TYPES = {
@@ -54,6 +55,9 @@ async function initApp() {
         // Загружаем данные питомца
         await loadPetData();
         
+        // Подписываемся на изменения питомца
+        subscribePetUpdates();
+        
         // Обновляем интерфейс
         updatePetDisplay();
         
@@ -76,6 +80,8 @@ async function loadUserData() {
             const userData = await response.json();
             currentUser.hasCouple = userData.has_couple;
             currentUser.coupleId = userData.couple_id;
+            // Сервер сообщает, обслуживает ли он поток изменений
+            currentUser.petEvents = userData.events === true;
             
             if (userData.has_couple) {
                 await loadCoupleData();
@@ -119,18 +125,7 @@ async function loadPetData() {
             const apiUrl = window.location.hostname === 'localhost' ? 'http://localhost:8000' : 'https://your-api-domain.com';
             const response = await fetch(`${apiUrl}/api/pet?couple_id=${currentUser.coupleId}`);
             if (response.ok) {
-                const petData = await response.json();
-                currentPet = {
-                    id: petData.id,
-                    name: petData.name,
-                    type: petData.type,
-                    hunger: petData.hunger,
-                    happiness: petData.happiness,
-                    energy: petData.energy,
-                    level: petData.level,
-                    experience: petData.experience,
-                    lastUpdated: petData.last_updated
-                };
+                currentPet = petFromApi(await response.json());
                 return;
             }
         }
@@ -149,6 +144,39 @@ async function loadPetData() {
     }
 }
 
+// Питомец из ответа API
+function petFromApi(petData) {
+    return {
+        id: petData.id,
+        name: petData.name,
+        type: petData.type,
+        hunger: petData.hunger,
+        happiness: petData.happiness,
+        energy: petData.energy,
+        level: petData.level,
+        experience: petData.experience,
+        lastUpdated: petData.last_updated
+    };
+}
+
+// Подписка на изменения питомца: действия партнера приходят сразу.
+// Подписка открывается, только если сервер сообщил о потоке (events в /api/user).
+// При обрыве EventSource переподключается сам и передает Last-Event-ID,
+// поэтому пропущенное изменение придет после переподключения
+function subscribePetUpdates() {
+    if (!window.EventSource || !currentUser.petEvents || !currentUser.hasCouple || !currentUser.coupleId) return;
+    
+    const apiUrl = window.location.hostname === 'localhost' ? 'http://localhost:8000' : 'https://your-api-domain.com';
+    if (petEvents) {
+        petEvents.close();
+    }
+    petEvents = new EventSource(`${apiUrl}/api/pet/stream?couple_id=${currentUser.coupleId}`);
+    petEvents.addEventListener('pet', function(event) {
+        currentPet = petFromApi(JSON.parse(event.data));
+        updatePetDisplay();
+    });
+}
+
 // Создание демо-питомца
 function createDemoPet() {
     return {
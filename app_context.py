@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Контекст приложения: объекты, общие для всех обработчиков процесса
+"""
+
+import os
+
+from action_log import MODES as ACTION_LOG_MODES
+from compression import ResponseCompressor
+from cors import CORSPolicy
+
+try:
+    from database import Database
+    from memory_storage import MemoryStorage
+    from notifications import NotificationScheduler, make_sender
+    from pet_events import PetEventHub
+    from pet_manager import PetManager
+except ImportError:
+    Database = None
+    MemoryStorage = None
+    NotificationScheduler = None
+    PetEventHub = None
+    PetManager = None
+
+
+def storage_backend() -> str:
+    """Хранилище состояния: sqlite (по умолчанию) или memory"""
+    return os.environ.get('STORAGE_BACKEND', 'sqlite')
+
+
+class AppContext:
+    """Создается один раз при старте сервера и разделяется всеми запросами"""
+
+    def __init__(self, db=None, pm=None, scheduler=None, events=None, cors=None,
+                 compression=None):
+        # db - реализация storage.Storage
+        self.db = db
+        self.pm = pm
+        self.scheduler = scheduler
+        # events - pet_events.PetEventHub для /api/pet/stream
+        self.events = events
+        # Политика CORS нужна и в демо-режиме
+        self.cors = cors if cors is not None else CORSPolicy.from_env()
+        self.compression = compression if compression is not None else ResponseCompressor.from_env()
+
+    @property
+    def demo_mode(self) -> bool:
+        return self.db is None
+
+    def disable_events(self):
+        """Отключение потоков событий: сервер не может их обслуживать"""
+        if self.events is None:
+            return
+        if self.pm is not None and self.events.publish in self.pm.listeners:
+            self.pm.listeners.remove(self.events.publish)
+        self.events.close()
+        self.events = None
+
+    @classmethod
+    def create(cls, db_path: str = None, read_cache: bool = True) -> 'AppContext':
+        """Открытие хранилища (для SQLite - с применением миграций схемы).
+
+        read_cache=False отключает кэш пар и питомцев между запросами
+        (CACHE_SIZE): он нужен, когда в ту же БД пишут другие процессы.
+        """
+        if Database is None:
+            print("⚠️ Модули не найдены, используем демо-режим")
+            return cls()
+
+        # Ошибка настройки останавливает запуск, а не включает демо-режим
+        action_log = os.environ.get('ACTION_LOG_MODE', 'sync')
+        if action_log not in ACTION_LOG_MODES:
+            raise ValueError(f"ACTION_LOG_MODE={action_log}: допустимы {', '.join(ACTION_LOG_MODES)}")
+
+        try:
+            if storage_backend() == 'memory':
+                if db_path is None:
+                    db_path = os.environ.get('STORAGE_PATH', 'pets_state')
+                db = MemoryStorage(
+                    db_path,
+                    snapshot_every=int(os.environ.get('STORAGE_SNAPSHOT_EVERY', 100000)),
+                    fsync=os.environ.get('STORAGE_FSYNC', '0') == '1',
+                )
+                print(f"✅ Хранилище в памяти открыто: {db_path}")
+            else:
+                if db_path is None:
+                    db_path = os.environ.get('DATABASE_PATH', 'pets.db')
+                production = os.environ.get('DATABASE_MODE', 'default') == 'production'
+                db = Database(
+                    db_path,
+                    production=production,
+                    cache_size=int(os.environ.get('CACHE_SIZE', 10000)) if read_cache else 0,
+                    cache_ttl=float(os.environ.get('CACHE_TTL', 30)),
+                    action_log=action_log,
+                    action_log_delay=float(os.environ.get('ACTION_LOG_MAX_DELAY_MS', 50)) / 1000,
+                    action_log_batch=int(os.environ.get('ACTION_LOG_BATCH', 1000)),
+                )
+                print(f"✅ База данных инициализирована: {db_path}")
+            pm = PetManager(db)
+        except Exception as e:
+            print(f"⚠️ Ошибка инициализации БД: {e}")
+            return cls()
+
+        events = PetEventHub(
+            max_subscribers=int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 10000)),
+            heartbeat=float(os.environ.get('STREAM_HEARTBEAT', 15)),
+        )
+        pm.listeners.append(events.publish)
+
+        scheduler = None
+        if os.environ.get('NOTIFICATIONS_ENABLED', '0') == '1':
+            scheduler = NotificationScheduler(
+                db, pm, make_sender(),
+                rescan_interval=float(os.environ.get('NOTIFICATIONS_RESCAN', 60)),
+            )
+            # В режиме prefork планировщик работает только в одном процессе
+            if scheduler.start(os.environ.get('NOTIFICATIONS_LOCK', 'notifications.lock')):
+                pm.listeners.append(scheduler.schedule_pet)
+            else:
+                scheduler = None
+        return cls(db, pm, scheduler, events)
+
+    def close(self):
+        """Освобождение ресурсов при остановке сервера"""
+        if self.events is not None:
+            self.events.close()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.db is not None:
+            self.db.close()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Асинхронный API сервер на asyncio (альтернатива api_server.py).
+
+Один событийный цикл обслуживает все соединения: простаивающие
+keep-alive соединения клиентов Mini App не занимают потоков.
+Блокирующие вызовы базы данных выполняются в ограниченном пуле потоков.
+"""
+
+import asyncio
+import html
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import DEFAULT_ERROR_MESSAGE
+from urllib.parse import urlparse, parse_qs
+
+# Добавляем путь к модулям
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import api_endpoints
+from api_endpoints import APIError, ETagged, StreamResponse
+from app_context import AppContext
+from compression import ENCODING_BLOCKS, VARY
+from pet_events import STREAM_HEADERS, EventStream
+from responses import (CLOSE, KEEP_ALIVE, SERVER_HEADER, build_response, encode_body, etag_block,
+                       header_block, http_date)
+from routing import MethodNotAllowed, RouteNotFound
+
+# Обработчики, которые не обращаются к базе данных и выполняются прямо
+# в событийном цикле, без передачи в пул потоков
+NON_BLOCKING_ENDPOINTS = {api_endpoints.health}
+
+# Заголовки ответов кодируются один раз (заголовки CORS - в app.cors)
+STREAM_BLOCK = header_block(STREAM_HEADERS)
+ERROR_BLOCK = b'Content-Type: text/html;charset=utf-8\r\n'
+
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class BadRequest(Exception):
+    """Запрос, который нельзя разобрать; соединение после ответа закрывается"""
+
+    def __init__(self, status: int, message: str = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class AsyncAPIServer:
+    """HTTP/1.1 сервер с keep-alive, конвейерной обработкой и таймаутами"""
+
+    def __init__(self, app, max_connections: int = 10000, db_workers: int = 16,
+                 request_timeout: float = 10.0, keepalive_timeout: float = 75.0):
+        self.app = app
+        self.request_timeout = request_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.max_connections = max_connections
+        self.db_workers = db_workers
+
+        self._executor = ThreadPoolExecutor(db_workers, thread_name_prefix='db')
+        self._connections = None
+        self._db_slots = None
+        self._server = None
+        self.open_connections = 0
+
+    async def start(self, host: str, port: int):
+        self._connections = asyncio.Semaphore(self.max_connections)
+        # Не больше двух запросов в очереди на каждый поток БД: остальные
+        # соединения ждут, а не копят задания в очереди пула
+        self._db_slots = asyncio.Semaphore(self.db_workers * 2)
+        self._server = await asyncio.start_server(
+            self._handle_connection, host, port,
+            limit=MAX_HEADER_SIZE, backlog=1024
+        )
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self._executor.shutdown(wait=True)
+
+    async def _handle_connection(self, reader, writer):
+        # Превышение лимита соединений не отклоняет клиента, а откладывает
+        # его обслуживание: новые соединения ждут в очереди семафора
+        async with self._connections:
+            self.open_connections += 1
+            try:
+                await self._serve_connection(reader, writer)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except asyncio.CancelledError:
+                # Остановка сервера с открытыми соединениями (потоки событий);
+                # в Python 3.11 asyncio сообщает об отмене задачи соединения
+                # как о необработанной ошибке
+                pass
+            finally:
+                self.open_connections -= 1
+                writer.close()
+
+    async def _serve_connection(self, reader, writer):
+        while True:
+            try:
+                request = await self._read_request(reader)
+            except asyncio.TimeoutError:
+                # Простаивающее keep-alive соединение просто закрываем
+                return
+            except BadRequest as e:
+                writer.write(self._error_response(e.status, e.message, keep_alive=False))
+                await writer.drain()
+                return
+
+            if request is None:
+                return
+
+            method, target, version, headers, body = request
+            keep_alive = self._keep_alive(version, headers)
+            response = await self._dispatch(method, target, headers, body, keep_alive)
+            if isinstance(response, tuple):
+                # Потоковый ответ: HTTP/1.0 не знает chunked, тело
+                # отдается до закрытия соединения
+                chunked = version != 'HTTP/1.0'
+                keep_alive = keep_alive and chunked
+                status, head, body = response
+                if isinstance(body, EventStream):
+                    await self._write_events(reader, writer, status, head, body,
+                                             headers.get('last-event-id'), chunked)
+                    return
+                if not await self._write_stream(writer, *response, chunked, keep_alive):
+                    return
+            else:
+                writer.write(response)
+                # drain() приостанавливает обработку, пока клиент не заберет
+                # ответ: медленный читатель не раздувает буферы сервера
+                await writer.drain()
+
+            if not keep_alive:
+                return
+
+    async def _read_request(self, reader):
+        """Чтение одного запроса; None, если клиент закрыл соединение"""
+        # Ожидание первой строки - это простой keep-alive соединения
+        first = b'\r\n'
+        while first in (b'\r\n', b'\n'):
+            # Пустые строки между конвейерными запросами допускаются RFC 9112
+            try:
+                first = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+            except ValueError:
+                raise BadRequest(HTTPStatus.REQUEST_URI_TOO_LONG)
+            if not first:
+                return None
+
+        try:
+            header_lines = await asyncio.wait_for(self._read_header_lines(reader), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise BadRequest(HTTPStatus.REQUEST_TIMEOUT)
+        if header_lines is None:
+            return None
+
+        try:
+            method, target, version = first.decode('latin-1').split()
+        except ValueError:
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad request syntax")
+        if not version.startswith('HTTP/1.'):
+            raise BadRequest(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED)
+
+        headers = {}
+        for line in header_lines:
+            name, sep, value = line.decode('latin-1').partition(':')
+            if not sep:
+                raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad header line")
+            headers[name.strip().lower()] = value.strip()
+
+        if 'transfer-encoding' in headers:
+            raise BadRequest(HTTPStatus.NOT_IMPLEMENTED, "Transfer-Encoding not supported")
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad Content-Length")
+        if length < 0:
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        body = b''
+        if length:
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), self.request_timeout)
+            except asyncio.TimeoutError:
+                raise BadRequest(HTTPStatus.REQUEST_TIMEOUT)
+
+        return method, target, version, headers, body
+
+    async def _read_header_lines(self, reader):
+        """Строки заголовков до пустой строки; None при обрыве соединения"""
+        lines = []
+        size = 0
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise BadRequest(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            if not line:
+                return None
+            if line in (b'\r\n', b'\n'):
+                return lines
+            size += len(line)
+            if size > MAX_HEADER_SIZE:
+                raise BadRequest(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            lines.append(line)
+
+    def _keep_alive(self, version: str, headers: dict) -> bool:
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    async def _dispatch(self, method: str, target: str, request_headers: dict, body: bytes,
+                        keep_alive: bool):
+        """Выполнение запроса и сборка ответа; для потокового ответа -
+        кортеж (статус, заголовки, итератор частей тела)"""
+        if method == 'OPTIONS':
+            status, head, body = self.app.cors.preflight(request_headers.get('origin'))
+            return self._build_response(status, head, body, keep_alive)
+
+        parsed_url = urlparse(target)
+
+        if method not in ('GET', 'POST'):
+            return self._error_response(501, f"Unsupported method ({method!r})", keep_alive)
+
+        try:
+            endpoint, path_params = api_endpoints.router.resolve(method, parsed_url.path)
+        except RouteNotFound:
+            return self._error_response(404, "Not Found", keep_alive)
+        except MethodNotAllowed as e:
+            return self._error_response(405, keep_alive=keep_alive,
+                                        headers=(('Allow', ', '.join(e.allowed)),))
+
+        try:
+            params = parse_qs(parsed_url.query)
+            for name, value in path_params.items():
+                params[name] = [value]
+            data = json.loads(body.decode('utf-8')) if body else {}
+
+            if endpoint in NON_BLOCKING_ENDPOINTS:
+                status, response = endpoint(self.app, params, data)
+            else:
+                async with self._db_slots:
+                    loop = asyncio.get_running_loop()
+                    status, response = await loop.run_in_executor(
+                        self._executor, endpoint, self.app, params, data
+                    )
+        except APIError as e:
+            return self._error_response(e.status, e.message, keep_alive)
+        except Exception as e:
+            return self._error_response(500, str(e), keep_alive)
+
+        origin = request_headers.get('origin')
+        accept_encoding = request_headers.get('accept-encoding')
+        if isinstance(response, StreamResponse):
+            chunks, encoding = self.app.compression.stream(response.chunks, accept_encoding)
+            head = self.app.cors.block(origin) + header_block((('Content-Type', response.content_type),))
+            if encoding is not None:
+                head += ENCODING_BLOCKS[encoding]
+            elif self.app.compression.encodings:
+                head += VARY
+            return status, head, chunks
+        if isinstance(response, EventStream):
+            return status, self.app.cors.block(origin) + STREAM_BLOCK, response
+
+        etag = None
+        if isinstance(response, ETagged):
+            etag = response.etag
+            if response.matches(request_headers.get('if-none-match')):
+                # 304 не содержит тела и Content-Length
+                return self._build_head(304, self.app.cors.json_block(origin), keep_alive,
+                                        etag_block(etag))
+            response = response.build()
+        body, encoding, extra = self.app.compression.encode(encode_body(response), accept_encoding)
+        if etag is not None:
+            extra += etag_block(etag, weak=encoding is not None)
+        return self._build_response(status, self.app.cors.json_block(origin), body, keep_alive, extra)
+
+    async def _write_stream(self, writer, status: int, head: bytes, chunks,
+                            chunked: bool, keep_alive: bool) -> bool:
+        """Отправка ответа из итератора частей; False, если соединение
+        нужно закрыть. Части читаются из БД в пуле потоков по одной, а
+        следующая запрашивается только после drain() предыдущей."""
+        extra = b'Transfer-Encoding: chunked\r\n' if chunked else b''
+        writer.write(self._build_head(status, head, keep_alive, extra))
+
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                async with self._db_slots:
+                    chunk = await loop.run_in_executor(self._executor, next, chunks, None)
+            except Exception as e:
+                # Статус уже отправлен, поэтому ответ об ошибке невозможен
+                print(f"❌ Ответ частями прерван: {e}")
+                return False
+            if chunk is None:
+                break
+            if chunk:
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                await writer.drain()
+
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        return keep_alive
+
+    async def _write_events(self, reader, writer, status: int, head: bytes, stream: EventStream,
+                            last_event_id: str, chunked: bool):
+        """Поток Server-Sent Events до отключения клиента или остановки
+        сервера. Ожидание события не занимает потока: хаб будит цикл через
+        call_soon_threadsafe. Процесс один, поэтому хранилище при пульсе
+        не опрашивается (poll_storage выключен)."""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        stream.subscription.wake = lambda: loop.call_soon_threadsafe(ready.set)
+        # Клиент потока ничего не отправляет: конец чтения означает, что он
+        # отключился, и подписка освобождается сразу, а не на пульсе
+        disconnected = asyncio.ensure_future(_wait_eof(reader))
+
+        def frame(chunk: bytes) -> bytes:
+            return b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk
+
+        try:
+            extra = b'Transfer-Encoding: chunked\r\n' if chunked else b''
+            writer.write(self._build_head(status, head, False, extra) + frame(stream.start(last_event_id)))
+            await writer.drain()
+            while not stream.subscription.closed and not disconnected.done():
+                ready.clear()
+                chunk = stream.take()
+                if chunk is None:
+                    woken = asyncio.ensure_future(ready.wait())
+                    done, _ = await asyncio.wait((woken, disconnected), timeout=stream.hub.heartbeat,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    woken.cancel()
+                    if done:
+                        continue
+                    chunk = stream.heartbeat()
+                writer.write(frame(chunk))
+                await writer.drain()
+            if chunked and not disconnected.done():
+                writer.write(b'0\r\n\r\n')
+                await writer.drain()
+        finally:
+            disconnected.cancel()
+            stream.close()
+
+    def _build_head(self, status: int, head: bytes, keep_alive: bool, extra: bytes = b'') -> bytes:
+        """Строка статуса и заголовки ответа без Content-Length; head и
+        extra - закодированные блоки заголовков"""
+        return self._build_response(status, head, None, keep_alive, extra)
+
+    def _build_response(self, status: int, head: bytes, body: bytes, keep_alive: bool,
+                        extra: bytes = b'') -> bytes:
+        """Ответ целиком одним буфером; body=None - без тела и Content-Length.
+        Server и Date - как у сервера с потоками (Date обновляется раз в секунду)"""
+        return build_response(status, SERVER_HEADER + http_date.header() + head, body,
+                              extra + (KEEP_ALIVE if keep_alive else CLOSE))
+
+    def _error_response(self, status: int, message: str = None, keep_alive: bool = True,
+                        headers=()) -> bytes:
+        """Ошибка в том же формате, что и BaseHTTPRequestHandler.send_error"""
+        status = HTTPStatus(status)
+        body = (DEFAULT_ERROR_MESSAGE % {
+            'code': status.value,
+            'message': html.escape(message or status.phrase, quote=False),
+            'explain': html.escape(status.description, quote=False),
+        }).encode('UTF-8', 'replace')
+        return self._build_response(status.value, ERROR_BLOCK, body, keep_alive, header_block(headers))
+
+
+async def _wait_eof(reader):
+    """Ожидание закрытия соединения клиентом"""
+    try:
+        while await reader.read(4096):
+            pass
+    except ConnectionError:
+        pass
+
+
+async def _main(port: int):
+    app = AppContext.create()
+    server = AsyncAPIServer(
+        app,
+        max_connections=int(os.environ.get('ASYNC_MAX_CONNECTIONS', 10000)),
+        db_workers=int(os.environ.get('ASYNC_DB_WORKERS', 16)),
+        request_timeout=float(os.environ.get('ASYNC_REQUEST_TIMEOUT', 10)),
+        keepalive_timeout=float(os.environ.get('ASYNC_KEEPALIVE_TIMEOUT', 75)),
+    )
+    await server.start('0.0.0.0', port)
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stopped.set)
+        except NotImplementedError:
+            pass
+
+    serving = asyncio.ensure_future(server.serve_forever())
+    await stopped.wait()
+    serving.cancel()
+    server.close()
+    app.close()
+
+
+def run_async_api_server(port=None):
+    """Запуск асинхронного API сервера"""
+    if port is None:
+        port = int(os.environ.get('PORT', 8000))
+
+    print(f"🚀 Запуск асинхронного API сервера на порту {port}")
+    print(f"🔗 Health check: http://0.0.0.0:{port}/api/health")
+    asyncio.run(_main(port))
+
+
+if __name__ == '__main__':
+    run_async_api_server()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Пакетный расчет затухания показателей сразу для всех питомцев.
+
+Питомцы читаются частями по id (keyset-пагинация, память ограничена
+размером части), показатели считаются по столбцам: массивами NumPy, если
+он установлен, иначе столбцами модуля array. Часы с момента last_updated
+вычисляет SQLite, поэтому строки времени не разбираются в Python.
+
+Используется для обслуживающего прохода, который сохраняет накопленное
+затухание в БД (materialize_decay), и для чтения текущих показателей
+многих питомцев сразу (iter_decayed_chunks), например для рейтингов
+и уведомлений.
+"""
+
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pet_manager import format_timestamp, utcnow
+from rules import RULES, STATS
+
+CHUNK_SIZE = 50000
+
+# Скорости затухания по коду типа питомца (таблицы правил) по столбцам;
+# последняя строка нулевая - для типов, которых нет в PET_TYPES
+TYPE_CODES = RULES.type_codes
+RATES = [[rates[index] for rates in RULES.rates] + [0.0] for index in range(len(STATS))]
+
+SQL_DECAY_CHUNK = f'''
+    SELECT
+        id,
+        CASE pet_type {' '.join(f"WHEN '{t}' THEN {c}" for t, c in TYPE_CODES.items())}
+            ELSE {len(TYPE_CODES)} END,
+        MAX(0.0, (julianday(?) - julianday(last_updated)) * 24),
+        hunger, happiness, energy, last_updated
+    FROM pets
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+'''
+
+# Запись только если питомец не изменился после чтения части. Версия не
+# увеличивается: показатели, которые API отдает на любой момент после now,
+# остаются прежними, поэтому ETag и id событий клиентов не устаревают
+SQL_WRITE_DECAY = '''
+    UPDATE pets SET hunger = ?, happiness = ?, energy = ?, last_updated = ?
+    WHERE id = ? AND last_updated = ?
+'''
+
+
+def _decay_numpy(codes, hours, values):
+    codes = np.asarray(codes, dtype=np.intp)
+    hours = np.asarray(hours, dtype=np.float64)
+    decayed = []
+    for rates, column in zip(RATES, values):
+        rate = np.asarray(rates, dtype=np.float64)[codes]
+        decayed.append(np.clip(np.asarray(column, dtype=np.float64) - hours * rate, 0.0, 100.0))
+    return hours, decayed
+
+
+def _decay_array(codes, hours, values):
+    hours = array('d', hours)
+    decayed = []
+    for rates, column in zip(RATES, values):
+        decayed.append(array('d', [
+            min(100.0, max(0.0, value - passed * rates[code]))
+            for code, passed, value in zip(codes, hours, column)
+        ]))
+    return hours, decayed
+
+
+def decay_columns(codes, hours, values):
+    """Затухание по столбцам: (часы, [hunger, happiness, energy])"""
+    if np is not None:
+        return _decay_numpy(codes, hours, values)
+    return _decay_array(codes, hours, values)
+
+
+def iter_decayed_chunks(db, now=None, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Текущие показатели всех питомцев частями по chunk_size.
+
+    Каждая часть - словарь столбцов одинаковой длины: id, hours,
+    hunger, happiness, energy и исходные last_updated.
+    """
+    if now is None:
+        now = utcnow()
+    now_text = format_timestamp(now)
+
+    last_id = 0
+    while True:
+        with db.pool.connection() as conn:
+            rows = conn.execute(SQL_DECAY_CHUNK, (now_text, last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+
+        ids, codes, hours, hunger, happiness, energy, last_updated = zip(*rows)
+        hours, decayed = decay_columns(codes, hours, (hunger, happiness, energy))
+        last_id = ids[-1]
+
+        chunk = {'id': ids, 'hours': hours, 'last_updated': last_updated}
+        chunk.update(zip(STATS, decayed))
+        yield chunk
+
+        if len(rows) < chunk_size:
+            return
+
+
+def materialize_decay(db, now=None, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Сохранение накопленного затухания всех питомцев в БД.
+
+    Каждая часть записывается одним executemany в своей транзакции.
+    Питомец, измененный между чтением и записью (например, действием),
+    пропускается: его показатели уже актуальны.
+    """
+    if now is None:
+        now = utcnow()
+    now_text = format_timestamp(now)
+
+    started = time.monotonic()
+    result = {'pets': 0, 'updated': 0, 'skipped': 0, 'chunks': 0}
+
+    for chunk in iter_decayed_chunks(db, now, chunk_size):
+        if np is not None:
+            changed = np.flatnonzero(chunk['hours'] > 0).tolist()
+        else:
+            changed = [index for index, passed in enumerate(chunk['hours']) if passed > 0]
+        result['pets'] += len(chunk['id'])
+        result['chunks'] += 1
+        if not changed:
+            continue
+
+        columns = [chunk[stat] for stat in STATS]
+        if np is not None:
+            columns = [column.tolist() for column in columns]
+        params = [
+            (columns[0][i], columns[1][i], columns[2][i], now_text, chunk['id'][i], chunk['last_updated'][i])
+            for i in changed
+        ]
+
+        def write(conn, params=params):
+            return conn.executemany(SQL_WRITE_DECAY, params).rowcount
+
+        updated = db._write(write)
+        result['updated'] += updated
+        result['skipped'] += len(params) - updated
+
+    # Отображаемые показатели не меняются, но строки в кэше устарели
+    db.pet_cache.clear()
+    result['seconds'] = time.monotonic() - started
+    result['engine'] = 'numpy' if np is not None else 'array'
+    return result
+
+
+if __name__ == '__main__':
+    # Обслуживающий проход: python bulk_decay.py [путь к БД]
+    from database import Database
+
+    db = Database(sys.argv[1] if len(sys.argv) > 1 else 'pets.db')
+    try:
+        result = materialize_decay(db)
+    finally:
+        db.close()
+    print(f"✅ Затухание сохранено ({result['engine']}): питомцев {result['pets']}, "
+          f"обновлено {result['updated']}, пропущено {result['skipped']}, "
+          f"{result['seconds']:.2f} с")
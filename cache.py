@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Ограниченный LRU кэш со временем жизни записей для чтения через кэш
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class LRUCache:
+    """Потокобезопасный LRU кэш с TTL.
+
+    Значения хранятся вместе с моментом истечения. При переполнении
+    вытесняется давно не использованная запись. Кэшируется и отсутствие
+    значения (None), чтобы повторные запросы несуществующих записей
+    тоже не доходили до базы данных.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Поколение увеличивается при каждой инвалидации: значение,
+        # прочитанное до нее, уже не попадет в кэш
+        self._generation = 0
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Значение из кэша или результат load(), сохраненный в кэше"""
+        if not self.enabled:
+            return load()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self._metrics['hits'] += 1
+                    return value
+                del self._data[key]
+                self._metrics['expirations'] += 1
+            self._metrics['misses'] += 1
+            generation = self._generation
+
+        value = load()
+
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (value, now + self.ttl)
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_size:
+                    self._data.popitem(last=False)
+                    self._metrics['evictions'] += 1
+        return value
+
+    def invalidate(self, *keys: Hashable):
+        """Удаление записей после изменения данных"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self._metrics['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики кэша"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['size'] = len(self._data)
+        stats['max_size'] = self.max_size
+        stats['ttl'] = self.ttl
+        return stats
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Сжатие ответов gzip и brotli по заголовку Accept-Encoding.
+
+JSON ответы API сжимаются на лету умеренным уровнем, если тело не
+короче min_size: короткий ответ и так помещается в один TCP сегмент,
+и сжатие только тратит процессор. Статические файлы Mini App сжимаются
+один раз наибольшим уровнем при запуске (static_assets.StaticAssets).
+
+brotli используется, если установлен пакет brotli, иначе только gzip.
+"""
+
+import gzip
+import os
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Порядок предпочтения при равном весе q: brotli сжимает текст лучше gzip
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+DEFAULT_MIN_SIZE = 1024
+
+# Уровни для ответов на лету: заметно быстрее наибольших при почти
+# том же размере
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Уровни для статических файлов, которые сжимаются один раз
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+VARY = b'Vary: Accept-Encoding\r\n'
+ENCODING_BLOCKS = {
+    encoding: b'Content-Encoding: %s\r\n%s' % (encoding.encode('ascii'), VARY)
+    for encoding in ('br', 'gzip')
+}
+
+
+def accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    """Кодировки из Accept-Encoding с весами q (q=0 - кодировка запрещена)"""
+    weights = {}
+    for item in (header or '').split(','):
+        name, *params = item.split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    return weights
+
+
+@lru_cache(maxsize=256)
+def negotiate(header: Optional[str], available: tuple = SUPPORTED_ENCODINGS) -> Optional[str]:
+    """Кодировка из available с наибольшим весом q; None - без сжатия.
+
+    Различных значений Accept-Encoding у браузеров немного, поэтому
+    результат запоминается.
+    """
+    weights = accepted_encodings(header)
+    default = weights.get('*', 0.0)
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, default)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    """Тело, сжатое gzip или br; static - наибольший уровень сжатия"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    # mtime=0: одинаковое тело дает одинаковый результат
+    return gzip.compress(body, STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str):
+    """Сжатие тела, отдаваемого частями. Каждая часть сбрасывается
+    сразу (sync flush), чтобы клиент получал данные по мере чтения из БД."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    for chunk in chunks:
+        if chunk:
+            yield process(chunk) + flush()
+    yield finish()
+
+
+class ResponseCompressor:
+    """Сжатие JSON ответов API и счетчики сжатия.
+
+    encodings - разрешенные кодировки в порядке предпочтения (пустой
+    список отключает сжатие).
+    """
+
+    def __init__(self, min_size: int = DEFAULT_MIN_SIZE, encodings: Iterable[str] = SUPPORTED_ENCODINGS):
+        self.min_size = min_size
+        self.encodings = tuple(encoding for encoding in encodings if encoding in SUPPORTED_ENCODINGS)
+        self._lock = threading.Lock()
+        self._metrics = {
+            'compressed': dict.fromkeys(self.encodings, 0),
+            'uncompressed': 0,
+            'streams': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'seconds': 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCompressor':
+        """Настройки из COMPRESS_MIN_SIZE и COMPRESS_ENCODINGS (через запятую)"""
+        encodings = os.environ.get('COMPRESS_ENCODINGS', ','.join(SUPPORTED_ENCODINGS))
+        return cls(
+            min_size=int(os.environ.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)),
+            encodings=[encoding.strip().lower() for encoding in encodings.split(',')],
+        )
+
+    def encode(self, body: bytes, accept_encoding: Optional[str]) -> tuple:
+        """(тело, кодировка или None, блок заголовков Content-Encoding и Vary).
+
+        Тело короче min_size не зависит от Accept-Encoding и отдается
+        без Vary.
+        """
+        if len(body) < self.min_size or not self.encodings:
+            return body, None, b''
+        encoding = negotiate(accept_encoding, self.encodings)
+        if encoding is None:
+            with self._lock:
+                self._metrics['uncompressed'] += 1
+            return body, None, VARY
+
+        started = time.perf_counter()
+        compressed = compress(body, encoding)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._metrics['seconds'] += elapsed
+            if len(compressed) >= len(body):
+                self._metrics['uncompressed'] += 1
+                return body, None, VARY
+            self._metrics['compressed'][encoding] += 1
+            self._metrics['bytes_in'] += len(body)
+            self._metrics['bytes_out'] += len(compressed)
+        return compressed, encoding, ENCODING_BLOCKS[encoding]
+
+    def stream(self, chunks: Iterable[bytes], accept_encoding: Optional[str]) -> tuple:
+        """(части тела, кодировка или None) для ответа частями; длина
+        такого ответа заранее неизвестна, поэтому min_size не учитывается"""
+        encoding = negotiate(accept_encoding, self.encodings) if self.encodings else None
+        if encoding is None:
+            return chunks, None
+        with self._lock:
+            self._metrics['streams'] += 1
+        return compress_stream(chunks, encoding), encoding
+
+    def stats(self) -> Dict[str, Any]:
+        """Число сжатых ответов по кодировкам, объем до и после сжатия"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['compressed'] = dict(stats['compressed'])
+        compressed = sum(stats['compressed'].values())
+        stats['ratio'] = stats['bytes_out'] / stats['bytes_in'] if stats['bytes_in'] else 1.0
+        stats['avg_compress_us'] = stats.pop('seconds') / compressed * 1e6 if compressed else 0.0
+        stats['min_size'] = self.min_size
+        stats['encodings'] = list(self.encodings)
+        return stats
@@ -40,30 +40,39 @@ ACTIONS = {
         "emoji": "🍽️",
         "hunger": 30,
         "happiness": 5,
-        "energy": 0
+        "energy": 0,
+        "experience": 5
     },
     "play": {
         "name": "Поиграть",
         "emoji": "🎾",
         "hunger": -5,
         "happiness": 25,
-        "energy": -10
+        "energy": -10,
+        "experience": 15,
+        "min_energy": 10  # слишком уставший питомец не играет
     },
     "sleep": {
         "name": "Уложить спать",
         "emoji": "😴",
         "hunger": -2,
         "happiness": 0,
-        "energy": 40
+        "energy": 40,
+        "experience": 10,
+        "max_energy": 80  # бодрого питомца не уложить спать
     },
     "pet": {
         "name": "Погладить",
         "emoji": "🤗",
         "hunger": 0,
         "happiness": 15,
-        "energy": 0
+        "energy": 0,
+        "experience": 8
     }
 }
 
+# Опыт для перехода с уровня L на следующий: L * LEVEL_EXPERIENCE
+LEVEL_EXPERIENCE = 100
+
 # Настройки уведомлений
 NOTIFICATION_INTERVAL = 3600  # 1 час в секундах 
\ No newline at end of file
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Политика CORS для API.
+
+Запрос Mini App с Content-Type: application/json не является "простым",
+поэтому браузер предваряет его запросом OPTIONS (preflight). Ответ на
+preflight содержит Access-Control-Max-Age: браузер запоминает его и не
+повторяет preflight для того же адреса, пока не истечет срок (Chrome
+ограничивает срок двумя часами, Firefox - сутками).
+
+Все варианты заголовков собираются при создании политики: для каждого
+разрешенного источника (или одного '*') - блок заголовков обычных
+ответов и заголовки ответа на preflight. Для запроса остается только
+поиск в словаре по заголовку Origin.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from responses import header_block
+
+DEFAULT_METHODS = 'GET, POST, PUT, DELETE, OPTIONS'
+DEFAULT_HEADERS = 'Content-Type, Authorization'
+DEFAULT_MAX_AGE = 86400
+
+JSON_CONTENT_TYPE = b'Content-Type: application/json\r\n'
+
+# Окно, за которое считается частота preflight запросов, секунд
+RATE_WINDOW = 60
+
+
+class RateCounter:
+    """Число событий за последние window секунд (по секундным корзинам)"""
+
+    def __init__(self, window: int = RATE_WINDOW):
+        self.window = window
+        self._counts = [0] * window
+        self._seconds = [0] * window
+
+    def hit(self, now: float = None):
+        second = int(time.monotonic() if now is None else now)
+        index = second % self.window
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._counts[index] = 0
+        self._counts[index] += 1
+
+    def total(self, now: float = None) -> int:
+        second = int(time.monotonic() if now is None else now)
+        return sum(count for count, moment in zip(self._counts, self._seconds)
+                   if second - moment < self.window)
+
+
+class CORSPolicy:
+    """Разрешенные источники, срок кэширования preflight и счетчики.
+
+    origins - источники вида https://example.com; '*' разрешает любой.
+    Ответ на запрос из неразрешенного источника не содержит заголовков
+    CORS (браузер не отдаст его странице), а preflight получает 403.
+    """
+
+    def __init__(self, origins: Iterable[str] = ('*',), max_age: int = DEFAULT_MAX_AGE,
+                 methods: str = DEFAULT_METHODS, allow_headers: str = DEFAULT_HEADERS):
+        origins = [origin.strip().rstrip('/') for origin in origins if origin.strip()]
+        self.any_origin = '*' in origins
+        self.origins = frozenset(origin for origin in origins if origin != '*')
+        self.max_age = max_age
+
+        # Для '*' один вариант (ключ None), иначе - по варианту на источник
+        if self.any_origin:
+            variants = {None: '*'}
+            # Без списка источников ответ не зависит от Origin
+            self._missing = None
+        else:
+            variants = {origin: origin for origin in self.origins}
+            # Ответ для неразрешенного источника тоже зависит от Origin
+            self._missing = b'Vary: Origin\r\n'
+
+        self._blocks = {}
+        self._json_blocks = {}
+        self._pairs = {}
+        self._preflights = {}
+        for key, value in variants.items():
+            pairs = (('Access-Control-Allow-Origin', value),)
+            if not self.any_origin:
+                pairs += (('Vary', 'Origin'),)
+            block = header_block(pairs)
+            self._pairs[key] = pairs
+            self._blocks[key] = block
+            self._json_blocks[key] = block + JSON_CONTENT_TYPE
+            self._preflights[key] = block + header_block((
+                ('Access-Control-Allow-Methods', methods),
+                ('Access-Control-Allow-Headers', allow_headers),
+                ('Access-Control-Max-Age', str(max_age)),
+            ))
+        if self._missing is not None:
+            self._blocks[False] = self._missing
+            self._json_blocks[False] = self._missing + JSON_CONTENT_TYPE
+            self._pairs[False] = (('Vary', 'Origin'),)
+
+        self._lock = threading.Lock()
+        self._preflight_rate = RateCounter()
+        self._metrics = {
+            'preflight_requests': 0,
+            'rejected_preflights': 0,
+            'cors_requests': 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> 'CORSPolicy':
+        """Политика из CORS_ALLOWED_ORIGINS (через запятую) и CORS_MAX_AGE"""
+        return cls(
+            origins=os.environ.get('CORS_ALLOWED_ORIGINS', '*').split(','),
+            max_age=int(os.environ.get('CORS_MAX_AGE', DEFAULT_MAX_AGE)),
+        )
+
+    def _variant(self, origin: Optional[str]):
+        """Ключ заранее собранных заголовков; False - источник не разрешен"""
+        if self.any_origin:
+            return None
+        return origin if origin in self.origins else False
+
+    # Обычные запросы
+
+    def _count_request(self, origin: Optional[str]):
+        if origin is not None:
+            with self._lock:
+                self._metrics['cors_requests'] += 1
+
+    def block(self, origin: Optional[str]) -> bytes:
+        """Закодированные заголовки CORS ответа на запрос из origin"""
+        self._count_request(origin)
+        return self._blocks[self._variant(origin)]
+
+    def json_block(self, origin: Optional[str]) -> bytes:
+        """block() вместе с Content-Type: application/json"""
+        self._count_request(origin)
+        return self._json_blocks[self._variant(origin)]
+
+    def pairs(self, origin: Optional[str]) -> tuple:
+        """Заголовки CORS парами (имя, значение) для send_header"""
+        self._count_request(origin)
+        return self._pairs[self._variant(origin)]
+
+    # Preflight
+
+    def _count_preflight(self, variant):
+        with self._lock:
+            self._metrics['preflight_requests'] += 1
+            if variant is False:
+                self._metrics['rejected_preflights'] += 1
+            self._preflight_rate.hit()
+
+    def preflight(self, origin: Optional[str]) -> tuple:
+        """(статус, заголовки, тело) ответа на preflight для send_prepared"""
+        variant = self._variant(origin)
+        self._count_preflight(variant)
+        if variant is False:
+            return 403, self._missing, b''
+        return 204, self._preflights[variant], None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики preflight и запросов из других источников"""
+        with self._lock:
+            stats = dict(self._metrics)
+            recent = self._preflight_rate.total()
+        total = stats['preflight_requests'] + stats['cors_requests']
+        stats['preflight_share'] = stats['preflight_requests'] / total if total else 0.0
+        stats['preflight_per_s'] = recent / self._preflight_rate.window
+        stats['max_age_s'] = self.max_age
+        stats['allowed_origins'] = ['*'] if self.any_origin else sorted(self.origins)
+        return stats
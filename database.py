@@ -1,198 +1,835 @@
 import sqlite3
 import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 
-class Database:
-    def __init__(self, db_path: str = "pets.db"):
+from action_history import archived_actions
+from action_log import MODES as ACTION_LOG_MODES, ActionLogBuffer, current_timestamp
+from cache import LRUCache
+from records import Couple, Pet
+from storage import PET_MUTABLE_COLUMNS, Storage
+
+
+# Миграции схемы: (версия, описание, SQL-выражения).
+# Текущая версия хранится в PRAGMA user_version, поэтому при старте
+# процесса выполняется только чтение, если схема уже актуальна.
+MIGRATIONS = [
+    (1, "начальная схема", [
+        # Таблица пар
+        '''
+        CREATE TABLE IF NOT EXISTS couples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user1_id INTEGER NOT NULL,
+            user2_id INTEGER NOT NULL,
+            user1_name TEXT,
+            user2_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user1_id, user2_id)
+        )
+        ''',
+        # Таблица питомцев. Показатели hunger, happiness и energy после
+        # затухания дробные: в столбцах INTEGER SQLite хранит их как REAL,
+        # округляет только ответ API. last_updated - UTC в формате
+        # CURRENT_TIMESTAMP (pet_manager.format_timestamp)
+        '''
+        CREATE TABLE IF NOT EXISTS pets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            couple_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            pet_type TEXT NOT NULL,
+            hunger INTEGER DEFAULT 100,
+            happiness INTEGER DEFAULT 100,
+            energy INTEGER DEFAULT 100,
+            level INTEGER DEFAULT 1,
+            experience INTEGER DEFAULT 0,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (couple_id) REFERENCES couples (id)
+        )
+        ''',
+        # Таблица действий
+        '''
+        CREATE TABLE IF NOT EXISTS actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pet_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            action_type TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (pet_id) REFERENCES pets (id)
+        )
+        ''',
+    ]),
+    (2, "индексы и таблица пользователь → пара", [
+        # Для каждого пользователя хранится одна пара (самая ранняя, как и
+        # при прежнем поиске по user1_id OR user2_id)
+        '''
+        CREATE TABLE IF NOT EXISTS user_couples (
+            user_id INTEGER PRIMARY KEY,
+            couple_id INTEGER NOT NULL
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO user_couples (user_id, couple_id)
+        SELECT user_id, MIN(id) FROM (
+            SELECT user1_id AS user_id, id FROM couples
+            UNION ALL
+            SELECT user2_id AS user_id, id FROM couples
+        ) GROUP BY user_id
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_pets_couple_id ON pets (couple_id)',
+        'CREATE INDEX IF NOT EXISTS idx_actions_pet_timestamp ON actions (pet_id, timestamp)',
+    ]),
+    (3, "дневные итоги действий", [
+        # Число действий каждого типа за день; заполняется при переносе
+        # старых действий в архив (см. action_history.py)
+        '''
+        CREATE TABLE IF NOT EXISTS action_rollups (
+            pet_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            action_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (pet_id, day, action_type)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (4, "версии пар и питомцев", [
+        # Увеличиваются при каждом изменении строки; из них строится ETag
+        'ALTER TABLE couples ADD COLUMN version INTEGER NOT NULL DEFAULT 1',
+        'ALTER TABLE pets ADD COLUMN version INTEGER NOT NULL DEFAULT 1',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Горячие запросы на чтение. План каждого из них проверяется
+# find_full_scans(): ни один не должен приводить к полному просмотру таблицы.
+# Столбцы перечисляются в порядке полей записей, чтобы from_row строил
+# запись прямо из кортежа строки.
+SQL_GET_COUPLE = f'''
+    SELECT {Couple.columns()} FROM couples
+    WHERE (user1_id = ? AND user2_id = ?) OR (user1_id = ? AND user2_id = ?)
+'''
+
+SQL_GET_USER_COUPLE = f'''
+    SELECT {', '.join('couples.' + column for column in Couple.__slots__)} FROM user_couples
+    JOIN couples ON couples.id = user_couples.couple_id
+    WHERE user_couples.user_id = ?
+'''
+
+SQL_GET_COUPLE_BY_ID = f'''
+    SELECT {Couple.columns()} FROM couples WHERE id = ?
+'''
+
+SQL_GET_PET = f'''
+    SELECT {Pet.columns()} FROM pets WHERE couple_id = ?
+'''
+
+SQL_ITER_PETS = f'''
+    SELECT {Pet.columns()} FROM pets WHERE id > ? ORDER BY id LIMIT ?
+'''
+
+SQL_INSERT_ACTION = '''
+    INSERT INTO actions (pet_id, user_id, action_type)
+    VALUES (?, ?, ?)
+'''
+
+# Время действия задается явно: строка буфера записывается позже
+SQL_INSERT_ACTION_AT = '''
+    INSERT INTO actions (pet_id, user_id, action_type, timestamp)
+    VALUES (?, ?, ?, ?)
+'''
+
+SQL_GET_RECENT_ACTIONS = '''
+    SELECT * FROM actions
+    WHERE pet_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+# Следующая страница истории: ключ (timestamp, id) вместо OFFSET, поэтому
+# каждая страница - поиск по индексу idx_actions_pet_timestamp
+SQL_GET_ACTIONS_BEFORE = '''
+    SELECT * FROM actions
+    WHERE pet_id = ? AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+SQL_GET_ACTION_ROLLUPS = '''
+    SELECT day, action_type, count FROM action_rollups
+    WHERE pet_id = ? AND day >= ?
+    ORDER BY day, action_type
+'''
+
+# Месяцы, действия питомца за которые перенесены в архивы
+SQL_GET_ARCHIVED_MONTHS = '''
+    SELECT DISTINCT substr(day, 1, 7) FROM action_rollups WHERE pet_id = ?
+'''
+
+HOT_QUERIES = {
+    'get_couple': (SQL_GET_COUPLE, (1, 2, 2, 1)),
+    'get_user_couple': (SQL_GET_USER_COUPLE, (1,)),
+    'get_couple_by_id': (SQL_GET_COUPLE_BY_ID, (1,)),
+    'get_pet': (SQL_GET_PET, (1,)),
+    'iter_pets': (SQL_ITER_PETS, (0, 1000)),
+    'get_recent_actions': (SQL_GET_RECENT_ACTIONS, (1, 10)),
+    'get_actions_before': (SQL_GET_ACTIONS_BEFORE, (1, '2025-01-01 00:00:00', 1, 10)),
+    'get_action_rollups': (SQL_GET_ACTION_ROLLUPS, (1, '')),
+    'get_archived_months': (SQL_GET_ARCHIVED_MONTHS, (1,)),
+}
+
+# Настройки соединений для продакшен-режима: WAL позволяет читателям
+# работать параллельно с единственным писателем
+PRODUCTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA busy_timeout = 5000',
+)
+
+
+def connect(db_path: str, pragmas=()) -> sqlite3.Connection:
+    """Открытие соединения SQLite с заданными PRAGMA"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Потокобезопасный пул долгоживущих соединений SQLite.
+
+    Соединение выдается потоку целиком: вложенные вызовы connection()
+    в том же потоке получают то же соединение, а фиксация транзакции
+    происходит при выходе из внешнего блока. Число одновременно выданных
+    соединений ограничено max_size.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 8, timeout: float = 5.0,
+                 health_check_interval: float = 30.0, pragmas=()):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.pragmas = tuple(pragmas)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []  # (соединение, время возврата в пул)
+        self._local = threading.local()
+        self._closed = False
+
+        self._metrics = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_checks': 0,
+            'health_check_failures': 0,
+            'wait_time_total': 0.0,
+        }
+        self._in_use = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Создание нового соединения"""
+        conn = connect(self.db_path, self.pragmas)
+        with self._lock:
+            self._metrics['created'] += 1
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        """Закрытие соединения, выведенного из пула"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._metrics['closed'] += 1
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        """Проверка, что соединение еще живо"""
+        with self._lock:
+            self._metrics['health_checks'] += 1
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            with self._lock:
+                self._metrics['health_check_failures'] += 1
+            return False
+
+    def _checkout(self) -> sqlite3.Connection:
+        """Получение соединения из пула (или создание нового)"""
+        if self._closed:
+            raise PoolTimeoutError("Пул соединений закрыт")
+
+        if not self._slots.acquire(blocking=False):
+            started = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            with self._lock:
+                self._metrics['waits'] += 1
+                self._metrics['wait_time_total'] += time.monotonic() - started
+                if not acquired:
+                    self._metrics['timeouts'] += 1
+            if not acquired:
+                raise PoolTimeoutError(
+                    f"Нет свободных соединений (max_size={self.max_size})"
+                )
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, released_at = self._idle.pop()
+                if (time.monotonic() - released_at < self.health_check_interval
+                        or self._is_healthy(conn)):
+                    with self._lock:
+                        self._metrics['reused'] += 1
+                        self._metrics['checkouts'] += 1
+                        self._in_use += 1
+                    return conn
+                self._discard(conn)
+
+            conn = self._connect()
+            with self._lock:
+                self._metrics['checkouts'] += 1
+                self._in_use += 1
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: sqlite3.Connection, broken: bool = False):
+        """Возврат соединения в пул"""
+        with self._lock:
+            self._in_use -= 1
+            keep = not broken and not self._closed
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+        if not keep:
+            self._discard(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Соединение для текущего потока; коммит при успешном выходе"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            raise
+        finally:
+            self._local.conn = None
+            self._checkin(conn, broken)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики пула"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['in_use'] = self._in_use
+            stats['idle'] = len(self._idle)
+        stats['max_size'] = self.max_size
+        return stats
+
+    def close(self):
+        """Закрытие всех свободных соединений; выданные закроются при возврате"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+class WriteQueue:
+    """Единственный поток записи с групповой фиксацией.
+
+    Операции записи (функции, принимающие соединение) ставятся в очередь;
+    поток-писатель забирает все накопившиеся операции, выполняет каждую
+    в своей точке сохранения и фиксирует пачку одним COMMIT.
+    Ошибка одной операции откатывает только ее.
+    """
+
+    def __init__(self, db_path: str, pragmas=(), max_batch: int = 256):
+        self.db_path = db_path
+        self.pragmas = tuple(pragmas)
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._metrics = {
+            'writes': 0,
+            'failed_writes': 0,
+            'batches': 0,
+            'largest_batch': 0,
+        }
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, operation):
+        """Выполнение операции записи; возвращает ее результат после фиксации"""
+        future = Future()
+        self._queue.put((operation, future))
+        return future.result()
+
+    def _next_batch(self):
+        """Ожидание операций и выборка всех уже накопившихся"""
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = connect(self.db_path, self.pragmas)
+        conn.isolation_level = None  # транзакциями управляем сами
+
+        running = True
+        while running:
+            batch = self._next_batch()
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            if not batch:
+                continue
+
+            results = []
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for operation, future in batch:
+                    conn.execute('SAVEPOINT write_op')
+                    try:
+                        results.append((future, operation(conn), None))
+                        conn.execute('RELEASE write_op')
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO write_op')
+                        conn.execute('RELEASE write_op')
+                        results.append((future, None, e))
+                conn.execute('COMMIT')
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                results = [(future, None, e) for _, future in batch]
+
+            failed = 0
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    failed += 1
+                    future.set_exception(error)
+
+            with self._lock:
+                self._metrics['writes'] += len(results) - failed
+                self._metrics['failed_writes'] += failed
+                self._metrics['batches'] += 1
+                self._metrics['largest_batch'] = max(self._metrics['largest_batch'], len(batch))
+
+        conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики очереди записи"""
+        with self._lock:
+            stats = dict(self._metrics)
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
+
+    def close(self):
+        """Выполнение оставшихся операций и остановка потока-писателя"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class Database(Storage):
+    def __init__(self, db_path: str = "pets.db", pool_size: int = 8, production: bool = False,
+                 cache_size: int = 10000, cache_ttl: float = 30.0,
+                 action_log: str = 'sync', action_log_delay: float = 0.05,
+                 action_log_batch: int = 1000):
+        """production: WAL, настроенные PRAGMA и запись через один поток.
+        
+        get_user_couple и get_pet читают через кэш на cache_size записей
+        (0 отключает кэш); записи через методы Database его инвалидируют.
+        
+        action_log: sync - строка журнала действий пишется в транзакции
+        действия; buffered - через буфер action_log.ActionLogBuffer, который
+        записывает строки не позже чем через action_log_delay секунд.
+        """
+        # Проверка до открытия соединений и потока записи
+        if action_log not in ACTION_LOG_MODES:
+            raise ValueError(f"Неизвестный режим журнала действий: {action_log} "
+                             f"(допустимы {', '.join(ACTION_LOG_MODES)})")
         self.db_path = db_path
+        self.production = production
+        pragmas = PRODUCTION_PRAGMAS if production else ()
+        self.pool = ConnectionPool(db_path, max_size=pool_size, pragmas=pragmas)
         self.init_database()
+        self.writer = WriteQueue(db_path, pragmas) if production else None
+        # Пара пользователя по user_id и питомец пары по couple_id
+        self.couple_cache = LRUCache(cache_size, cache_ttl)
+        self.pet_cache = LRUCache(cache_size, cache_ttl)
+        # Отложенная запись журнала действий (None - синхронная)
+        self.action_log = None
+        if action_log == 'buffered':
+            self.action_log = ActionLogBuffer(self._insert_actions, action_log_delay, action_log_batch)
+    
+    def close(self):
+        """Закрытие соединений с базой данных"""
+        if self.action_log is not None:
+            # Буфер пишет через очередь записи, поэтому сбрасывается первым
+            self.action_log.close()
+        if self.writer is not None:
+            self.writer.close()
+        self.pool.close()
+    
+    def _write(self, operation):
+        """Выполнение операции записи operation(conn) в одной транзакции"""
+        if self.writer is not None:
+            return self.writer.submit(operation)
+        with self.pool.connection() as conn:
+            if not conn.in_transaction:
+                # Блокировка записи берется сразу, чтобы чтение внутри
+                # операции не устарело к моменту записи
+                conn.execute('BEGIN IMMEDIATE')
+            return operation(conn)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Метрики пула соединений, очереди записи и кэшей"""
+        return {
+            'backend': 'sqlite',
+            'pool': self.pool.stats(),
+            'writer': self.writer.stats() if self.writer is not None else None,
+            'couple_cache': self.couple_cache.stats(),
+            'pet_cache': self.pet_cache.stats(),
+            'action_log': self.action_log.stats() if self.action_log is not None else {'mode': 'sync'},
+        }
+    
+    def find_full_scans(self) -> List[Dict]:
+        """Поиск горячих запросов, план которых содержит полный просмотр (SCAN)"""
+        scans = []
+        with self.pool.connection() as conn:
+            for name, (query, params) in HOT_QUERIES.items():
+                for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params):
+                    detail = row[-1]
+                    if detail.startswith('SCAN'):
+                        scans.append({'query': name, 'detail': detail})
+        return scans
     
     def init_database(self):
-        """Инициализация базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Таблица пар
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS couples (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user1_id INTEGER NOT NULL,
-                    user2_id INTEGER NOT NULL,
-                    user1_name TEXT,
-                    user2_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user1_id, user2_id)
-                )
-            ''')
-            
-            # Таблица питомцев
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS pets (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    couple_id INTEGER NOT NULL,
-                    name TEXT NOT NULL,
-                    pet_type TEXT NOT NULL,
-                    hunger INTEGER DEFAULT 100,
-                    happiness INTEGER DEFAULT 100,
-                    energy INTEGER DEFAULT 100,
-                    level INTEGER DEFAULT 1,
-                    experience INTEGER DEFAULT 0,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (couple_id) REFERENCES couples (id)
-                )
-            ''')
+        """Инициализация базы данных: применение недостающих миграций схемы"""
+        with self.pool.connection() as conn:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                return
             
-            # Таблица действий
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS actions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pet_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    action_type TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (pet_id) REFERENCES pets (id)
-                )
-            ''')
-            
-            conn.commit()
+            # Блокируем запись, чтобы параллельно стартующие процессы
+            # не применили одну и ту же миграцию дважды
+            conn.execute('BEGIN IMMEDIATE')
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            for version, description, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                print(f"🛠️ Миграция схемы {version}: {description}")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version}')
     
     def create_couple(self, user1_id: int, user2_id: int, user1_name: str, user2_name: str) -> int:
         """Создание новой пары"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+        def write(conn):
+            cursor = conn.execute('''
                 INSERT OR REPLACE INTO couples (user1_id, user2_id, user1_name, user2_name)
                 VALUES (?, ?, ?, ?)
             ''', (user1_id, user2_id, user1_name, user2_name))
-            conn.commit()
-            return cursor.lastrowid
+            couple_id = cursor.lastrowid
+            
+            # Привязка пользователей к паре. Существующая привязка
+            # сохраняется, если только ее пара не была заменена
+            conn.executemany('''
+                INSERT INTO user_couples (user_id, couple_id) VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET couple_id = excluded.couple_id
+                WHERE NOT EXISTS (SELECT 1 FROM couples WHERE id = user_couples.couple_id)
+            ''', ((user1_id, couple_id), (user2_id, couple_id)))
+            return couple_id
+        
+        couple_id = self._write(write)
+        self.couple_cache.invalidate(user1_id, user2_id)
+        return couple_id
     
-    def get_couple(self, user1_id: int, user2_id: int) -> Optional[Dict]:
+    def get_couple(self, user1_id: int, user2_id: int) -> Optional[Couple]:
         """Получение информации о паре"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM couples 
-                WHERE (user1_id = ? AND user2_id = ?) OR (user1_id = ? AND user2_id = ?)
-            ''', (user1_id, user2_id, user2_id, user1_id))
-            result = cursor.fetchone()
-            
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            cursor.row_factory = Couple.from_row
+            cursor.execute(SQL_GET_COUPLE, (user1_id, user2_id, user2_id, user1_id))
+            return cursor.fetchone()
     
-    def get_user_couple(self, user_id: int) -> Optional[Dict]:
+    def get_user_couple(self, user_id: int) -> Optional[Couple]:
         """Получение пары пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        # Записи неизменяемы, поэтому кэш отдает один экземпляр без копирования
+        return self.couple_cache.get_or_load(user_id, lambda: self._load_user_couple(user_id))
+    
+    def _load_user_couple(self, user_id: int) -> Optional[Couple]:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM couples 
-                WHERE user1_id = ? OR user2_id = ?
-            ''', (user_id, user_id))
-            result = cursor.fetchone()
-            
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            cursor.row_factory = Couple.from_row
+            cursor.execute(SQL_GET_USER_COUPLE, (user_id,))
+            return cursor.fetchone()
+    
+    def get_couple_by_id(self, couple_id: int) -> Optional[Couple]:
+        """Получение пары по id"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = Couple.from_row
+            cursor.execute(SQL_GET_COUPLE_BY_ID, (couple_id,))
+            return cursor.fetchone()
     
     def create_pet(self, couple_id: int, name: str, pet_type: str) -> int:
         """Создание нового питомца"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+        def write(conn):
+            cursor = conn.execute('''
                 INSERT INTO pets (couple_id, name, pet_type)
                 VALUES (?, ?, ?)
             ''', (couple_id, name, pet_type))
-            conn.commit()
             return cursor.lastrowid
+        
+        pet_id = self._write(write)
+        self.pet_cache.invalidate(couple_id)
+        return pet_id
     
-    def get_pet(self, couple_id: int) -> Optional[Dict]:
+    def get_pet(self, couple_id: int) -> Optional[Pet]:
         """Получение питомца пары"""
-        with sqlite3.connect(self.db_path) as conn:
+        return self.pet_cache.get_or_load(couple_id, lambda: self._load_pet(couple_id))
+    
+    def _load_pet(self, couple_id: int) -> Optional[Pet]:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM pets WHERE couple_id = ?
-            ''', (couple_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, result))
-            return None
+            cursor.row_factory = Pet.from_row
+            cursor.execute(SQL_GET_PET, (couple_id,))
+            return cursor.fetchone()
+    
+    def iter_pets(self, chunk_size: int = 10000) -> Iterator[Pet]:
+        """Все питомцы по возрастанию id, частями по chunk_size строк"""
+        last_id = 0
+        while True:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = Pet.from_row
+                pets = cursor.execute(SQL_ITER_PETS, (last_id, chunk_size)).fetchall()
+            yield from pets
+            if len(pets) < chunk_size:
+                return
+            last_id = pets[-1].id
     
     def update_pet_stats(self, pet_id: int, hunger: int = None, happiness: int = None, 
                         energy: int = None, level: int = None, experience: int = None):
         """Обновление статистики питомца"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            updates = []
-            values = []
-            
-            if hunger is not None:
-                updates.append("hunger = ?")
-                values.append(max(0, min(100, hunger)))
-            
-            if happiness is not None:
-                updates.append("happiness = ?")
-                values.append(max(0, min(100, happiness)))
+        updates = []
+        values = []
+        
+        if hunger is not None:
+            updates.append("hunger = ?")
+            values.append(max(0, min(100, hunger)))
+        
+        if happiness is not None:
+            updates.append("happiness = ?")
+            values.append(max(0, min(100, happiness)))
+        
+        if energy is not None:
+            updates.append("energy = ?")
+            values.append(max(0, min(100, energy)))
+        
+        if level is not None:
+            updates.append("level = ?")
+            values.append(level)
+        
+        if experience is not None:
+            updates.append("experience = ?")
+            values.append(experience)
+        
+        if updates:
+            updates.append("last_updated = CURRENT_TIMESTAMP")
+            updates.append("version = version + 1")
+            values.append(pet_id)
             
-            if energy is not None:
-                updates.append("energy = ?")
-                values.append(max(0, min(100, energy)))
+            query = f"UPDATE pets SET {', '.join(updates)} WHERE id = ?"
             
-            if level is not None:
-                updates.append("level = ?")
-                values.append(level)
+            def write(conn):
+                conn.execute(query, values)
+                row = conn.execute('SELECT couple_id FROM pets WHERE id = ?', (pet_id,)).fetchone()
+                return row[0] if row else None
             
-            if experience is not None:
-                updates.append("experience = ?")
-                values.append(experience)
-            
-            if updates:
-                updates.append("last_updated = CURRENT_TIMESTAMP")
-                values.append(pet_id)
-                
-                query = f"UPDATE pets SET {', '.join(updates)} WHERE id = ?"
-                cursor.execute(query, values)
-                conn.commit()
+            couple_id = self._write(write)
+            if couple_id is not None:
+                self.pet_cache.invalidate(couple_id)
+    
+    def modify_pet(self, couple_id: int, mutate, log_action: tuple = None):
+        """Атомарное чтение-изменение-запись питомца пары.
+        
+        mutate(pet) вызывается внутри транзакции и возвращает пару
+        (изменения полей или None, результат). Изменения и запись в журнал
+        действий log_action=(user_id, action_type) фиксируются одним коммитом.
+        Возвращает результат mutate или None, если питомца нет.
+        """
+        return self.modify_pets([(couple_id, mutate, log_action)])[0]
+    
+    def modify_pets(self, items: List[tuple]) -> List[Any]:
+        """Несколько modify_pet одной транзакцией и одним коммитом.
+        
+        items - список (couple_id, mutate, log_action). Исключение в любом
+        элементе откатывает весь список.
+        """
+        # В буферизованном режиме строки журнала ставятся в буфер только
+        # после фиксации изменений питомцев
+        logged = [] if self.action_log is not None else None
+        
+        def write(conn):
+            return [self._modify_in(conn, couple_id, mutate, log_action, logged)
+                    for couple_id, mutate, log_action in items]
+        
+        try:
+            results = self._write(write)
+        finally:
+            self.pet_cache.invalidate(*{couple_id for couple_id, _, _ in items})
+        if logged:
+            self.action_log.add(logged)
+        return results
+    
+    def _modify_in(self, conn, couple_id: int, mutate, log_action: tuple = None, logged: list = None):
+        """Тело modify_pet внутри уже открытой транзакции; если передан
+        список logged, строка журнала действий добавляется в него"""
+        cursor = conn.cursor()
+        cursor.row_factory = Pet.from_row
+        pet = cursor.execute(SQL_GET_PET, (couple_id,)).fetchone()
+        if pet is None:
+            return None
+        
+        changes, result = mutate(pet)
+        if changes is None:
+            return result
+        
+        unknown = set(changes) - PET_MUTABLE_COLUMNS
+        if unknown:
+            raise ValueError(f"Недопустимые поля питомца: {sorted(unknown)}")
+        
+        assignments = [f"{column} = ?" for column in changes]
+        values = list(changes.values())
+        if 'last_updated' not in changes:
+            assignments.append("last_updated = CURRENT_TIMESTAMP")
+        assignments.append("version = version + 1")
+        conn.execute(
+            f"UPDATE pets SET {', '.join(assignments)} WHERE id = ?",
+            values + [pet['id']]
+        )
+        
+        if log_action is not None:
+            user_id, action_type = log_action
+            if logged is None:
+                conn.execute(SQL_INSERT_ACTION, (pet['id'], user_id, action_type))
+            else:
+                logged.append((pet['id'], user_id, action_type, current_timestamp()))
+        return result
     
     def log_action(self, pet_id: int, user_id: int, action_type: str):
         """Логирование действия с питомцем"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO actions (pet_id, user_id, action_type)
-                VALUES (?, ?, ?)
-            ''', (pet_id, user_id, action_type))
-            conn.commit()
+        if self.action_log is not None:
+            self.action_log.add([(pet_id, user_id, action_type, current_timestamp())])
+            return
+        self._write(lambda conn: conn.execute(SQL_INSERT_ACTION, (pet_id, user_id, action_type)))
+    
+    def _insert_actions(self, rows: List[tuple]):
+        """Запись строк буфера журнала действий одной транзакцией"""
+        self._write(lambda conn: conn.executemany(SQL_INSERT_ACTION_AT, rows))
     
     def get_recent_actions(self, pet_id: int, limit: int = 10) -> List[Dict]:
         """Получение последних действий с питомцем"""
-        with sqlite3.connect(self.db_path) as conn:
+        return self.get_actions_page(pet_id, None, limit)
+    
+    def get_actions_page(self, pet_id: int, before: tuple = None, limit: int = 50) -> List[Dict]:
+        """Страница истории действий питомца (см. Storage.get_actions_page)"""
+        if self.action_log is not None:
+            # Чтение видит все действия, выполненные до него
+            self.action_log.flush()
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM actions 
-                WHERE pet_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (pet_id, limit))
+            if before is None:
+                cursor.execute(SQL_GET_RECENT_ACTIONS, (pet_id, limit))
+            else:
+                cursor.execute(SQL_GET_ACTIONS_BEFORE, (pet_id, *before, limit))
             
             results = cursor.fetchall()
             columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in results]
+            actions = [dict(zip(columns, row)) for row in results]
+            
+            if len(actions) < limit:
+                # Действия старше горячего окна перенесены в архивы по
+                # месяцам; итоги называют месяцы, где есть этот питомец
+                months = [month for month, in cursor.execute(SQL_GET_ARCHIVED_MONTHS, (pet_id,))]
+            else:
+                months = []
+        
+        if months:
+            if actions:
+                before = (actions[-1]['timestamp'], actions[-1]['id'])
+            actions.extend(archived_actions(self.db_path, pet_id, limit - len(actions), before,
+                                            months))
+        return actions
+    
+    def get_action_rollups(self, pet_id: int, since: str = '') -> List[Dict]:
+        """Дневные итоги действий питомца, перенесенных в архив (с дня since, ГГГГ-ММ-ДД)"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_GET_ACTION_ROLLUPS, (pet_id, since)).fetchall()
+        return [{'day': day, 'action_type': action_type, 'count': count}
+                for day, action_type, count in rows]
     
     def update_couple_names(self, couple_id: int, user1_name: str, user2_name: str):
         """Обновление имен в паре"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE couples 
-                SET user1_name = ?, user2_name = ?
+        def write(conn):
+            conn.execute('''
+                UPDATE couples
+                SET user1_name = ?, user2_name = ?, version = version + 1
                 WHERE id = ?
             ''', (user1_name, user2_name, couple_id))
-            conn.commit() 
\ No newline at end of file
+            return conn.execute(
+                'SELECT user1_id, user2_id FROM couples WHERE id = ?', (couple_id,)
+            ).fetchone()
+        
+        users = self._write(write)
+        if users is not None:
+            self.couple_cache.invalidate(*users)
+
+if __name__ == '__main__':
+    # Проверка планов горячих запросов: python database.py [путь к БД]
+    import sys
+
+    db = Database(sys.argv[1] if len(sys.argv) > 1 else ':memory:')
+
+    scans = db.find_full_scans()
+    for scan in scans:
+        print(f"❌ {scan['query']}: {scan['detail']}")
+    if scans:
+        sys.exit(1)
+    print(f"✅ Все горячие запросы ({len(HOT_QUERIES)}) используют индексы")
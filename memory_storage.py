@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Хранилище состояния в памяти процесса (альтернатива SQLite).
+
+Пары и питомцы хранятся кортежами в словарях, поэтому чтение и запись
+занимают микросекунды. Каждая операция записи сначала добавляется
+строкой в журнал операций (только дозапись), затем применяется к
+состоянию. Каждые snapshot_every записей состояние сохраняется снимком,
+а журнал очищается. При старте загружается снимок и повторяются записи
+журнала после него.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: защиты от открытия из нескольких процессов нет
+    fcntl = None
+
+from records import Couple, Pet
+from storage import PET_MUTABLE_COLUMNS, Storage
+
+# Кортежи пар и питомцев хранят значения в порядке полей записей
+ACTION_COLUMNS = ('id', 'pet_id', 'user_id', 'action_type', 'timestamp')
+PET_INDEX = {column: index for index, column in enumerate(Pet.__slots__)}
+PET_VERSION = PET_INDEX['version']
+
+# Сколько последних действий хранится для каждого питомца
+ACTION_HISTORY = 100
+
+
+def _current_timestamp() -> str:
+    """Текущее время в формате CURRENT_TIMESTAMP SQLite"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class MemoryStorage(Storage):
+    """Состояние в памяти с журналом операций и снимками.
+
+    Записи выполняются под одной блокировкой и заменяют кортежи целиком,
+    поэтому чтение идет без блокировки и никогда не видит питомца,
+    обновленного наполовину. Состояние принадлежит одному процессу:
+    открыть те же файлы из второго процесса нельзя.
+    """
+
+    def __init__(self, path: str = 'pets_state', snapshot_every: int = 100000,
+                 fsync: bool = False, action_history: int = ACTION_HISTORY):
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.log_path = path + '.oplog'
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.action_history = action_history
+
+        self._lock = threading.Lock()
+        self._appliers = {
+            'couple': self._apply_couple,
+            'names': self._apply_names,
+            'pet': self._apply_pet,
+            'pet_update': self._apply_pet_update,
+            'action': self._apply_action,
+        }
+        self._metrics = {
+            'writes': 0,
+            'snapshots': 0,
+            'replayed': 0,
+            'recovery_seconds': 0.0,
+            'last_snapshot_seconds': 0.0,
+        }
+
+        self._lock_file = open(path + '.lock', 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                raise RuntimeError(f"Хранилище {path} уже открыто другим процессом")
+
+        self._reset()
+        self._recover()
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+
+    def _reset(self):
+        self._couples = {}
+        self._couple_by_pair = {}
+        self._user_couples = {}
+        self._pets = {}
+        self._pet_by_couple = {}
+        self._actions = {}
+        self._next_id = {'couple': 1, 'pet': 1, 'action': 1}
+        # Номер последней примененной записи журнала и число записей после снимка
+        self._seq = 0
+        self._records = 0
+
+    # Применение операций. Одни и те же функции работают и при записи,
+    # и при повторе журнала, поэтому состояние после восстановления
+    # совпадает с состоянием до остановки.
+
+    def _bump(self, kind: str, record_id: int):
+        if record_id >= self._next_id[kind]:
+            self._next_id[kind] = record_id + 1
+
+    def _apply_couple(self, couple_id, user1_id, user2_id, user1_name, user2_name, created_at):
+        # Как INSERT OR REPLACE: пара с теми же пользователями заменяется
+        replaced = self._couple_by_pair.get((user1_id, user2_id))
+        if replaced is not None:
+            del self._couples[replaced]
+        self._couples[couple_id] = (couple_id, user1_id, user2_id, user1_name, user2_name, created_at, 1)
+        self._couple_by_pair[(user1_id, user2_id)] = couple_id
+
+        # Существующая привязка пользователя сохраняется, если ее пара не заменена
+        for user_id in (user1_id, user2_id):
+            if self._user_couples.get(user_id) not in self._couples:
+                self._user_couples[user_id] = couple_id
+        self._bump('couple', couple_id)
+
+    def _apply_names(self, couple_id, user1_name, user2_name):
+        couple = self._couples.get(couple_id)
+        if couple is not None:
+            self._couples[couple_id] = couple[:3] + (user1_name, user2_name, couple[5], couple[6] + 1)
+
+    def _apply_pet(self, pet_id, couple_id, name, pet_type, created_at):
+        self._pets[pet_id] = (pet_id, couple_id, name, pet_type, 100, 100, 100, 1, 0, created_at, created_at, 1)
+        # Как и запрос по couple_id, возвращается первый питомец пары
+        self._pet_by_couple.setdefault(couple_id, pet_id)
+        self._bump('pet', pet_id)
+
+    def _apply_pet_update(self, pet_id, changes):
+        pet = self._pets.get(pet_id)
+        if pet is None:
+            return
+        row = list(pet)
+        for column, value in changes.items():
+            row[PET_INDEX[column]] = value
+        row[PET_VERSION] += 1
+        self._pets[pet_id] = tuple(row)
+
+    def _apply_action(self, action_id, pet_id, user_id, action_type, timestamp):
+        history = self._actions.get(pet_id)
+        if history is None:
+            history = self._actions[pet_id] = deque(maxlen=self.action_history)
+        history.append((action_id, pet_id, user_id, action_type, timestamp))
+        self._bump('action', action_id)
+
+    def _commit(self, ops: list):
+        """Запись операций в журнал и применение к состоянию (под блокировкой)"""
+        self._seq += 1
+        line = json.dumps([self._seq, ops], ensure_ascii=False, separators=(',', ':'))
+        self._log.write(line + '\n')
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+        for name, *args in ops:
+            self._appliers[name](*args)
+        self._records += 1
+        self._metrics['writes'] += 1
+
+        if self._records >= self.snapshot_every:
+            self._snapshot()
+
+    # Снимки и восстановление
+
+    def _snapshot(self):
+        """Сохранение состояния и очистка журнала (под блокировкой)"""
+        started = time.monotonic()
+        state = {
+            'seq': self._seq,
+            'next_id': self._next_id,
+            'couples': list(self._couples.values()),
+            'user_couples': list(self._user_couples.items()),
+            'pets': list(self._pets.values()),
+            'actions': [action for history in self._actions.values() for action in history],
+        }
+
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Если процесс упадет до очистки, записи журнала с номером не
+        # больше seq снимка при восстановлении будут пропущены
+        self._log.flush()
+        self._log.truncate(0)
+        self._records = 0
+        self._metrics['snapshots'] += 1
+        self._metrics['last_snapshot_seconds'] = time.monotonic() - started
+
+    def _load_snapshot(self):
+        with open(self.snapshot_path, encoding='utf-8') as f:
+            state = json.load(f)
+
+        self._seq = state['seq']
+        self._next_id = state['next_id']
+        # Снимки, сохраненные до появления версий, дополняются версией 1
+        for couple in state['couples']:
+            couple = tuple(couple) + (1,) * (len(Couple.__slots__) - len(couple))
+            self._couples[couple[0]] = couple
+            self._couple_by_pair[(couple[1], couple[2])] = couple[0]
+        self._user_couples = dict(state['user_couples'])
+        for pet in state['pets']:
+            self._pets[pet[0]] = tuple(pet) + (1,) * (len(Pet.__slots__) - len(pet))
+            self._pet_by_couple.setdefault(pet[1], pet[0])
+        for action in state['actions']:
+            self._apply_action(*action)
+
+    def _recover(self):
+        """Загрузка снимка и повтор журнала операций"""
+        started = time.monotonic()
+        if os.path.exists(self.snapshot_path):
+            self._load_snapshot()
+
+        replayed = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb+') as f:
+                offset = 0
+                for line in f:
+                    # Недописанная последняя строка остается от аварийной
+                    # остановки: операция не была подтверждена, отбрасываем
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("incomplete record")
+                        seq, ops = json.loads(line)
+                    except ValueError:
+                        print(f"⚠️ Журнал {self.log_path} обрезан на байте {offset}")
+                        f.truncate(offset)
+                        break
+                    offset += len(line)
+                    self._records += 1
+                    if seq <= self._seq:
+                        continue
+                    for name, *args in ops:
+                        self._appliers[name](*args)
+                    self._seq = seq
+                    replayed += 1
+
+        self._metrics['replayed'] = replayed
+        self._metrics['recovery_seconds'] = time.monotonic() - started
+        if self._seq:
+            print(f"♻️ Состояние восстановлено: {len(self._pets)} питомцев, "
+                  f"записей журнала {replayed}, {self._metrics['recovery_seconds']:.3f} с")
+
+    # Операции хранилища
+
+    def create_couple(self, user1_id: int, user2_id: int, user1_name: str, user2_name: str) -> int:
+        """Создание новой пары"""
+        with self._lock:
+            couple_id = self._next_id['couple']
+            self._commit([['couple', couple_id, user1_id, user2_id, user1_name, user2_name,
+                           _current_timestamp()]])
+            return couple_id
+
+    def get_couple(self, user1_id: int, user2_id: int) -> Optional[Couple]:
+        """Получение информации о паре"""
+        couple_id = self._couple_by_pair.get((user1_id, user2_id))
+        if couple_id is None:
+            couple_id = self._couple_by_pair.get((user2_id, user1_id))
+        couple = self._couples.get(couple_id)
+        return Couple(*couple) if couple is not None else None
+
+    def get_user_couple(self, user_id: int) -> Optional[Couple]:
+        """Получение пары пользователя"""
+        couple = self._couples.get(self._user_couples.get(user_id))
+        return Couple(*couple) if couple is not None else None
+
+    def get_couple_by_id(self, couple_id: int) -> Optional[Couple]:
+        """Получение пары по id"""
+        couple = self._couples.get(couple_id)
+        return Couple(*couple) if couple is not None else None
+
+    def update_couple_names(self, couple_id: int, user1_name: str, user2_name: str):
+        """Обновление имен в паре"""
+        with self._lock:
+            if couple_id in self._couples:
+                self._commit([['names', couple_id, user1_name, user2_name]])
+
+    def create_pet(self, couple_id: int, name: str, pet_type: str) -> int:
+        """Создание нового питомца"""
+        with self._lock:
+            pet_id = self._next_id['pet']
+            self._commit([['pet', pet_id, couple_id, name, pet_type, _current_timestamp()]])
+            return pet_id
+
+    def get_pet(self, couple_id: int) -> Optional[Pet]:
+        """Получение питомца пары"""
+        pet = self._pets.get(self._pet_by_couple.get(couple_id))
+        return Pet(*pet) if pet is not None else None
+
+    def iter_pets(self) -> Iterator[Pet]:
+        """Все питомцы по возрастанию id"""
+        with self._lock:
+            pets = list(self._pets.values())
+        for pet in pets:
+            yield Pet(*pet)
+
+    def update_pet_stats(self, pet_id: int, hunger: int = None, happiness: int = None,
+                         energy: int = None, level: int = None, experience: int = None):
+        """Обновление статистики питомца"""
+        changes = {}
+        for column, value in (('hunger', hunger), ('happiness', happiness), ('energy', energy)):
+            if value is not None:
+                changes[column] = max(0, min(100, value))
+        if level is not None:
+            changes['level'] = level
+        if experience is not None:
+            changes['experience'] = experience
+        if not changes:
+            return
+
+        changes['last_updated'] = _current_timestamp()
+        with self._lock:
+            if pet_id in self._pets:
+                self._commit([['pet_update', pet_id, changes]])
+
+    def modify_pet(self, couple_id: int, mutate, log_action: tuple = None):
+        """Атомарное чтение-изменение-запись питомца пары (см. Database.modify_pet)"""
+        return self.modify_pets([(couple_id, mutate, log_action)])[0]
+
+    def modify_pets(self, items: List[tuple]) -> List[Any]:
+        """Несколько modify_pet одной записью журнала (см. Database.modify_pets)"""
+        with self._lock:
+            timestamp = _current_timestamp()
+            action_id = self._next_id['action']
+            # Питомцы, измененные предыдущими элементами списка: состояние
+            # меняется только после записи всего списка в журнал
+            pending = {}
+            ops = []
+            results = []
+            for couple_id, mutate, log_action in items:
+                pet_id = self._pet_by_couple.get(couple_id)
+                pet = pending.get(pet_id)
+                if pet is None:
+                    pet = self._pets.get(pet_id)
+                    if pet is None:
+                        results.append(None)
+                        continue
+                    pet = Pet(*pet)
+
+                changes, result = mutate(pet)
+                results.append(result)
+                if changes is None:
+                    continue
+
+                unknown = set(changes) - PET_MUTABLE_COLUMNS
+                if unknown:
+                    raise ValueError(f"Недопустимые поля питомца: {sorted(unknown)}")
+
+                changes = dict(changes)
+                changes.setdefault('last_updated', timestamp)
+                pending[pet_id] = pet.replace(**changes, version=pet.version + 1)
+                ops.append(['pet_update', pet_id, changes])
+                if log_action is not None:
+                    user_id, action_type = log_action
+                    ops.append(['action', action_id, pet_id, user_id, action_type, timestamp])
+                    action_id += 1
+
+            if ops:
+                self._commit(ops)
+            return results
+
+    def log_action(self, pet_id: int, user_id: int, action_type: str):
+        """Логирование действия с питомцем"""
+        with self._lock:
+            self._commit([['action', self._next_id['action'], pet_id, user_id, action_type,
+                           _current_timestamp()]])
+
+    def get_recent_actions(self, pet_id: int, limit: int = 10) -> List[Dict]:
+        """Получение последних действий с питомцем"""
+        return self.get_actions_page(pet_id, None, limit)
+
+    def get_actions_page(self, pet_id: int, before: tuple = None, limit: int = 50) -> List[Dict]:
+        """Страница истории действий питомца (хранятся последние action_history)"""
+        with self._lock:
+            history = list(self._actions.get(pet_id, ()))
+        page = []
+        for action in reversed(history):
+            if before is not None and (action[4], action[0]) >= before:
+                continue
+            page.append(dict(zip(ACTION_COLUMNS, action)))
+            if len(page) >= limit:
+                break
+        return page
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики хранилища"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['seq'] = self._seq
+            stats['log_records'] = self._records
+        stats['backend'] = 'memory'
+        stats['couples'] = len(self._couples)
+        stats['pets'] = len(self._pets)
+        return stats
+
+    def close(self):
+        """Сохранение снимка при остановке, чтобы следующий старт не повторял журнал"""
+        with self._lock:
+            if self._log.closed:
+                return
+            if self._records:
+                self._snapshot()
+            self._log.close()
+        self._lock_file.close()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Планировщик уведомлений о состоянии питомцев.
+
+Показатели убывают линейно, поэтому момент, когда голод, счастье или
+энергия опустятся до порогов 40 и 20 (как в get_pet_description),
+вычисляется заранее. Пары хранятся в куче по времени ближайшего
+пересечения: каждый такт обрабатывает только пары, срок которых
+наступил, а перепланирование после действия стоит O(log n).
+Пара получает не больше одного уведомления за NOTIFICATION_INTERVAL.
+
+Питомцев, измененных в других процессах (prefork) или обслуживающими
+скриптами, планировщик находит периодическим проходом по версиям.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from urllib import request
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: защиты от запуска в нескольких процессах нет
+    fcntl = None
+
+from config import BOT_TOKEN, NOTIFICATION_INTERVAL, PET_TYPES
+from pet_manager import parse_timestamp
+from records import Pet
+
+# Пороги показателей, о пересечении которых сообщается
+THRESHOLDS = (40, 20)
+STATS = ('hunger', 'happiness', 'energy')
+
+
+def to_epoch(timestamp: str) -> float:
+    """Отметка времени из БД (UTC) в секундах Unix"""
+    return parse_timestamp(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def crossing_times(pet: Pet):
+    """Моменты (секунды Unix), когда показатели питомца опустятся до порогов"""
+    pet_type = PET_TYPES.get(pet.pet_type)
+    if pet_type is None:
+        return
+    updated = to_epoch(pet.last_updated)
+    for stat in STATS:
+        rate = pet_type[f'{stat}_rate']
+        value = pet[stat]
+        if rate <= 0:
+            continue
+        for threshold in THRESHOLDS:
+            if value > threshold:
+                yield updated + (value - threshold) / rate * 3600
+
+
+def next_crossing(pet: Pet, after: float) -> Optional[float]:
+    """Ближайшее пересечение порога строго после after"""
+    return min((moment for moment in crossing_times(pet) if moment > after), default=None)
+
+
+def crossed_between(pet: Pet, start: float, end: float) -> bool:
+    """Пересекал ли какой-либо показатель порог в промежутке (start, end]"""
+    return any(start < moment <= end for moment in crossing_times(pet))
+
+
+class LogSender:
+    """Отправка в журнал сервера: локальная замена Telegram"""
+
+    def send(self, chat_id: int, text: str):
+        print(f"📨 Уведомление для {chat_id}: {text}")
+
+
+class TelegramSender:
+    """Отправка сообщений через Telegram Bot API"""
+
+    def __init__(self, token: str, timeout: float = 10.0):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.timeout = timeout
+
+    def send(self, chat_id: int, text: str):
+        body = json.dumps({'chat_id': chat_id, 'text': text}).encode('utf-8')
+        req = request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+def make_sender(name: str = None):
+    """Отправитель по имени: log (по умолчанию) или telegram"""
+    name = name or os.environ.get('NOTIFICATION_SENDER', 'log')
+    if name == 'telegram':
+        return TelegramSender(os.environ.get('BOT_TOKEN', BOT_TOKEN))
+    return LogSender()
+
+
+class NotificationScheduler:
+    """Куча (время, couple_id) с ленивым удалением устаревших записей.
+
+    Актуальный срок пары хранится в _due; запись кучи с другим сроком
+    при извлечении пропускается. При срабатывании питомец читается
+    заново, поэтому изменения, о которых планировщик не узнал (например,
+    из другого процесса), не приводят к ложным уведомлениям. Раз в
+    rescan_interval секунд (0 - никогда) питомцы с версией новее
+    известной планировщику перепланируются: так находятся изменения,
+    которые сдвинули срок пары раньше или появились у пар без срока.
+    """
+
+    def __init__(self, db, pm, sender=None, interval: float = NOTIFICATION_INTERVAL,
+                 clock=time.time, rescan_interval: float = 0):
+        self.db = db
+        self.pm = pm
+        self.sender = sender or LogSender()
+        self.interval = interval
+        self.clock = clock
+        self.rescan_interval = rescan_interval
+
+        self._heap = []
+        self._due = {}
+        self._last_notified = {}
+        # Последняя версия питомца каждой пары, по которой был расчет срока
+        self._versions = {}
+        self._next_rescan = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._lock_file = None
+        self._metrics = {
+            'scheduled': 0,
+            'fired': 0,
+            'sent': 0,
+            'send_failures': 0,
+            'rescans': 0,
+            'rescanned': 0,
+        }
+
+    # Планирование
+
+    def schedule_pet(self, pet: Pet, now: float = None, keep_existing: bool = False):
+        """Перепланирование пары после изменения ее питомца"""
+        if now is None:
+            now = self.clock()
+        due = next_crossing(pet, now)
+        last = self._last_notified.get(pet.couple_id)
+        if due is not None and last is not None:
+            due = max(due, last + self.interval)
+        with self._cond:
+            if pet.version > self._versions.get(pet.couple_id, 0):
+                self._versions[pet.couple_id] = pet.version
+        self._set_due(pet.couple_id, due, keep_existing)
+
+    def _set_due(self, couple_id: int, due: Optional[float], keep_existing: bool = False):
+        with self._cond:
+            if keep_existing and couple_id in self._due:
+                # Пару уже перепланировало действие, выполненное после чтения
+                return
+            if due is None:
+                self._due.pop(couple_id, None)
+                return
+            self._due[couple_id] = due
+            heapq.heappush(self._heap, (due, couple_id))
+            self._metrics['scheduled'] += 1
+            # Устаревшие записи копятся при частых действиях; перестраиваем
+            # кучу, когда их становится больше, чем актуальных
+            if len(self._heap) > 2 * len(self._due) + 1024:
+                self._heap = [(d, c) for c, d in self._due.items()]
+                heapq.heapify(self._heap)
+            if self._heap[0] == (due, couple_id):
+                self._cond.notify()
+
+    def load(self):
+        """Начальное планирование всех питомцев (один проход при старте)"""
+        now = self.clock()
+        for pet in self.db.iter_pets():
+            self.schedule_pet(pet, now)
+
+    def rescan(self, now: float = None) -> int:
+        """Перепланирование питомцев, измененных без вызова schedule_pet;
+        возвращает число таких пар"""
+        if now is None:
+            now = self.clock()
+        changed = 0
+        for pet in self.db.iter_pets():
+            # Версия только растет: питомец, прочитанный до действия в
+            # этом процессе, не отменяет срок, рассчитанный после него
+            if pet.version > self._versions.get(pet.couple_id, 0):
+                self.schedule_pet(pet, now)
+                changed += 1
+        with self._cond:
+            self._metrics['rescans'] += 1
+            self._metrics['rescanned'] += changed
+        return changed
+
+    # Срабатывание
+
+    def pop_due(self, now: float, limit: int = 1000):
+        """Пары, срок которых наступил"""
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now and len(due) < limit:
+                moment, couple_id = heapq.heappop(self._heap)
+                if self._due.get(couple_id) == moment:
+                    del self._due[couple_id]
+                    due.append(couple_id)
+        return due
+
+    def fire(self, couple_id: int, now: float):
+        """Отправка уведомления паре, если показатель пересек порог"""
+        with self._cond:
+            self._metrics['fired'] += 1
+        pet = self.db.get_pet(couple_id)
+        if pet is None:
+            return
+
+        start = max(to_epoch(pet.last_updated), self._last_notified.get(couple_id, 0.0))
+        if crossed_between(pet, start, now):
+            self._last_notified[couple_id] = now
+            self._send(couple_id, now)
+        self.schedule_pet(pet, now, keep_existing=True)
+
+    def _send(self, couple_id: int, now: float):
+        couple = self.db.get_couple_by_id(couple_id)
+        moment = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None)
+        pet = self.pm.get_pet_status(couple_id, moment)
+        if couple is None or pet is None:
+            return
+        text = (f"{self.pm.get_pet_emoji_status(pet)} {pet.name} "
+                f"{self.pm.get_pet_description(pet)}")
+        for chat_id in {couple.user1_id, couple.user2_id}:
+            try:
+                self.sender.send(chat_id, text)
+                sent = 'sent'
+            except Exception as e:
+                sent = 'send_failures'
+                print(f"⚠️ Не удалось отправить уведомление {chat_id}: {e}")
+            # Отправка идет без блокировки, счетчик - под ней
+            with self._cond:
+                self._metrics[sent] += 1
+
+    def tick(self, now: float = None) -> int:
+        """Обработка наступивших сроков; возвращает число пар"""
+        if now is None:
+            now = self.clock()
+        due = self.pop_due(now)
+        for couple_id in due:
+            self.fire(couple_id, now)
+        return len(due)
+
+    # Фоновый поток
+
+    def start(self, lock_path: str = None) -> bool:
+        """Загрузка питомцев и запуск потока.
+
+        Если lock_path задан, планировщик работает только в одном процессе:
+        в остальных start() возвращает False.
+        """
+        if lock_path is not None and fcntl is not None:
+            self._lock_file = open(lock_path, 'w')
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                self._lock_file = None
+                return False
+
+        self.load()
+        if self.rescan_interval:
+            self._next_rescan = self.clock() + self.rescan_interval
+        self._thread = threading.Thread(target=self._run, name='notifications', daemon=True)
+        self._thread.start()
+        print(f"🔔 Планировщик уведомлений запущен: пар {len(self._due)}")
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = self.clock()
+                    wait = self._heap[0][0] - now if self._heap else None
+                    if self._next_rescan is not None:
+                        until_rescan = self._next_rescan - now
+                        wait = until_rescan if wait is None else min(wait, until_rescan)
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+            try:
+                if self._next_rescan is not None and self.clock() >= self._next_rescan:
+                    self._next_rescan = self.clock() + self.rescan_interval
+                    self.rescan()
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ Ошибка планировщика уведомлений: {e}")
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики планировщика"""
+        with self._cond:
+            stats = dict(self._metrics)
+            stats['pending'] = len(self._due)
+            stats['heap_size'] = len(self._heap)
+            stats['next_due'] = self._heap[0][0] if self._heap else None
+        return stats
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Рассылка изменений питомцев подписчикам (Server-Sent Events).
+
+PetEventHub подключается к PetManager.listeners и после фиксации
+изменения питомца раздает его состояние подписчикам пары. Событие -
+полное состояние питомца, а не разница, поэтому подписчику нужно
+только последнее: неотправленное событие заменяется новым, и медленный
+клиент не копит очередь. Текст события кодируется один раз на все
+подписки пары.
+
+Идентификатор события - версия питомца (records.Pet.version), которая
+хранится в БД. Клиент, переподключившийся с Last-Event-ID, получает
+текущее состояние, только если версия с тех пор изменилась; это верно
+и после перезапуска сервера.
+"""
+
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from records import Pet
+
+# Интервал комментариев-пульсов: прокси не закрывают простаивающий поток,
+# а сервер замечает отключившихся клиентов при записи
+HEARTBEAT_INTERVAL = 15.0
+# Пауза перед переподключением EventSource после обрыва, мс
+RETRY_MS = 3000
+
+HEARTBEAT = b': ping\n\n'
+
+STREAM_HEADERS = (
+    ('Content-Type', 'text/event-stream'),
+    ('Cache-Control', 'no-cache'),
+    # Прокси (nginx, балансировщик Render) не должны буферизовать поток
+    ('X-Accel-Buffering', 'no'),
+)
+
+
+class TooManySubscribers(Exception):
+    """Достигнут предел одновременных подписок"""
+
+
+def encode_event(pet: Pet) -> bytes:
+    """Событие pet с показателями, округленными как в ответе /api/pet"""
+    pet = pet.with_stats(round(pet.hunger), round(pet.happiness), round(pet.energy))
+    data = json.dumps(pet.to_api(), ensure_ascii=False)
+    return f"id: {pet.version}\nevent: pet\ndata: {data}\n\n".encode('utf-8')
+
+
+def parse_event_id(value) -> Optional[int]:
+    """Версия из Last-Event-ID; None, если заголовка нет или он не число"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Subscription:
+    """Подписка на события одной пары.
+
+    pending - последнее неотправленное событие (версия, текст). wake()
+    вызывается при появлении события и при закрытии хаба; потребитель
+    подставляет свою функцию (threading.Event.set или пробуждение цикла
+    asyncio).
+    """
+
+    __slots__ = ('couple_id', 'pending', 'sent_version', 'closed', 'wake')
+
+    def __init__(self, couple_id: int):
+        self.couple_id = couple_id
+        self.pending = None
+        self.sent_version = None
+        self.closed = False
+        self.wake = _noop
+
+
+def _noop():
+    pass
+
+
+class PetEventHub:
+    """Подписки по парам и раздача им событий"""
+
+    def __init__(self, max_subscribers: int = 10000, heartbeat: float = HEARTBEAT_INTERVAL):
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        # В режиме prefork изменения из других процессов сюда не попадают:
+        # тогда при каждом пульсе подписка сверяет версию с хранилищем
+        self.poll_storage = False
+
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, set] = {}
+        self._count = 0
+        self._closed = False
+        self._metrics = {
+            'published': 0,
+            'delivered': 0,
+            'coalesced': 0,
+            'rejected': 0,
+        }
+
+    def publish(self, pet: Pet):
+        """Слушатель PetManager: состояние питомца после изменения"""
+        with self._lock:
+            subscribers = self._subscribers.get(pet.couple_id)
+            if not subscribers:
+                return
+            event = (pet.version, encode_event(pet))
+            self._metrics['published'] += 1
+            for subscription in subscribers:
+                pending = subscription.pending
+                if pending is not None:
+                    if pending[0] >= pet.version:
+                        continue
+                    self._metrics['coalesced'] += 1
+                subscription.pending = event
+                self._metrics['delivered'] += 1
+                subscription.wake()
+
+    def subscribe(self, couple_id: int) -> Subscription:
+        with self._lock:
+            if self._closed or self._count >= self.max_subscribers:
+                self._metrics['rejected'] += 1
+                raise TooManySubscribers()
+            subscription = Subscription(couple_id)
+            self._subscribers.setdefault(couple_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.couple_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.couple_id]
+            self._count -= 1
+            subscription.closed = True
+
+    def take(self, subscription: Subscription) -> Optional[bytes]:
+        """Неотправленное событие подписки, если оно новее отправленного"""
+        with self._lock:
+            event, subscription.pending = subscription.pending, None
+        if event is None:
+            return None
+        version, text = event
+        if subscription.sent_version is not None and version <= subscription.sent_version:
+            return None
+        subscription.sent_version = version
+        return text
+
+    def close(self):
+        """Завершение всех потоков при остановке сервера"""
+        with self._lock:
+            self._closed = True
+            for subscribers in self._subscribers.values():
+                for subscription in subscribers:
+                    subscription.closed = True
+                    subscription.wake()
+            self._subscribers.clear()
+            self._count = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики подписок"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['subscribers'] = self._count
+            stats['couples'] = len(self._subscribers)
+        stats['heartbeat_s'] = self.heartbeat
+        return stats
+
+
+class EventStream:
+    """Ответ text/event-stream для одной пары.
+
+    Обработчик подписывается до чтения питомца, поэтому изменение между
+    чтением и подпиской не теряется; повтор той же версии отбрасывается.
+    """
+
+    def __init__(self, hub: PetEventHub, subscription: Subscription, pet: Pet, load,
+                 last_event_id: str = None):
+        self.hub = hub
+        self.subscription = subscription
+        self.pet = pet
+        # load() - текущий питомец пары из хранилища (для poll_storage)
+        self.load = load
+        self.last_event_id = last_event_id
+
+    def start(self, last_event_id: str = None) -> bytes:
+        """Начало потока: интервал переподключения и состояние питомца,
+        если его версия отличается от Last-Event-ID клиента"""
+        if last_event_id is None:
+            last_event_id = self.last_event_id
+        chunk = f"retry: {RETRY_MS}\n\n".encode('ascii')
+        self.subscription.sent_version = self.pet.version
+        if parse_event_id(last_event_id) != self.pet.version:
+            chunk += encode_event(self.pet)
+        return chunk
+
+    def take(self) -> Optional[bytes]:
+        return self.hub.take(self.subscription)
+
+    def heartbeat(self) -> bytes:
+        """Пульс; при poll_storage - событие, если питомец изменился в
+        другом процессе (чтение из хранилища, поэтому вызывается из потока)"""
+        if self.hub.poll_storage:
+            pet = self.load()
+            version = self.subscription.sent_version
+            if pet is not None and (version is None or pet.version > version):
+                self.subscription.sent_version = pet.version
+                return encode_event(pet)
+        return HEARTBEAT
+
+    def events(self, last_event_id: str = None):
+        """Части потока для сервера с потоками: блокирующее ожидание
+        событий с пульсом раз в hub.heartbeat секунд"""
+        ready = threading.Event()
+        self.subscription.wake = ready.set
+        try:
+            yield self.start(last_event_id)
+            while not self.subscription.closed:
+                ready.clear()
+                chunk = self.take()
+                if chunk is None and not ready.wait(self.hub.heartbeat):
+                    chunk = self.heartbeat()
+                if chunk:
+                    yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        self.hub.unsubscribe(self.subscription)
@@ -1,11 +1,44 @@
 import random
-from datetime import datetime, timedelta
-from typing import Dict, Optional
-from config import PET_TYPES, ACTIONS, PET_NAMES
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from config import PET_TYPES, PET_NAMES
+from records import Pet
+from rules import RULES
+
+
+def utcnow() -> datetime:
+    """Текущее время в UTC без часового пояса, с точностью до секунды
+    (как CURRENT_TIMESTAMP в SQLite)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Разбор отметки времени из БД в наивное UTC-время"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def format_timestamp(value: datetime) -> str:
+    """Отметка времени в формате CURRENT_TIMESTAMP ('ГГГГ-ММ-ДД ЧЧ:ММ:СС').
+
+    Этот же формат пишут SQLite при создании питомца и хранилище в
+    памяти, поэтому last_updated всех питомцев сравнимы как строки.
+    """
+    return value.strftime('%Y-%m-%d %H:%M:%S')
 
 class PetManager:
     def __init__(self, database):
+        # database - реализация storage.Storage (SQLite или в памяти)
         self.db = database
+        # Функции listener(pet), вызываемые после изменения питомца
+        # (например, перепланирование уведомлений)
+        self.listeners = []
+    
+    def _pet_changed(self, pet: Pet):
+        for listener in self.listeners:
+            listener(pet)
     
     def create_pet_for_couple(self, couple_id: int, pet_type: str = None, name: str = None) -> Dict:
         """Создание питомца для пары"""
@@ -16,6 +49,8 @@ class PetManager:
             name = random.choice(PET_NAMES)
         
         pet_id = self.db.create_pet(couple_id, name, pet_type)
+        if self.listeners:
+            self._pet_changed(self.db.get_pet(couple_id))
         
         return {
             "id": pet_id,
@@ -28,123 +63,126 @@ class PetManager:
             "experience": 0
         }
     
-    def get_pet_status(self, couple_id: int) -> Optional[Dict]:
-        """Получение статуса питомца с обновленными показателями"""
+    def get_pet_status(self, couple_id: int, now: datetime = None) -> Optional[Pet]:
+        """Получение статуса питомца с показателями на момент now (по умолчанию - сейчас)"""
         pet = self.db.get_pet(couple_id)
         if not pet:
             return None
         
-        # Обновляем показатели на основе времени
-        updated_pet = self._update_pet_stats_over_time(pet)
-        
-        return updated_pet
+        # Показатели рассчитываются на момент запроса, в БД ничего не пишется
+        return pet.with_stats(**self._rounded_stats(self._decayed_stats(pet, now)))
     
-    def _update_pet_stats_over_time(self, pet: Dict) -> Dict:
-        """Обновление статистики питомца на основе прошедшего времени"""
-        last_updated = datetime.fromisoformat(pet['last_updated'].replace('Z', '+00:00'))
-        now = datetime.now()
-        time_diff = now - last_updated
-        hours_passed = time_diff.total_seconds() / 3600
-        
-        if hours_passed < 0.1:  # Меньше 6 минут
-            return pet
-        
-        pet_type = PET_TYPES[pet['pet_type']]
-        
-        # Рассчитываем изменения
-        hunger_decrease = int(hours_passed * pet_type['hunger_rate'])
-        happiness_decrease = int(hours_passed * pet_type['happiness_rate'])
-        energy_decrease = int(hours_passed * pet_type['energy_rate'])
-        
-        new_hunger = max(0, pet['hunger'] - hunger_decrease)
-        new_happiness = max(0, pet['happiness'] - happiness_decrease)
-        new_energy = max(0, pet['energy'] - energy_decrease)
-        
-        # Обновляем в базе данных
-        self.db.update_pet_stats(
-            pet['id'],
-            hunger=new_hunger,
-            happiness=new_happiness,
-            energy=new_energy
+    def _decayed_stats(self, pet: Pet, now: datetime = None) -> Dict:
+        """Точные показатели питомца на момент now (без записи в БД).
+        
+        Показатели убывают линейно со скоростями из PET_TYPES, поэтому
+        их значение однозначно определяется сохраненными значениями и
+        last_updated, как бы часто их ни запрашивали.
+        """
+        if now is None:
+            now = utcnow()
+        
+        hours_passed = max(0.0, (now - parse_timestamp(pet['last_updated'])).total_seconds() / 3600)
+        hunger, happiness, energy = RULES.decay(
+            RULES.type_codes[pet['pet_type']], pet['hunger'], pet['happiness'], pet['energy'], hours_passed
         )
         
-        # Возвращаем обновленные данные
-        pet.update({
-            'hunger': new_hunger,
-            'happiness': new_happiness,
-            'energy': new_energy
-        })
-        
-        return pet
+        return {'hunger': hunger, 'happiness': happiness, 'energy': energy}
+    
+    def _rounded_stats(self, stats: Dict) -> Dict:
+        """Целые значения показателей для ответа API"""
+        return {stat: round(stats[stat]) for stat in ('hunger', 'happiness', 'energy')}
+    
+    def _update_pet_stats_over_time(self, pet: Pet, now: datetime = None) -> Pet:
+        """Копия питомца с показателями на основе прошедшего времени (без записи в БД)"""
+        return pet.with_stats(**self._decayed_stats(pet, now))
     
     def perform_action(self, couple_id: int, user_id: int, action_type: str) -> Dict:
-        """Выполнение действия с питомцем"""
-        pet = self.get_pet_status(couple_id)
-        if not pet:
+        """Выполнение действия с питомцем.
+        
+        Затухание показателей, эффект действия, опыт, повышение уровня
+        и запись в журнал действий выполняются в одной транзакции.
+        """
+        updated = []
+        result = self.db.modify_pet(couple_id, self._action(action_type, updated),
+                                    log_action=(user_id, action_type))
+        if result is None:
             return {"error": "Питомец не найден"}
         
-        if action_type not in ACTIONS:
-            return {"error": "Неизвестное действие"}
-        
-        action = ACTIONS[action_type]
-        
-        # Применяем изменения
-        new_hunger = max(0, min(100, pet['hunger'] + action['hunger']))
-        new_happiness = max(0, min(100, pet['happiness'] + action['happiness']))
-        new_energy = max(0, min(100, pet['energy'] + action['energy']))
-        
-        # Рассчитываем опыт
-        experience_gain = self._calculate_experience_gain(action_type, pet)
-        new_experience = pet['experience'] + experience_gain
-        new_level = pet['level']
-        
-        # Проверяем повышение уровня
-        if new_experience >= pet['level'] * 100:
-            new_level = pet['level'] + 1
-            new_experience = 0
-        
-        # Обновляем в базе данных
-        self.db.update_pet_stats(
-            pet['id'],
-            hunger=new_hunger,
-            happiness=new_happiness,
-            energy=new_energy,
-            level=new_level,
-            experience=new_experience
-        )
-        
-        # Логируем действие
-        self.db.log_action(pet['id'], user_id, action_type)
+        for pet in updated:
+            self._pet_changed(pet)
         
-        return {
-            "success": True,
-            "action": action_type,
-            "pet": {
-                "name": pet['name'],
-                "type": pet['pet_type'],
-                "hunger": new_hunger,
-                "happiness": new_happiness,
-                "energy": new_energy,
-                "level": new_level,
-                "experience": new_experience
-            },
-            "experience_gain": experience_gain,
-            "level_up": new_level > pet['level']
-        }
+        return result
     
-    def _calculate_experience_gain(self, action_type: str, pet: Dict) -> int:
-        """Расчет получаемого опыта за действие"""
-        base_exp = {
-            "feed": 5,
-            "play": 15,
-            "sleep": 10,
-            "pet": 8
-        }
-        
-        # Бонус за высокое счастье
-        happiness_bonus = pet['happiness'] // 20  # 0-5 бонусных очков
-        
-        return base_exp.get(action_type, 5) + happiness_bonus
+    def perform_actions(self, items: List[tuple]) -> List[Dict]:
+        """Выполнение списка действий (couple_id, user_id, action_type).
+        
+        Все действия фиксируются одной транзакцией; результат каждого такой
+        же, как у perform_action. Несколько действий с одним питомцем
+        применяются по порядку.
+        """
+        updated = []
+        results = self.db.modify_pets([
+            (couple_id, self._action(action_type, updated), (user_id, action_type))
+            for couple_id, user_id, action_type in items
+        ])
+        
+        for pet in updated:
+            self._pet_changed(pet)
+        
+        return [result if result is not None else {"error": "Питомец не найден"}
+                for result in results]
+    
+    def _action(self, action_type: str, updated: List[Pet]):
+        """Функция mutate для modify_pet: действие action_type над питомцем;
+        измененные питомцы добавляются в updated"""
+        code = RULES.action_codes.get(action_type)
+        
+        def apply(pet: Pet):
+            if code is None:
+                return None, {"error": "Неизвестное действие"}
+            
+            # Материализуем накопленное затухание на момент действия
+            now = utcnow()
+            pet = self._update_pet_stats_over_time(pet, now)
+            
+            error = RULES.check(code, pet['energy'])
+            if error is not None:
+                return None, {"error": error}
+            
+            # Эффект действия, опыт и повышение уровня (возможно, на
+            # несколько уровней сразу, с переносом остатка опыта)
+            new_hunger, new_happiness, new_energy, new_level, new_experience, experience_gain = \
+                RULES.evaluate(code, pet['hunger'], pet['happiness'], pet['energy'],
+                               pet['level'], pet['experience'])
+            
+            changes = {
+                'hunger': new_hunger,
+                'happiness': new_happiness,
+                'energy': new_energy,
+                'level': new_level,
+                'experience': new_experience,
+                'last_updated': format_timestamp(now)
+            }
+            # Хранилище увеличивает версию при записи изменений
+            updated.append(pet.replace(**changes, version=pet['version'] + 1))
+            
+            return changes, {
+                "success": True,
+                "action": action_type,
+                "pet": {
+                    "name": pet['name'],
+                    "type": pet['pet_type'],
+                    **self._rounded_stats(changes),
+                    "level": new_level,
+                    "experience": new_experience
+                },
+                "experience_gain": experience_gain,
+                "level_up": new_level > pet['level'],
+                "levels_gained": new_level - pet['level']
+            }
+        
+        return apply
     
     def get_pet_emoji_status(self, pet: Dict) -> str:
         """Получение эмодзи статуса питомца"""
@@ -195,8 +233,5 @@ class PetManager:
     
     def can_perform_action(self, action_type: str, pet: Dict) -> bool:
         """Проверка возможности выполнения действия"""
-        if action_type == "play" and pet['energy'] < 10:
-            return False
-        if action_type == "sleep" and pet['energy'] > 80:
-            return False
-        return True 
\ No newline at end of file
+        code = RULES.action_codes.get(action_type)
+        return code is not None and RULES.check(code, pet['energy']) is None 
\ No newline at end of file
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Компактные записи пар и питомцев.
+
+Записи хранят значения в __slots__, без словаря на каждый экземпляр, и
+создаются прямо из строки SQLite фабрикой from_row. Для совместимости с
+кодом, работавшим со словарями, поддерживаются pet['hunger'], dict(pet)
+и {**pet}. Записи не изменяются после создания: кэш отдает один и тот же
+экземпляр всем запросам, а новые значения получают через replace().
+"""
+
+from operator import attrgetter
+from typing import Any, Dict
+
+
+class Record:
+    """Базовый класс записей; поля задаются в __slots__ подкласса, а
+    __init__ подкласса принимает их позиционно в том же порядке"""
+
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Все значения записи одним вызовом и позиции полей для replace()
+        cls._values = attrgetter(*cls.__slots__)
+        cls._index = {name: index for index, name in enumerate(cls.__slots__)}
+
+    @classmethod
+    def from_row(cls, cursor, row):
+        """row_factory для курсора: запрос выбирает столбцы в порядке __slots__"""
+        return cls(*row)
+
+    @classmethod
+    def columns(cls) -> str:
+        """Список столбцов для SELECT"""
+        return ', '.join(cls.__slots__)
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values(self) == other._values(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def replace(self, **changes) -> 'Record':
+        """Копия записи с измененными полями"""
+        values = list(self._values(self))
+        for name, value in changes.items():
+            values[self._index[name]] = value
+        return type(self)(*values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self.__slots__, self._values(self)))
+
+
+class Couple(Record):
+    """Строка таблицы couples"""
+
+    __slots__ = ('id', 'user1_id', 'user2_id', 'user1_name', 'user2_name', 'created_at', 'version')
+
+    def __init__(self, id, user1_id, user2_id, user1_name, user2_name, created_at, version=1):
+        self.id = id
+        self.user1_id = user1_id
+        self.user2_id = user2_id
+        self.user1_name = user1_name
+        self.user2_name = user2_name
+        self.created_at = created_at
+        # Увеличивается при каждом изменении строки (для ETag)
+        self.version = version
+
+
+class Pet(Record):
+    """Строка таблицы pets"""
+
+    __slots__ = (
+        'id', 'couple_id', 'name', 'pet_type', 'hunger', 'happiness', 'energy',
+        'level', 'experience', 'last_updated', 'created_at', 'version',
+    )
+
+    def __init__(self, id, couple_id, name, pet_type, hunger, happiness, energy,
+                 level, experience, last_updated, created_at, version=1):
+        self.id = id
+        self.couple_id = couple_id
+        self.name = name
+        self.pet_type = pet_type
+        self.hunger = hunger
+        self.happiness = happiness
+        self.energy = energy
+        self.level = level
+        self.experience = experience
+        self.last_updated = last_updated
+        self.created_at = created_at
+        self.version = version
+
+    def with_stats(self, hunger, happiness, energy) -> 'Pet':
+        """Копия питомца с другими показателями (быстрее общего replace)"""
+        return Pet(self.id, self.couple_id, self.name, self.pet_type, hunger, happiness, energy,
+                   self.level, self.experience, self.last_updated, self.created_at, self.version)
+
+    def to_api(self) -> Dict[str, Any]:
+        """Питомец в формате ответа API"""
+        return {
+            'id': self.id,
+            'couple_id': self.couple_id,
+            'name': self.name,
+            'type': self.pet_type,
+            'hunger': self.hunger,
+            'happiness': self.happiness,
+            'energy': self.energy,
+            'level': self.level,
+            'experience': self.experience,
+            'last_updated': self.last_updated,
+            'version': self.version,
+        }
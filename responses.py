@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Сборка HTTP ответов одной записью.
+
+Строка статуса, заголовки и тело собираются в один буфер и
+отправляются одним вызовом write. Постоянные части кодируются один раз
+при импорте: строки статуса и тела демо-ответов (JSONTemplate - объект
+с постоянными полями, в который подставляются переменные); заголовки
+CORS собирает cors.CORSPolicy.
+
+JSON кодируется orjson, если он установлен, иначе стандартным json без
+пробелов и \\u-экранирования (ответ короче, а клиенту безразлично).
+"""
+
+import json
+import time
+from email.utils import formatdate
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps(obj) -> bytes:
+    """JSON в байтах UTF-8"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # Строки с одиночными суррогатами (из \ud800 в теле запроса)
+            # orjson не кодирует; стандартный json заменит их на '?'
+            pass
+    return _encoder.encode(obj).encode('utf-8', 'replace')
+
+
+def header_block(headers) -> bytes:
+    """Закодированные строки заголовков из пар (имя, значение)"""
+    return ''.join(f"{name}: {value}\r\n" for name, value in headers).encode('latin-1')
+
+
+STATUS_LINES = {
+    status.value: f"HTTP/1.1 {status.value} {status.phrase}\r\n".encode('ascii')
+    for status in HTTPStatus
+}
+
+KEEP_ALIVE = b'Connection: keep-alive\r\n'
+CLOSE = b'Connection: close\r\n'
+
+
+def etag_block(etag: str, weak: bool = False) -> bytes:
+    """ETag и требование перепроверять его при каждом запросе.
+
+    weak - слабый тег (W/) для сжатого тела: сильный тег обещает
+    побайтно то же представление, а сжатое тело - другое.
+    """
+    if weak:
+        etag = 'W/' + etag
+    return b'ETag: %s\r\nCache-Control: no-cache\r\n' % etag.encode('latin-1')
+
+
+def build_response(status: int, head: bytes, body: bytes = None, extra: bytes = b'') -> bytes:
+    """Ответ целиком: строка статуса, head и extra (блоки заголовков),
+    Content-Length и тело. body=None - ответ без тела и длины (304)."""
+    if body is None:
+        return b''.join((STATUS_LINES[status], head, extra, b'\r\n'))
+    return b''.join((STATUS_LINES[status], head, extra,
+                     b'Content-Length: %d\r\n\r\n' % len(body), body))
+
+
+class Encoded:
+    """Тело ответа, уже закодированное в JSON: сервер отправляет его как есть"""
+
+    __slots__ = ('body',)
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    @classmethod
+    def of(cls, obj) -> 'Encoded':
+        return cls(dumps(obj))
+
+
+def encode_body(response) -> bytes:
+    """Тело ответа обработчика: словарь или Encoded"""
+    if isinstance(response, Encoded):
+        return response.body
+    return dumps(response)
+
+
+class JSONTemplate:
+    """JSON объект, постоянные поля которого закодированы заранее.
+
+    render(**values) кодирует только переменные поля variables и
+    дописывает их после постоянных.
+    """
+
+    def __init__(self, constants: dict, variables: tuple):
+        self.prefix = dumps(constants)[:-1]
+        separator = b',' if constants else b''
+        self.keys = []
+        for name in variables:
+            self.keys.append((name, separator + dumps(name) + b':'))
+            separator = b','
+
+    def render(self, **values) -> Encoded:
+        parts = [self.prefix]
+        for name, key in self.keys:
+            parts.append(key)
+            parts.append(dumps(values[name]))
+        parts.append(b'}')
+        return Encoded(b''.join(parts))
+
+
+class HTTPDate:
+    """Значение заголовка Date, пересчитываемое раз в секунду"""
+
+    def __init__(self):
+        self._second = None
+        self._value = b''
+
+    def header(self) -> bytes:
+        second = int(time.time())
+        if second != self._second:
+            self._value = b'Date: %s\r\n' % formatdate(second, usegmt=True).encode('ascii')
+            self._second = second
+        return self._value
+
+
+http_date = HTTPDate()
+
+# Заголовок Server, как у BaseHTTPRequestHandler: одинаковый у всех серверов
+SERVER_HEADER = (f"Server: {BaseHTTPRequestHandler.server_version} "
+                 f"{BaseHTTPRequestHandler.sys_version}\r\n").encode('ascii')
+
+
+if __name__ == '__main__':
+    # Стоимость ответа обработчика: python responses.py [число запросов]
+    import io
+    import os
+    import sys
+    import tempfile
+
+    import api_server
+    import simple_api
+    from app_context import AppContext
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    class CountingWriter:
+        def __init__(self):
+            self.writes = 0
+            self.size = 0
+
+        def write(self, data):
+            self.writes += 1
+            self.size += len(data)
+            return len(data)
+
+        def flush(self):
+            pass
+
+    class BenchServer:
+        app = None
+
+    def measure(handler_class, raw: bytes, app):
+        """Среднее время обработки запроса без сокета и журнала запросов"""
+        handler_class.log_message = lambda *args: None
+        server = BenchServer()
+        server.app = app
+
+        def once():
+            handler = handler_class.__new__(handler_class)
+            handler.rfile = io.BytesIO(raw)
+            handler.wfile = CountingWriter()
+            handler.client_address = ('127.0.0.1', 0)
+            handler.server = server
+            handler.requests_served = 0
+            handler._error_headers = ()
+            handler.close_connection = True
+            handler.handle_one_request()
+            return handler.wfile
+
+        writer = once()
+        started = time.perf_counter()
+        for _ in range(count):
+            once()
+        return (time.perf_counter() - started) / count * 1e6, writer
+
+    directory = tempfile.mkdtemp()
+    app = AppContext.create(os.path.join(directory, 'bench.db'))
+    couple_id = app.db.create_couple(1, 2, 'Аня', 'Боря')
+    app.pm.create_pet_for_couple(couple_id)
+    cases = [
+        ('simple_api GET /api/pet', simple_api.SimpleAPIHandler, '/api/pet?couple_id=5', None),
+        ('simple_api GET /api/health', simple_api.SimpleAPIHandler, '/api/health', None),
+        ('api_server GET /api/pet', api_server.MiniAppAPIHandler, f'/api/pet?couple_id={couple_id}', app),
+        ('api_server GET /api/couple', api_server.MiniAppAPIHandler, '/api/couple?user_id=1', app),
+        ('api_server GET /api/health', api_server.MiniAppAPIHandler, '/api/health', app),
+        ('api_server GET /api/user (демо)', api_server.MiniAppAPIHandler, '/api/user?user_id=7', AppContext()),
+    ]
+    print(f"📏 JSON: {'orjson' if orjson is not None else 'json'}")
+    stdout = sys.stdout
+    try:
+        for name, handler_class, path, case_app in cases:
+            raw = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode('ascii')
+            # simple_api печатает каждый запрос
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                micros, writer = measure(handler_class, raw, case_app)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            print(f"📏 {name}: {micros:.1f} мкс, записей {writer.writes}, байт {writer.size}")
+        micros, writer = measure(api_server.MiniAppAPIHandler,
+                                 b"OPTIONS /api/pet HTTP/1.1\r\nHost: localhost\r\n\r\n", app)
+        print(f"📏 api_server OPTIONS: {micros:.1f} мкс, записей {writer.writes}, байт {writer.size}")
+    finally:
+        app.close()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Таблица маршрутов API, общая для всех серверов.
+
+Статические пути разрешаются одним обращением к словарю. Пути с
+параметрами (/api/pet/{couple_id}) компилируются в дерево сегментов,
+поэтому стоимость поиска зависит от глубины пути, а не от числа маршрутов.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+
+class RouteNotFound(Exception):
+    """Путь не соответствует ни одному маршруту"""
+
+
+class MethodNotAllowed(Exception):
+    """Путь известен, но метод для него не зарегистрирован"""
+
+    def __init__(self, allowed: List[str]):
+        super().__init__(', '.join(allowed))
+        self.allowed = allowed
+
+
+# Преобразователи значений параметров пути: {name} или {name:int}
+CONVERTERS = {
+    'str': str,
+    'int': int,
+}
+
+
+class _Node:
+    """Узел дерева сегментов для путей с параметрами"""
+
+    __slots__ = ('children', 'param', 'param_name', 'converter', 'methods')
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.param_name = None
+        self.converter = None
+        self.methods = None
+
+
+class Router:
+    """Сопоставление (метод, путь) с обработчиком"""
+
+    def __init__(self):
+        self._static: Dict[str, Dict[str, Any]] = {}
+        self._root = _Node()
+
+    def add(self, method: str, pattern: str, handler: Any):
+        """Регистрация обработчика для метода и шаблона пути"""
+        method = method.upper()
+        segments = pattern.strip('/').split('/')
+
+        if not any(segment.startswith('{') for segment in segments):
+            methods = self._static.setdefault(pattern, {})
+        else:
+            node = self._root
+            for segment in segments:
+                if segment.startswith('{') and segment.endswith('}'):
+                    name, _, kind = segment[1:-1].partition(':')
+                    converter = CONVERTERS[kind or 'str']
+                    if node.param is None:
+                        node.param = _Node()
+                        node.param_name = name
+                        node.converter = converter
+                    elif node.param_name != name or node.converter is not converter:
+                        raise ValueError(f"Конфликт параметров в маршруте {pattern}")
+                    node = node.param
+                else:
+                    node = node.children.setdefault(segment, _Node())
+            if node.methods is None:
+                node.methods = {}
+            methods = node.methods
+
+        if method in methods:
+            raise ValueError(f"Маршрут {method} {pattern} уже зарегистрирован")
+        methods[method] = handler
+
+    def _match(self, path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        methods = self._static.get(path)
+        if methods is not None:
+            return methods, {}
+
+        node = self._root
+        params = {}
+        for segment in path.strip('/').split('/'):
+            child = node.children.get(segment)
+            if child is not None:
+                node = child
+                continue
+            if node.param is None or not segment:
+                raise RouteNotFound(path)
+            try:
+                params[node.param_name] = node.converter(segment)
+            except ValueError:
+                raise RouteNotFound(path)
+            node = node.param
+
+        if not node.methods:
+            raise RouteNotFound(path)
+        return node.methods, params
+
+    def resolve(self, method: str, path: str) -> Tuple[Any, Dict[str, Any]]:
+        """Поиск обработчика; возвращает (обработчик, параметры пути)"""
+        methods, params = self._match(path)
+        handler = methods.get(method)
+        if handler is None:
+            raise MethodNotAllowed(sorted(methods) + ['OPTIONS'])
+        return handler, params
+
+
+if __name__ == '__main__':
+    # Стоимость выбора маршрута: python routing.py [число маршрутов] [число поисков]
+    import re
+    import sys
+    import time
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+
+    # Половина маршрутов статические, половина - с параметром
+    patterns = []
+    for index in range(count // 2):
+        patterns.append(('GET', f'/api/resource{index}/list'))
+        patterns.append(('POST', f'/api/resource{index}/{{item_id:int}}'))
+
+    router = Router()
+    for method, pattern in patterns:
+        router.add(method, pattern, pattern)
+
+    # Для сравнения - последовательная проверка регулярных выражений,
+    # как в цепочке if/elif
+    def compile_pattern(pattern: str):
+        regex = re.sub(r'\{(\w+):int\}', r'(?P<\1>\\d+)', pattern)
+        return re.compile(f'^{regex}$')
+
+    table = [(method, compile_pattern(pattern), pattern) for method, pattern in patterns]
+
+    def linear(method: str, path: str):
+        for route_method, regex, handler in table:
+            match = regex.match(path)
+            if match and route_method == method:
+                return handler, {name: int(value) for name, value in match.groupdict().items()}
+        raise RouteNotFound(path)
+
+    last = count // 2 - 1
+    cases = [
+        ('статический, первый', 'GET', '/api/resource0/list'),
+        ('статический, последний', 'GET', f'/api/resource{last}/list'),
+        ('с параметром, последний', 'POST', f'/api/resource{last}/42'),
+    ]
+
+    def measure(resolve, method: str, path: str) -> float:
+        started = time.perf_counter()
+        for _ in range(lookups):
+            resolve(method, path)
+        return (time.perf_counter() - started) / lookups * 1e9
+
+    print(f"📏 Маршрутов: {len(patterns)}, поисков: {lookups}")
+    for name, method, path in cases:
+        assert router.resolve(method, path)[0] == linear(method, path)[0]
+        trie = measure(router.resolve, method, path)
+        scan = measure(linear, method, path)
+        print(f"📏 {name}: Router {trie:.0f} нс, перебор регулярных выражений {scan:.0f} нс "
+              f"({scan / trie:.1f}x)")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Игровые правила: затухание, эффект действий, опыт и уровни.
+
+Правила один раз компилируются из config.ACTIONS и PET_TYPES в плоские
+таблицы, индексируемые кодом действия и кодом типа питомца. Функции
+правил не обращаются к хранилищу и ничего не изменяют: они получают
+показатели и возвращают новые, поэтому одно и то же правило считается
+и для одного действия в PetManager, и по столбцам для многих питомцев
+сразу (evaluate_batch).
+
+Опыт хранится в пределах текущего уровня: для перехода с уровня L
+нужно L * LEVEL_EXPERIENCE опыта. Таблица thresholds содержит
+накопленный опыт на начало каждого уровня, поэтому одно действие может
+поднять несколько уровней, а остаток опыта переходит на новый уровень.
+"""
+
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from config import ACTIONS, LEVEL_EXPERIENCE, PET_TYPES
+
+STATS = ('hunger', 'happiness', 'energy')
+
+# Опыт за действие без базового значения в config.ACTIONS
+DEFAULT_EXPERIENCE = 5
+# Уровни, для которых порог опыта берется из таблицы; выше считается циклом
+TABLE_LEVELS = 1000
+
+
+class Rules:
+    """Таблицы правил; коды действий и типов - позиции в ACTIONS и PET_TYPES"""
+
+    def __init__(self, actions=ACTIONS, pet_types=PET_TYPES,
+                 level_experience: int = LEVEL_EXPERIENCE, table_levels: int = TABLE_LEVELS):
+        self.action_codes = {name: code for code, name in enumerate(actions)}
+        self.action_names = tuple(action['name'] for action in actions.values())
+        self.deltas = tuple(
+            tuple(action[stat] for stat in STATS) for action in actions.values()
+        )
+        self.experience = tuple(
+            action.get('experience', DEFAULT_EXPERIENCE) for action in actions.values()
+        )
+        self.min_energy = tuple(action.get('min_energy', 0) for action in actions.values())
+        self.max_energy = tuple(action.get('max_energy', 100) for action in actions.values())
+
+        self.type_codes = {name: code for code, name in enumerate(pet_types)}
+        self.rates = tuple(
+            tuple(pet_type[f'{stat}_rate'] for stat in STATS) for pet_type in pet_types.values()
+        )
+
+        # thresholds[L] - накопленный опыт на начало уровня L (L >= 1)
+        self.level_experience = level_experience
+        self.thresholds = [0, 0]
+        for level in range(1, table_levels):
+            self.thresholds.append(self.thresholds[-1] + level * level_experience)
+
+    def decay(self, type_code: int, hunger: float, happiness: float, energy: float,
+              hours: float) -> tuple:
+        """Показатели через hours часов без действий"""
+        hunger_rate, happiness_rate, energy_rate = self.rates[type_code]
+        return (max(0, hunger - hours * hunger_rate),
+                max(0, happiness - hours * happiness_rate),
+                max(0, energy - hours * energy_rate))
+
+    def check(self, code: int, energy: float) -> Optional[str]:
+        """Причина, по которой действие сейчас невозможно, или None"""
+        if energy < self.min_energy[code]:
+            return f"Питомец слишком устал: «{self.action_names[code]}» недоступно"
+        if energy > self.max_energy[code]:
+            return f"У питомца слишком много энергии: «{self.action_names[code]}» недоступно"
+        return None
+
+    def experience_gain(self, code: int, happiness: float) -> int:
+        """Опыт за действие: базовый плюс бонус 0-5 за счастье"""
+        return self.experience[code] + int(happiness // 20)
+
+    def level_up(self, level: int, experience: int, gain: int) -> tuple:
+        """(уровень, опыт в пределах уровня) после получения gain опыта"""
+        thresholds = self.thresholds
+        if level < len(thresholds):
+            total = thresholds[level] + experience + gain
+            if total < thresholds[-1]:
+                level = bisect_right(thresholds, total, level) - 1
+                return level, total - thresholds[level]
+        # За пределами таблицы - по одному уровню
+        experience += gain
+        while experience >= level * self.level_experience:
+            experience -= level * self.level_experience
+            level += 1
+        return level, experience
+
+    def evaluate(self, code: int, hunger: float, happiness: float, energy: float,
+                 level: int, experience: int) -> tuple:
+        """Результат разрешенного действия над показателями (уже с затуханием):
+        (hunger, happiness, energy, level, experience, полученный опыт)"""
+        hunger_delta, happiness_delta, energy_delta = self.deltas[code]
+        gain = self.experience_gain(code, happiness)
+        if experience + gain < level * self.level_experience:
+            experience += gain
+        else:
+            level, experience = self.level_up(level, experience, gain)
+        return (max(0, min(100, hunger + hunger_delta)),
+                max(0, min(100, happiness + happiness_delta)),
+                max(0, min(100, energy + energy_delta)),
+                level, experience, gain)
+
+    def evaluate_batch(self, codes, hunger, happiness, energy, level, experience) -> dict:
+        """evaluate по столбцам одинаковой длины.
+
+        Возвращает столбцы hunger, happiness, energy, level, experience,
+        gain и allowed (проходит ли действие check); для запрещенных
+        действий показатели возвращаются без изменений.
+        """
+        if np is None:
+            return self._evaluate_batch_array(codes, hunger, happiness, energy, level, experience)
+
+        codes = np.asarray(codes, dtype=np.intp)
+        hunger = np.asarray(hunger, dtype=np.float64)
+        happiness = np.asarray(happiness, dtype=np.float64)
+        energy = np.asarray(energy, dtype=np.float64)
+        level = np.asarray(level, dtype=np.int64)
+        experience = np.asarray(experience, dtype=np.int64)
+
+        deltas = np.asarray(self.deltas, dtype=np.float64)[codes]
+        allowed = ((energy >= np.asarray(self.min_energy)[codes])
+                   & (energy <= np.asarray(self.max_energy)[codes]))
+        # experience_gain по столбцам
+        gain = np.where(allowed, np.asarray(self.experience, dtype=np.int64)[codes]
+                        + (happiness // 20).astype(np.int64), 0)
+
+        thresholds = np.asarray(self.thresholds, dtype=np.int64)
+        last = len(thresholds) - 1
+        total = thresholds[np.minimum(level, last)] + experience + gain
+        in_table = allowed & (level <= last) & (total < thresholds[-1])
+        new_level = np.where(in_table, np.searchsorted(thresholds, total, side='right') - 1, level)
+        new_experience = np.where(in_table, total - thresholds[np.minimum(new_level, last)], experience)
+        # Уровни за пределами таблицы - как в level_up
+        for index in np.flatnonzero(allowed & ~in_table).tolist():
+            new_level[index], new_experience[index] = self.level_up(
+                int(level[index]), int(experience[index]), int(gain[index]))
+
+        def apply(column, delta):
+            return np.where(allowed, np.clip(column + delta, 0, 100), column)
+
+        return {
+            'hunger': apply(hunger, deltas[:, 0]),
+            'happiness': apply(happiness, deltas[:, 1]),
+            'energy': apply(energy, deltas[:, 2]),
+            'level': new_level,
+            'experience': new_experience,
+            'gain': gain,
+            'allowed': allowed,
+        }
+
+    def _evaluate_batch_array(self, codes, hunger, happiness, energy, level, experience) -> dict:
+        columns = {name: array('d') for name in STATS}
+        columns.update({name: array('q') for name in ('level', 'experience', 'gain')})
+        allowed = array('b')
+        for row in zip(codes, hunger, happiness, energy, level, experience):
+            ok = self.check(row[0], row[3]) is None
+            result = self.evaluate(*row) if ok else (*row[1:], 0)
+            for name, value in zip(columns, result):
+                columns[name].append(value)
+            allowed.append(ok)
+        columns['allowed'] = allowed
+        return columns
+
+
+RULES = Rules()
+
+
+if __name__ == '__main__':
+    # Пропускная способность правил: python rules.py [число вычислений]
+    import random
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rnd = random.Random(1)
+    codes = [rnd.randrange(len(RULES.deltas)) for _ in range(count)]
+    hunger = [rnd.uniform(0, 100) for _ in range(count)]
+    happiness = [rnd.uniform(0, 100) for _ in range(count)]
+    energy = [rnd.uniform(0, 100) for _ in range(count)]
+    level = [rnd.randrange(1, 50) for _ in range(count)]
+    experience = [rnd.randrange(0, 100) for _ in range(count)]
+
+    started = time.perf_counter()
+    for row in zip(codes, hunger, happiness, energy, level, experience):
+        if RULES.check(row[0], row[3]) is None:
+            RULES.evaluate(*row)
+    scalar = time.perf_counter() - started
+    print(f"📏 evaluate: {count / scalar / 1e6:.2f} млн вычислений/с")
+
+    if np is not None:
+        columns = [np.asarray(column) for column in (codes, hunger, happiness, energy, level, experience)]
+    else:
+        columns = [codes, hunger, happiness, energy, level, experience]
+    started = time.perf_counter()
+    RULES.evaluate_batch(*columns)
+    batch = time.perf_counter() - started
+    engine = 'numpy' if np is not None else 'array'
+    print(f"📏 evaluate_batch ({engine}): {count / batch / 1e6:.2f} млн вычислений/с")
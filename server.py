@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Простой HTTP сервер для тестирования Telegram Mini App
+
+Файлы Mini App отдаются из памяти, заранее сжатыми (static_assets.py);
+остальные файлы каталога - как обычно, с диска.
 """
 
 import http.server
@@ -9,7 +12,13 @@ import os
 import ssl
 from urllib.parse import urlparse
 
+from compression import negotiate
+from static_assets import StaticAssets
+
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Файлы Mini App в памяти (StaticAssets), загружаются в main()
+    assets = None
+    
     def end_headers(self):
         # Добавляем CORS заголовки для разработки
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -21,6 +30,46 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         # Обработка preflight запросов
         self.send_response(200)
         self.end_headers()
+    
+    def do_GET(self):
+        if not self.send_asset():
+            super().do_GET()
+    
+    def do_HEAD(self):
+        if not self.send_asset(head_only=True):
+            super().do_HEAD()
+    
+    def send_asset(self, head_only=False):
+        """Ответ файлом из памяти; False, если такого файла нет"""
+        if self.assets is None:
+            return False
+        found = self.assets.lookup(urlparse(self.path).path)
+        if found is None:
+            return False
+        asset, cache_control = found
+        
+        if asset.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', asset.etag)
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return True
+        
+        encoding = negotiate(self.headers.get('Accept-Encoding'), asset.encodings)
+        body = asset.variants[encoding]
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if asset.encodings:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', asset.etag)
+        self.send_header('Cache-Control', cache_control)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+        return True
 
 def create_ssl_context():
     """Создание SSL контекста для HTTPS"""
@@ -110,6 +159,15 @@ def main():
         print("Убедитесь, что вы запускаете сервер из папки mini_app/")
         return
     
+    # Файлы Mini App читаются и сжимаются один раз
+    assets = StaticAssets('.')
+    CustomHTTPRequestHandler.assets = assets
+    sizes = assets.stats().values()
+    original = sum(variants['identity'] for variants in sizes)
+    gzipped = sum(variants.get('gzip', variants['identity']) for variants in sizes)
+    print(f"📦 Файлов в памяти: {len(assets.assets)}, {original / 1024:.1f} КБ "
+          f"(gzip: {gzipped / 1024:.1f} КБ)")
+    
     # Создаем SSL сертификат если нужно
     if not os.path.exists('cert.pem') or not os.path.exists('key.pem'):
         print("🔐 Создание SSL сертификата...")
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Модели конкурентности HTTP сервера: один поток, пул потоков, pre-fork
+"""
+
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from responses import CLOSE, SERVER_HEADER, STATUS_LINES, encode_body, etag_block, http_date
+from routing import MethodNotAllowed, Router, RouteNotFound
+
+
+# Как часто простаивающее соединение проверяет, не ждут ли потока
+# новые соединения, секунд
+IDLE_POLL_INTERVAL = 0.05
+
+
+class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    """Обработчик с постоянными HTTP/1.1 соединениями.
+
+    Соединение закрывается после KEEPALIVE_TIMEOUT секунд простоя или
+    после KEEPALIVE_MAX_REQUESTS запросов; о последнем запросе клиенту
+    сообщается заголовком Connection: close. Простаивающее соединение
+    занимает поток, поэтому оно закрывается и раньше, как только новые
+    соединения ждут свободного потока.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Ожидание данных внутри начатого запроса (медленный клиент)
+    timeout = 5
+    # Ожидание следующего запроса (и первого - после preconnect браузера)
+    idle_timeout = float(os.environ.get('KEEPALIVE_TIMEOUT', 1))
+    max_requests_per_connection = int(os.environ.get('KEEPALIVE_MAX_REQUESTS', 100))
+    server_header = SERVER_HEADER
+
+    def setup(self):
+        super().setup()
+        self.requests_served = 0
+        self._error_headers = ()
+        # Заголовки и тело уходят отдельными записями; без TCP_NODELAY
+        # на постоянном соединении они ждут подтверждения (алгоритм Нейгла)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        """Обработка запросов соединения до его закрытия"""
+        self.close_connection = False
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    def wait_for_request(self) -> bool:
+        """Ожидание следующего запроса; False - соединение нужно закрыть:
+        оно простаивало idle_timeout секунд или его поток нужен новым
+        соединениям"""
+        # Запрос, уже прочитанный в буфер rfile (конвейер), или данные в
+        # сокете; в неблокирующем режиме peek не ждет
+        self.connection.setblocking(False)
+        try:
+            if self.rfile.peek(1):
+                return True
+        finally:
+            self.connection.settimeout(self.timeout)
+
+        deadline = time.monotonic() + self.idle_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            ready, _, _ = select.select([self.connection], [], [], min(remaining, IDLE_POLL_INTERVAL))
+            if ready:
+                return True
+            if self.connections_waiting():
+                return False
+
+    def connections_waiting(self) -> bool:
+        """Ждут ли новые соединения свободного потока"""
+        queued = getattr(self.server, 'queued_connections', None)
+        if queued is not None:
+            return queued() > 0
+        # Сервер с одним потоком: соединения ждут в backlog слушающего сокета
+        ready, _, _ = select.select([self.server.socket], [], [], 0)
+        return bool(ready)
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        self.requests_served += 1
+        if self.requests_served >= self.max_requests_per_connection:
+            self.send_header('Connection', 'close')
+        for name, value in self._error_headers:
+            self.send_header(name, value)
+        self._error_headers = ()
+
+    def send_error(self, code, message=None, explain=None, headers=()):
+        """send_error с дополнительными заголовками (например, Allow для 405)"""
+        self._error_headers = headers
+        super().send_error(code, message, explain)
+
+    def send_prepared(self, code: int, head: bytes, body: bytes = None, extra: bytes = b''):
+        """Ответ целиком одной записью, минуя send_response/send_header.
+
+        head и extra - закодированные блоки заголовков (responses.header_block);
+        body=None - ответ без тела и Content-Length (304).
+        """
+        self.log_request(code)
+        self.requests_served += 1
+        parts = [STATUS_LINES[code], self.server_header, http_date.header(), head, extra]
+        if self.requests_served >= self.max_requests_per_connection:
+            self.close_connection = True
+            parts.append(CLOSE)
+        if body is None:
+            parts.append(b'\r\n')
+        else:
+            parts.append(b'Content-Length: %d\r\n\r\n' % len(body))
+            parts.append(body)
+        self.wfile.write(b''.join(parts))
+
+    def send_chunked(self, chunks):
+        """Завершение заголовков и отправка тела частями из итератора chunks.
+
+        Клиентам HTTP/1.0 тело отдается без длины до закрытия соединения.
+        Если итератор упал на середине, соединение закрывается без
+        завершающей части, и клиент видит оборванный ответ.
+        """
+        chunked = self.request_version != 'HTTP/1.0'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if chunked:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except ConnectionError:
+            # Клиент отключился (для потока событий - обычное завершение)
+            self.close_connection = True
+            return
+        except Exception as e:
+            # Статус уже отправлен, поэтому ответ об ошибке невозможен
+            print(f"❌ Ответ частями прерван: {e}")
+            self.close_connection = True
+
+
+class RoutedRequestHandler(KeepAliveRequestHandler):
+    """Обработчик, выбирающий действие по таблице маршрутов router.
+
+    Подклассы задают router и call_route(target, params, data).
+    Параметры пути добавляются к параметрам строки запроса.
+    """
+
+    router: Router = None
+    # Политика CORS (cors.CORSPolicy) для заголовков ответов и preflight
+    cors = None
+    # Сжатие JSON ответов (compression.ResponseCompressor); None - без сжатия
+    compression = None
+
+    def do_GET(self):
+        """Обработка GET запросов"""
+        self.dispatch('GET')
+
+    def do_POST(self):
+        """Обработка POST запросов"""
+        self.dispatch('POST')
+
+    def do_OPTIONS(self):
+        """Обработка CORS preflight запросов: ответ собран заранее"""
+        self.send_prepared(*self.cors.preflight(self.headers.get('Origin')))
+
+    def read_json_body(self) -> dict:
+        """Чтение тела запроса; тело вычитывается всегда, чтобы не сбить
+        следующий запрос постоянного соединения"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length > 0:
+            post_data = self.rfile.read(content_length)
+            return json.loads(post_data.decode('utf-8'))
+        return {}
+
+    def dispatch(self, method: str):
+        parsed_url = urlparse(self.path)
+        path = parsed_url.path
+
+        try:
+            data = self.read_json_body() if method == 'POST' else {}
+
+            try:
+                target, path_params = self.router.resolve(method, path)
+            except RouteNotFound:
+                self.route_not_found(method, path)
+                return
+            except MethodNotAllowed as e:
+                self.send_error(405, headers=[('Allow', ', '.join(e.allowed))])
+                return
+
+            params = parse_qs(parsed_url.query)
+            for name, value in path_params.items():
+                params[name] = [value]
+
+            self.call_route(target, params, data)
+        except Exception as e:
+            self.route_failed(method, e)
+
+    def route_not_found(self, method: str, path: str):
+        self.send_error(404, "Not Found")
+
+    def route_failed(self, method: str, error: Exception):
+        self.send_error(500, str(error))
+
+    def call_route(self, target, params: dict, data: dict):
+        raise NotImplementedError
+
+    def json_headers(self) -> bytes:
+        """Заголовки CORS для источника запроса и Content-Type JSON"""
+        return self.cors.json_block(self.headers.get('Origin'))
+
+    def send_json(self, status: int, response, extra: bytes = b'', etag: str = None):
+        """JSON ответ (словарь или responses.Encoded) одной записью; тело
+        сжимается, если клиент принимает gzip или br"""
+        body = encode_body(response)
+        encoding = None
+        if self.compression is not None:
+            body, encoding, block = self.compression.encode(body, self.headers.get('Accept-Encoding'))
+            extra += block
+        if etag is not None:
+            extra += etag_block(etag, weak=encoding is not None)
+        self.send_prepared(status, self.json_headers(), body, extra)
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """HTTP сервер, обрабатывающий запросы ограниченным пулом потоков.
+
+    Когда все потоки заняты и очередь заполнена, цикл accept ждет,
+    а новые соединения копятся в backlog слушающего сокета.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, max_workers: int = 16,
+                 max_pending: int = None, bind_and_activate: bool = True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.max_workers = max_workers
+        if max_pending is None:
+            max_pending = max_workers * 4
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='http-worker')
+        # Принятые соединения, которые еще ждут рабочего потока
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+    def queued_connections(self) -> int:
+        return self._queued
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        with self._queued_lock:
+            self._queued += 1
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except BaseException:
+            with self._queued_lock:
+                self._queued -= 1
+            self._slots.release()
+            self.shutdown_request(request)
+            raise
+
+    def _process_request_worker(self, request, client_address):
+        """Обработка соединения в рабочем потоке"""
+        with self._queued_lock:
+            self._queued -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+def server_settings() -> dict:
+    """Настройки конкурентности из переменных окружения"""
+    return {
+        'mode': os.environ.get('SERVER_MODE', 'threaded'),
+        'threads': int(os.environ.get('SERVER_THREADS', 16)),
+        'workers': int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1)),
+    }
+
+
+def make_server(server_address, handler_class, settings: dict = None) -> HTTPServer:
+    """Создание HTTP сервера выбранной модели"""
+    settings = settings or server_settings()
+    if settings['mode'] == 'single':
+        return HTTPServer(server_address, handler_class)
+    return ThreadPoolHTTPServer(server_address, handler_class, max_workers=settings['threads'])
+
+
+def _run_worker(httpd: HTTPServer, setup=None):
+    """Цикл обслуживания запросов с корректной остановкой по SIGTERM"""
+    def stop(signum, frame):
+        # shutdown() ждет выхода из serve_forever, поэтому вызываем его не
+        # из обработчика сигнала, который выполняется в том же потоке
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    teardown = setup(httpd) if setup else None
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if teardown:
+            teardown()
+        httpd.server_close()
+
+
+def _serve_prefork(httpd: HTTPServer, workers: int, setup=None):
+    """Запуск рабочих процессов, разделяющих слушающий сокет"""
+    children = set()
+    stopping = False
+
+    def spawn():
+        # Иначе буферизованный вывод родителя продублируется в потомках
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            code = 0
+            try:
+                _run_worker(httpd, setup)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"👷 Запущено рабочих процессов: {workers}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"⚠️ Рабочий процесс {pid} завершился ({status}), перезапускаем")
+            spawn()
+
+    httpd.socket.close()
+
+
+def serve(server_address, handler_class, setup=None, settings: dict = None):
+    """Запуск HTTP сервера согласно SERVER_MODE.
+
+    setup(httpd) вызывается в каждом обслуживающем процессе перед началом
+    работы (в режиме prefork - уже после fork) и может вернуть функцию
+    освобождения ресурсов при остановке.
+    """
+    settings = settings or server_settings()
+    httpd = make_server(server_address, handler_class, settings)
+    print(f"⚙️ Режим сервера: {settings['mode']}"
+          f" (потоков: {settings['threads']}, процессов: {settings['workers']})")
+
+    if settings['mode'] == 'prefork' and hasattr(os, 'fork'):
+        _serve_prefork(httpd, settings['workers'], setup)
+    else:
+        _run_worker(httpd, setup)
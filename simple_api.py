@@ -3,111 +3,82 @@
 Упрощенный API сервер для Render.com
 """
 
-import json
 import os
 from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse
 
-class SimpleAPIHandler(BaseHTTPRequestHandler):
-    def do_OPTIONS(self):
-        """Обработка CORS preflight запросов"""
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.end_headers()
+from compression import ResponseCompressor
+from cors import CORSPolicy
+from responses import JSONTemplate
+from routing import Router
+from serving import RoutedRequestHandler, serve
+
+# Маршруты демо-сервера: путь -> имя метода обработчика
+router = Router()
+router.add('GET', '/', 'handle_root')
+router.add('GET', '/api/health', 'handle_health')
+router.add('GET', '/api/metrics', 'handle_metrics')
+router.add('GET', '/api/user', 'handle_get_user')
+router.add('GET', '/api/couple', 'handle_get_couple')
+router.add('GET', '/api/pet', 'handle_get_pet')
+router.add('GET', '/api/pet/{couple_id:int}', 'handle_get_pet')
+router.add('POST', '/api/couple/create', 'handle_create_couple')
+router.add('POST', '/api/pet/create', 'handle_create_pet')
+router.add('POST', '/api/pet/action', 'handle_pet_action')
+
+# Ответы демо-сервера: постоянные поля закодированы один раз при импорте
+ROOT_RESPONSE = JSONTemplate(
+    {'message': 'Pet Couple API', 'version': '1.0.0', 'status': 'running'}, ('timestamp',))
+HEALTH_RESPONSE = JSONTemplate(
+    {'status': 'ok', 'version': '1.0.0', 'platform': 'render'}, ('timestamp',))
+USER_RESPONSE = JSONTemplate(
+    {'has_couple': False, 'couple_id': None, 'demo_mode': True}, ('user_id',))
+COUPLE_RESPONSE = JSONTemplate({'couple': None, 'demo_mode': True}, ('user_id',))
+PET_RESPONSE = JSONTemplate({'pet': None, 'demo_mode': True}, ('couple_id',))
+CREATE_COUPLE_RESPONSE = JSONTemplate(
+    {'success': True, 'message': 'Пара создана успешно! (Демо-режим)', 'demo_mode': True},
+    ('couple_id',))
+ACTION_RESPONSE = JSONTemplate(
+    {'success': True, 'demo_mode': True}, ('action', 'pet_id', 'message'))
+
+class SimpleAPIHandler(RoutedRequestHandler):
+    router = router
+    cors = CORSPolicy.from_env()
+    compression = ResponseCompressor.from_env()
     
-    def send_cors_headers(self):
-        """Отправка CORS заголовков"""
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-        self.send_header('Content-Type', 'application/json')
+    def dispatch(self, method):
+        print(f"📥 {method} запрос: {urlparse(self.path).path}")
+        super().dispatch(method)
     
-    def do_GET(self):
-        """Обработка GET запросов"""
-        parsed_url = urlparse(self.path)
-        path = parsed_url.path
-        query_params = parse_qs(parsed_url.query)
-        
-        print(f"📥 GET запрос: {path}")
-        
-        try:
-            if path == '/api/health':
-                self.handle_health()
-            elif path == '/':
-                self.handle_root()
-            elif path == '/api/user':
-                self.handle_get_user(query_params)
-            elif path == '/api/couple':
-                self.handle_get_couple(query_params)
-            elif path == '/api/pet':
-                self.handle_get_pet(query_params)
-            else:
-                print(f"❌ Маршрут не найден: {path}")
-                self.send_error(404, f"Route not found: {path}")
-        except Exception as e:
-            print(f"❌ Ошибка обработки GET: {e}")
-            self.send_error(500, str(e))
+    def route_not_found(self, method, path):
+        print(f"❌ {method} маршрут не найден: {path}")
+        self.send_error(404, f"Route not found: {path}")
     
-    def do_POST(self):
-        """Обработка POST запросов"""
-        parsed_url = urlparse(self.path)
-        path = parsed_url.path
-        
-        print(f"📥 POST запрос: {path}")
-        
-        try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length > 0:
-                post_data = self.rfile.read(content_length)
-                data = json.loads(post_data.decode('utf-8'))
-            else:
-                data = {}
-            
-            if path == '/api/couple/create':
-                self.handle_create_couple(data)
-            elif path == '/api/pet/create':
-                self.handle_create_pet(data)
-            elif path == '/api/pet/action':
-                self.handle_pet_action(data)
-            else:
-                print(f"❌ POST маршрут не найден: {path}")
-                self.send_error(404, f"POST route not found: {path}")
-        except Exception as e:
-            print(f"❌ Ошибка обработки POST: {e}")
-            self.send_error(500, str(e))
+    def route_failed(self, method, error):
+        print(f"❌ Ошибка обработки {method}: {error}")
+        self.send_error(500, str(error))
+    
+    def call_route(self, handler_name, params, data):
+        getattr(self, handler_name)(params, data)
     
-    def handle_root(self):
+    def handle_root(self, params, data):
         """Главная страница"""
-        response = {
-            'message': 'Pet Couple API',
-            'version': '1.0.0',
-            'status': 'running',
-            'timestamp': datetime.now().isoformat()
-        }
+        response = ROOT_RESPONSE.render(timestamp=datetime.now().isoformat())
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
     
-    def handle_health(self):
+    def handle_health(self, params, data):
         """Проверка здоровья сервера"""
-        response = {
-            'status': 'ok',
-            'timestamp': datetime.now().isoformat(),
-            'version': '1.0.0',
-            'platform': 'render'
-        }
+        response = HEALTH_RESPONSE.render(timestamp=datetime.now().isoformat())
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
     
-    def handle_get_user(self, params):
+    def handle_metrics(self, params, data):
+        """Счетчики CORS (доля preflight запросов)"""
+        self.send_json(200, {'cors': self.cors.stats(), 'compression': self.compression.stats(),
+                             'demo_mode': True})
+    
+    def handle_get_user(self, params, data):
         """Получение информации о пользователе (демо-режим)"""
         user_id = int(params.get('user_id', [0])[0])
         
@@ -115,19 +86,11 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
             self.send_error(400, "user_id required")
             return
         
-        response = {
-            'user_id': user_id,
-            'has_couple': False,
-            'couple_id': None,
-            'demo_mode': True
-        }
+        response = USER_RESPONSE.render(user_id=user_id)
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
     
-    def handle_get_couple(self, params):
+    def handle_get_couple(self, params, data):
         """Получение информации о паре (демо-режим)"""
         user_id = int(params.get('user_id', [0])[0])
         
@@ -135,18 +98,11 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
             self.send_error(400, "user_id required")
             return
         
-        response = {
-            'user_id': user_id,
-            'couple': None,
-            'demo_mode': True
-        }
+        response = COUPLE_RESPONSE.render(user_id=user_id)
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
     
-    def handle_get_pet(self, params):
+    def handle_get_pet(self, params, data):
         """Получение информации о питомце (демо-режим)"""
         couple_id = int(params.get('couple_id', [0])[0])
         
@@ -154,18 +110,11 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
             self.send_error(400, "couple_id required")
             return
         
-        response = {
-            'couple_id': couple_id,
-            'pet': None,
-            'demo_mode': True
-        }
+        response = PET_RESPONSE.render(couple_id=couple_id)
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
     
-    def handle_create_couple(self, data):
+    def handle_create_couple(self, params, data):
         """Создание пары (демо-режим)"""
         user1_id = data.get('user1_id')
         user2_id = data.get('user2_id')
@@ -176,19 +125,11 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
         
         # Демо-режим - просто возвращаем успех
         couple_id = int(f"{user1_id}{user2_id}")
-        response = {
-            'success': True,
-            'couple_id': couple_id,
-            'message': 'Пара создана успешно! (Демо-режим)',
-            'demo_mode': True
-        }
+        response = CREATE_COUPLE_RESPONSE.render(couple_id=couple_id)
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
     
-    def handle_create_pet(self, data):
+    def handle_create_pet(self, params, data):
         """Создание питомца (демо-режим)"""
         couple_id = data.get('couple_id')
         pet_type = data.get('pet_type', 'cat')
@@ -219,12 +160,9 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
             'demo_mode': True
         }
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
     
-    def handle_pet_action(self, data):
+    def handle_pet_action(self, params, data):
         """Выполнение действия с питомцем (демо-режим)"""
         pet_id = data.get('pet_id')
         action = data.get('action', 'feed')
@@ -234,18 +172,12 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
             return
         
         # Демо-режим - симулируем действие
-        response = {
-            'success': True,
-            'action': action,
-            'pet_id': pet_id,
-            'message': f'Действие "{action}" выполнено! (Демо-режим)',
-            'demo_mode': True
-        }
+        response = ACTION_RESPONSE.render(
+            action=action, pet_id=pet_id,
+            message=f'Действие "{action}" выполнено! (Демо-режим)'
+        )
         
-        self.send_response(200)
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode())
+        self.send_json(200, response)
 
 def run_server():
     """Запуск сервера"""
@@ -256,10 +188,9 @@ def run_server():
     
     try:
         server_address = ('0.0.0.0', port)
-        httpd = HTTPServer(server_address, SimpleAPIHandler)
         print(f"✅ Сервер запущен на {server_address}")
         print(f"🔗 Health check: http://0.0.0.0:{port}/api/health")
-        httpd.serve_forever()
+        serve(server_address, SimpleAPIHandler)
     except Exception as e:
         print(f"❌ Ошибка запуска сервера: {e}")
         raise
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Статические файлы Mini App в памяти, сжатые заранее.
+
+При запуске каждый файл читается один раз и сжимается gzip (и brotli,
+если установлен) с наибольшим уровнем; сжатый вариант хранится, только
+если он меньше исходного. Каждый файл получает адрес с хешем
+содержимого (app.js -> app.3f2a9c1b7e.js), и ссылки в index.html
+заменяются такими адресами. Ответ по адресу с хешем кэшируется
+браузером без перепроверки (Cache-Control: immutable): измененный файл
+получит новый адрес вместе с новым index.html. Сам index.html и адреса
+без хеша перепроверяются по ETag при каждой загрузке.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from compression import SUPPORTED_ENCODINGS, compress
+
+STATIC_SUFFIXES = ('.html', '.js', '.css', '.svg')
+ENTRY = 'index.html'
+HASH_LENGTH = 10
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Атрибуты src и href, значения которых могут ссылаться на файлы
+LINK_ATTRIBUTE = re.compile(r'''(\b(?:src|href)=["'])(\./)?([^"'/?#]+)(["'])''')
+
+
+class Asset:
+    """Файл в памяти: исходное тело и сжатые варианты по кодировкам"""
+
+    __slots__ = ('name', 'content_type', 'digest', 'etag', 'variants', 'encodings')
+
+    def __init__(self, name: str, body: bytes):
+        self.name = name
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type.endswith(('javascript', '+xml')):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+        # Слабый тег: он общий для сжатых и несжатого вариантов
+        self.etag = f'W/"{self.digest}"'
+        self.variants = {None: body}
+        for encoding in SUPPORTED_ENCODINGS:
+            compressed = compress(body, encoding, static=True)
+            if len(compressed) < len(body):
+                self.variants[encoding] = compressed
+        self.encodings = tuple(encoding for encoding in SUPPORTED_ENCODINGS
+                               if encoding in self.variants)
+
+    @property
+    def hashed_name(self) -> str:
+        base, suffix = os.path.splitext(self.name)
+        return f"{base}.{self.digest}{suffix}"
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Совпадает ли тег файла с одним из тегов If-None-Match"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*' or tag.removeprefix('W/') == self.etag[2:]:
+                return True
+        return False
+
+
+class StaticAssets:
+    """Файлы каталога directory по адресам: /имя, /имя.хеш.расширение и /"""
+
+    def __init__(self, directory: str = '.', suffixes=STATIC_SUFFIXES, entry: str = ENTRY):
+        names = sorted(name for name in os.listdir(directory)
+                       if name.endswith(suffixes) and os.path.isfile(os.path.join(directory, name)))
+        bodies = {}
+        for name in names:
+            with open(os.path.join(directory, name), 'rb') as f:
+                bodies[name] = f.read()
+
+        # Сначала файлы, на которые ссылается index.html: их хеши
+        # нужны, чтобы переписать ссылки до хеширования самого index.html
+        self.assets: Dict[str, Asset] = {
+            name: Asset(name, body) for name, body in bodies.items() if name != entry
+        }
+        if entry in bodies:
+            self.assets[entry] = Asset(entry, self.link_hashed(bodies[entry]))
+
+        # Адрес -> (файл, Cache-Control)
+        self.routes = {}
+        for name, asset in self.assets.items():
+            self.routes['/' + name] = (asset, REVALIDATE)
+            if name != entry:
+                self.routes['/' + asset.hashed_name] = (asset, IMMUTABLE)
+        if entry in self.assets:
+            self.routes['/'] = (self.assets[entry], REVALIDATE)
+
+    def link_hashed(self, html: bytes) -> bytes:
+        """HTML, в котором ссылки на известные файлы заменены адресами с хешем"""
+        def replace(match):
+            prefix, relative, name, quote = match.groups()
+            asset = self.assets.get(name)
+            if asset is None:
+                return match.group(0)
+            return f"{prefix}{relative or ''}{asset.hashed_name}{quote}"
+
+        return LINK_ATTRIBUTE.sub(replace, html.decode('utf-8')).encode('utf-8')
+
+    def lookup(self, path: str) -> Optional[tuple]:
+        """(файл, значение Cache-Control) для адреса или None"""
+        return self.routes.get(path)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Размеры вариантов каждого файла в байтах"""
+        return {
+            name: {encoding or 'identity': len(body) for encoding, body in asset.variants.items()}
+            for name, asset in self.assets.items()
+        }
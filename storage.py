@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Интерфейс хранилища состояния пар и питомцев.
+
+PetManager и обработчики API работают с любой реализацией Storage:
+database.Database (SQLite) или memory_storage.MemoryStorage (состояние
+в памяти процесса с журналом операций и снимками на диске).
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from records import Couple, Pet
+
+# Поля питомца, которые можно изменять через modify_pet
+PET_MUTABLE_COLUMNS = frozenset({
+    'hunger', 'happiness', 'energy', 'level', 'experience', 'last_updated',
+})
+
+
+class Storage:
+    """Операции хранилища; пары и питомцы возвращаются записями
+    records.Couple и records.Pet"""
+
+    def create_couple(self, user1_id: int, user2_id: int, user1_name: str, user2_name: str) -> int:
+        raise NotImplementedError
+
+    def get_couple(self, user1_id: int, user2_id: int) -> Optional[Couple]:
+        raise NotImplementedError
+
+    def get_user_couple(self, user_id: int) -> Optional[Couple]:
+        raise NotImplementedError
+
+    def get_couple_by_id(self, couple_id: int) -> Optional[Couple]:
+        raise NotImplementedError
+
+    def update_couple_names(self, couple_id: int, user1_name: str, user2_name: str):
+        raise NotImplementedError
+
+    def create_pet(self, couple_id: int, name: str, pet_type: str) -> int:
+        raise NotImplementedError
+
+    def get_pet(self, couple_id: int) -> Optional[Pet]:
+        raise NotImplementedError
+
+    def iter_pets(self) -> Iterator[Pet]:
+        """Все питомцы по возрастанию id (для начальной загрузки планировщиков)"""
+        raise NotImplementedError
+
+    def update_pet_stats(self, pet_id: int, hunger: int = None, happiness: int = None,
+                         energy: int = None, level: int = None, experience: int = None):
+        raise NotImplementedError
+
+    def modify_pet(self, couple_id: int, mutate: Callable, log_action: tuple = None) -> Any:
+        """Атомарное чтение-изменение-запись питомца пары (см. Database.modify_pet)"""
+        raise NotImplementedError
+
+    def modify_pets(self, items: List[tuple]) -> List[Any]:
+        """modify_pet для списка (couple_id, mutate, log_action) одной транзакцией.
+
+        Элементы применяются по порядку, следующий видит изменения
+        предыдущих; возвращает результаты в том же порядке.
+        """
+        raise NotImplementedError
+
+    def log_action(self, pet_id: int, user_id: int, action_type: str):
+        raise NotImplementedError
+
+    def get_recent_actions(self, pet_id: int, limit: int = 10) -> List[Dict]:
+        raise NotImplementedError
+
+    def get_actions_page(self, pet_id: int, before: tuple = None, limit: int = 50) -> List[Dict]:
+        """Действия питомца от новых к старым, строго раньше ключа
+        before=(timestamp, id) последнего действия предыдущей страницы"""
+        raise NotImplementedError
+
+    def iter_actions(self, pet_id: int, chunk_size: int = 1000) -> Iterator[Dict]:
+        """Вся история действий питомца от новых к старым.
+
+        Читается страницами get_actions_page, поэтому память не зависит
+        от длины истории, а соединение с БД не удерживается между страницами.
+        """
+        before = None
+        while True:
+            page = self.get_actions_page(pet_id, before, chunk_size)
+            yield from page
+            if len(page) < chunk_size:
+                return
+            before = (page[-1]['timestamp'], page[-1]['id'])
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики хранилища для /api/metrics"""
+        raise NotImplementedError
+
+    def close(self):
+        """Освобождение ресурсов при остановке сервера"""
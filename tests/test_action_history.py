@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+История действий: чтение открывает только архивы с действиями питомца
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import action_history
+from action_history import compact_actions, list_archives
+from database import SQL_INSERT_ACTION_AT, Database
+
+
+class ArchivedActionsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.directory, 'test.db'))
+        self.now = datetime(2026, 10, 18, 12, 0, 0)
+        self.old_pet = self.pet_id(self.db.create_couple(1, 2, 'Аня', 'Боря'))
+        self.new_pet = self.pet_id(self.db.create_couple(3, 4, 'Вика', 'Гоша'))
+        self.other_pet = self.pet_id(self.db.create_couple(5, 6, 'Даша', 'Егор'))
+
+        # Действия за три месяца, которые уйдут в архивы: у старого
+        # питомца - в каждом месяце, у другого - только в последнем.
+        # Действия пишутся по возрастанию времени
+        rows = []
+        for days in (100, 70, 40):
+            moment = self.now - timedelta(days=days)
+            rows.append((self.old_pet, 1, 'feed', moment.strftime('%Y-%m-%d %H:%M:%S')))
+        rows.append((self.other_pet, 5, 'pet', rows[-1][3]))
+        self.db._write(lambda conn: conn.executemany(SQL_INSERT_ACTION_AT, rows))
+        self.db.log_action(self.new_pet, 3, 'play')
+
+        compact_actions(self.db, now=self.now, retention_months=None)
+        self.assertEqual(len(list_archives(self.db.db_path)), 3)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def pet_id(self, couple_id: int) -> int:
+        from pet_manager import PetManager
+        PetManager(self.db).create_pet_for_couple(couple_id, 'cat')
+        return self.db.get_pet(couple_id).id
+
+    def test_pet_without_archived_actions_opens_no_archives(self):
+        with mock.patch.object(action_history.sqlite3, 'connect') as connect, \
+                mock.patch.object(action_history.glob, 'glob') as scan:
+            actions = self.db.get_actions_page(self.new_pet, limit=50)
+
+        self.assertEqual([action['action_type'] for action in actions], ['play'])
+        connect.assert_not_called()
+        scan.assert_not_called()
+
+    def test_archived_actions_are_read_without_rescanning(self):
+        # Первое чтение запоминает список архивов
+        self.assertEqual(len(self.db.get_actions_page(self.old_pet, limit=50)), 3)
+
+        with mock.patch.object(action_history.glob, 'glob') as scan:
+            actions = self.db.get_actions_page(self.old_pet, limit=50)
+        scan.assert_not_called()
+        self.assertEqual(len(actions), 3)
+        timestamps = [action['timestamp'] for action in actions]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_only_archives_with_pet_actions_are_opened(self):
+        opened = []
+        connect = action_history.sqlite3.connect
+
+        def counting_connect(path, *args, **kwargs):
+            opened.append(path)
+            return connect(path, *args, **kwargs)
+
+        with mock.patch.object(action_history.sqlite3, 'connect', counting_connect):
+            actions = self.db.get_actions_page(self.other_pet, limit=50)
+
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(len(opened), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
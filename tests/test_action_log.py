@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Режим журнала действий: неизвестный режим - ошибка запуска
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_context import AppContext
+from database import Database
+
+
+class ActionLogModeTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_unknown_mode_rejected_by_database(self):
+        with self.assertRaises(ValueError):
+            Database(self.path, action_log='bufferd')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unknown_env_mode_is_not_demo_mode(self):
+        with mock.patch.dict(os.environ, {'ACTION_LOG_MODE': 'bufferd'}), \
+                self.assertRaises(ValueError):
+            AppContext.create(self.path)
+
+    def test_known_modes(self):
+        for mode in ('sync', 'buffered'):
+            with self.subTest(mode=mode), mock.patch.dict(os.environ, {'ACTION_LOG_MODE': mode}):
+                app = AppContext.create(self.path)
+                try:
+                    self.assertFalse(app.demo_mode)
+                    self.assertEqual(app.db.stats()['action_log']['mode'], mode)
+                finally:
+                    app.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
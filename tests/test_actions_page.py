@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Страницы истории действий: курсор (timestamp, id) и его проверка
+"""
+
+import base64
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_endpoints
+from api_endpoints import APIError
+from app_context import AppContext
+from database import SQL_INSERT_ACTION_AT
+
+
+class ActionsPageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = AppContext.create(os.path.join(self.directory, 'test.db'))
+        self.couple_id = self.app.db.create_couple(1, 2, 'Аня', 'Боря')
+        self.app.pm.create_pet_for_couple(self.couple_id, 'cat')
+        self.pet_id = self.app.db.get_pet(self.couple_id).id
+
+    def tearDown(self):
+        self.app.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def insert(self, timestamps):
+        rows = [(self.pet_id, 1, 'pet', timestamp) for timestamp in timestamps]
+        self.app.db._write(lambda conn: conn.executemany(SQL_INSERT_ACTION_AT, rows))
+
+    def page(self, limit: int, cursor: str = None) -> dict:
+        params = {'couple_id': [str(self.couple_id)], 'limit': [str(limit)]}
+        if cursor is not None:
+            params['cursor'] = [cursor]
+        status, response = api_endpoints.pet_actions(self.app, params, {})
+        self.assertEqual(status, 200)
+        return response
+
+    def all_pages(self, limit: int) -> list:
+        pages = [self.page(limit)]
+        while pages[-1]['next_cursor'] is not None:
+            pages.append(self.page(limit, pages[-1]['next_cursor']))
+        return pages
+
+    def test_same_second_actions_split_across_pages(self):
+        # Семь действий в одну секунду: страницы делятся только по id
+        self.insert(['2026-10-18 12:00:00'] * 7)
+
+        pages = self.all_pages(3)
+        ids = [action['id'] for page in pages for action in page['actions']]
+        self.assertEqual([len(page['actions']) for page in pages], [3, 3, 1])
+        self.assertEqual(len(set(ids)), 7)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_last_page_has_no_cursor(self):
+        self.insert([f'2026-10-18 12:00:0{second}' for second in range(6)])
+
+        # Последняя полная страница не ведет к пустой
+        pages = self.all_pages(3)
+        self.assertEqual([len(page['actions']) for page in pages], [3, 3])
+        self.assertIsNone(self.page(10)['next_cursor'])
+
+    def test_malformed_cursor_is_rejected(self):
+        def encoded(key: bytes) -> str:
+            return base64.urlsafe_b64encode(key).decode('ascii')
+
+        cursors = ['!!!', 'курсор', 'YQ', encoded(b'\xff\xfe|1'), encoded(b'no separator'),
+                   encoded(b'2026-10-18 12:00:00|abc'), encoded(b'2026-10-18 12:00:00| 1_0'),
+                   encoded(b'2026-10-18 12:00:00|-1'), encoded(b'2026-10-18 12:00:00|' + b'9' * 30)]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(APIError) as raised:
+                self.page(3, cursor)
+            self.assertEqual(raised.exception.status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
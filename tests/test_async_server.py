@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Заголовки ответов асинхронного сервера и сервера с потоками совпадают
+"""
+
+import asyncio
+import http.client
+import os
+import sys
+import threading
+import unittest
+from email.utils import parsedate_to_datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_server import MiniAppAPIHandler
+from app_context import AppContext
+from async_api_server import AsyncAPIServer
+from serving import make_server
+
+
+class QuietHandler(MiniAppAPIHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ResponseHeadersTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Демо-режим: маршруты не обращаются к хранилищу
+        cls.app = AppContext()
+
+        cls.httpd = make_server(('127.0.0.1', 0), QuietHandler,
+                                {'mode': 'threaded', 'threads': 2, 'workers': 1})
+        cls.httpd.app = cls.app
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+        cls.loop = asyncio.new_event_loop()
+        cls.server = AsyncAPIServer(cls.app)
+        cls.loop.run_until_complete(cls.server.start('127.0.0.1', 0))
+        cls.async_port = cls.server._server.sockets[0].getsockname()[1]
+        threading.Thread(target=cls.loop.run_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        cls.loop.call_soon_threadsafe(cls.server.close)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+
+    def headers(self, port: int, method: str, path: str) -> dict:
+        client = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        try:
+            client.request(method, path, headers={'Origin': 'https://example.com'})
+            response = client.getresponse()
+            response.read()
+            return {name.lower(): value for name, value in response.getheaders()}
+        finally:
+            client.close()
+
+    def assert_same_headers(self, method: str, path: str):
+        threaded = self.headers(self.httpd.server_address[1], method, path)
+        asynchronous = self.headers(self.async_port, method, path)
+        self.assertIn('date', asynchronous)
+        parsedate_to_datetime(asynchronous['date'])
+        self.assertEqual(asynchronous['server'], threaded['server'])
+        # Keep-alive сервер с потоками сообщает только о закрытии
+        self.assertEqual(set(threaded) - {'connection'}, set(asynchronous) - {'connection'})
+
+    def test_json_response(self):
+        self.assert_same_headers('GET', '/api/health')
+
+    def test_preflight(self):
+        self.assert_same_headers('OPTIONS', '/api/pet')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Сохранение затухания не меняет того, что видят клиенты
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_endpoints
+import pet_manager
+from app_context import AppContext
+from bulk_decay import materialize_decay
+from pet_manager import parse_timestamp
+
+
+class MaterializeDecayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = AppContext.create(os.path.join(self.directory, 'test.db'))
+        self.couple_id = self.app.db.create_couple(1, 2, 'Аня', 'Боря')
+        self.app.pm.create_pet_for_couple(self.couple_id, 'cat')
+        pet = self.app.db.get_pet(self.couple_id)
+        self.now = parse_timestamp(pet['last_updated']) + timedelta(hours=10)
+
+    def tearDown(self):
+        self.app.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def etag(self) -> str:
+        with mock.patch.object(pet_manager, 'utcnow', return_value=self.now):
+            status, response = api_endpoints.get_pet(self.app, {'couple_id': [str(self.couple_id)]}, {})
+        return response.etag
+
+    def test_version_and_etag_unchanged(self):
+        before = self.app.db.get_pet(self.couple_id)
+        etag = self.etag()
+
+        result = materialize_decay(self.app.db, self.now)
+
+        self.assertEqual(result['updated'], 1)
+        after = self.app.db.get_pet(self.couple_id)
+        self.assertLess(after['hunger'], before['hunger'])
+        self.assertEqual(after['version'], before['version'])
+        self.assertEqual(self.etag(), etag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Хранилище в памяти: состояние переживает перезапуск и аварийную остановку
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_endpoints
+from app_context import AppContext
+from memory_storage import MemoryStorage
+from pet_manager import PetManager
+
+
+class MemoryStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'state')
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open(self, **kwargs) -> MemoryStorage:
+        store = MemoryStorage(self.path, **kwargs)
+        self.stores.append(store)
+        return store
+
+    def crash(self, store: MemoryStorage):
+        """Остановка без снимка: файлы закрываются, как при гибели процесса"""
+        self.stores.remove(store)
+        store._log.close()
+        store._lock_file.close()
+
+    def fill(self, store: MemoryStorage) -> int:
+        couple_id = store.create_couple(1, 2, 'Аня', 'Боря')
+        manager = PetManager(store)
+        manager.create_pet_for_couple(couple_id, 'cat', 'Мурка')
+        store.update_couple_names(couple_id, 'Анна', 'Борис')
+        for action in ('feed', 'play', 'pet'):
+            manager.perform_action(couple_id, 1, action)
+        return couple_id
+
+    def state(self, store: MemoryStorage, couple_id: int) -> tuple:
+        pet = store.get_pet(couple_id)
+        return (store.get_couple_by_id(couple_id).to_dict(), pet.to_dict(),
+                store.get_actions_page(pet.id, None, 50))
+
+    def etag(self, store: MemoryStorage, couple_id: int) -> str:
+        app = AppContext(db=store, pm=PetManager(store))
+        status, response = api_endpoints.get_pet(app, {'couple_id': [str(couple_id)]}, {})
+        return response.etag
+
+    def test_reopen_after_close(self):
+        store = self.open()
+        couple_id = self.fill(store)
+        before = self.state(store, couple_id)
+        store.close()
+
+        self.assertEqual(self.state(self.open(), couple_id), before)
+
+    def test_reopen_after_crash_replays_log(self):
+        store = self.open()
+        couple_id = self.fill(store)
+        before = self.state(store, couple_id)
+        self.crash(store)
+
+        reopened = self.open()
+        self.assertEqual(self.state(reopened, couple_id), before)
+        self.assertGreater(reopened.stats()['replayed'], 0)
+
+    def test_torn_last_record_is_skipped(self):
+        store = self.open()
+        couple_id = self.fill(store)
+        before = self.state(store, couple_id)
+        self.crash(store)
+
+        # Запись прервана посреди строки (и посреди символа UTF-8)
+        torn = '[99,[["names",1,"Ан'.encode('utf-8')[:-1]
+        with open(self.path + '.oplog', 'ab') as f:
+            f.write(torn)
+        size = os.path.getsize(self.path + '.oplog')
+
+        reopened = self.open()
+        self.assertEqual(self.state(reopened, couple_id), before)
+        self.assertEqual(os.path.getsize(self.path + '.oplog'), size - len(torn))
+
+        # После обрезки журнал продолжает писаться с целой строки
+        reopened.update_couple_names(couple_id, 'Аня', 'Боря')
+        expected = self.state(reopened, couple_id)
+        self.crash(reopened)
+        self.assertEqual(self.state(self.open(), couple_id), expected)
+
+    def test_versions_and_etags_survive_restart(self):
+        store = self.open()
+        couple_id = self.fill(store)
+        pet_version = store.get_pet(couple_id).version
+        couple_version = store.get_couple_by_id(couple_id).version
+        etag = self.etag(store, couple_id)
+        self.crash(store)
+
+        reopened = self.open()
+        self.assertEqual(reopened.get_pet(couple_id).version, pet_version)
+        self.assertEqual(reopened.get_couple_by_id(couple_id).version, couple_version)
+        self.assertEqual(self.etag(reopened, couple_id), etag)
+        reopened.close()
+
+        self.assertEqual(self.etag(self.open(), couple_id), etag)
+
+    def test_log_is_compacted_after_snapshot(self):
+        store = self.open(snapshot_every=4)
+        couple_id = self.fill(store)
+        before = self.state(store, couple_id)
+
+        # Шесть записей: после четвертой снимок, в журнале остались две
+        stats = store.stats()
+        self.assertEqual(stats['snapshots'], 1)
+        self.assertEqual(stats['log_records'], 2)
+        with open(self.path + '.oplog', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.crash(store)
+
+        reopened = self.open(snapshot_every=4)
+        self.assertEqual(self.state(reopened, couple_id), before)
+        self.assertEqual(reopened.stats()['replayed'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Планировщик уведомлений узнает об изменениях из других процессов
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from notifications import NotificationScheduler, to_epoch
+from pet_manager import PetManager
+
+
+class RecordingSender:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, chat_id: int, text: str):
+        self.messages.append((chat_id, text))
+
+
+class RescanTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.directory, 'test.db'))
+        self.pm = PetManager(self.db)
+        self.couple_id = self.db.create_couple(1, 2, 'Аня', 'Боря')
+        self.pm.create_pet_for_couple(self.couple_id, 'cat')
+        self.pet_id = self.db.get_pet(self.couple_id).id
+        # Все показатели ниже порогов: пересекать больше нечего
+        self.db.update_pet_stats(self.pet_id, hunger=10, happiness=10, energy=10)
+
+        self.now = to_epoch(self.db.get_pet(self.couple_id).last_updated)
+        self.sender = RecordingSender()
+        self.scheduler = NotificationScheduler(self.db, self.pm, self.sender,
+                                               clock=lambda: self.now, rescan_interval=60)
+        self.scheduler.load()
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_pet_changed_elsewhere_is_rescheduled(self):
+        self.assertEqual(self.scheduler.stats()['pending'], 0)
+
+        # Другой процесс кормит питомца: слушатели этого процесса не вызваны
+        self.db.update_pet_stats(self.pet_id, hunger=100, happiness=100, energy=100)
+        self.assertEqual(self.scheduler.rescan(self.now), 1)
+        self.assertEqual(self.scheduler.stats()['pending'], 1)
+
+        # Ничего не изменилось - проход ничего не перепланирует
+        self.assertEqual(self.scheduler.rescan(self.now), 0)
+
+        self.now = self.scheduler.stats()['next_due']
+        self.assertEqual(self.scheduler.tick(self.now), 1)
+        self.assertEqual(len(self.sender.messages), 2)
+
+    def test_rescan_keeps_newer_schedule(self):
+        stale = self.db.get_pet(self.couple_id)
+        self.db.update_pet_stats(self.pet_id, hunger=100, happiness=100, energy=100)
+        self.scheduler.schedule_pet(self.db.get_pet(self.couple_id), self.now)
+        due = self.scheduler.stats()['next_due']
+
+        # Питомец, прочитанный до изменения, не отменяет новый срок
+        self.scheduler.schedule_pet(stale, self.now, keep_existing=True)
+        self.assertEqual(self.scheduler.rescan(self.now), 0)
+        self.assertEqual(self.scheduler.stats()['next_due'], due)
+
+
+if __name__ == '__main__':
+    unittest.main()
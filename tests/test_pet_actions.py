@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Действия с питомцем: одновременные действия не теряют изменений,
+ответ сообщает о повышении уровня
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_endpoints
+import pet_manager
+from app_context import AppContext
+from pet_manager import parse_timestamp
+from rules import RULES
+
+
+class ConcurrentActionsTest(unittest.TestCase):
+    threads = 20
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = AppContext.create(os.path.join(self.directory, 'test.db'))
+        self.couple_id = self.app.db.create_couple(1, 2, 'Аня', 'Боря')
+        self.app.pm.create_pet_for_couple(self.couple_id, 'cat')
+
+    def tearDown(self):
+        self.app.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_parallel_actions_are_all_applied(self):
+        pet = self.app.db.get_pet(self.couple_id)
+        # Время остановлено на момент создания: без затухания счастье
+        # остается 100, и каждое «погладить» дает одинаковый опыт
+        now = parse_timestamp(pet['last_updated'])
+        gain = RULES.experience_gain(RULES.action_codes['pet'], 100)
+
+        barrier = threading.Barrier(self.threads)
+        statuses = []
+
+        def act():
+            barrier.wait()
+            status, response = api_endpoints.pet_action(
+                self.app, {}, {'couple_id': self.couple_id, 'user_id': 1, 'action': 'pet'})
+            statuses.append(status)
+
+        with mock.patch.object(pet_manager, 'utcnow', return_value=now):
+            workers = [threading.Thread(target=act) for _ in range(self.threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(statuses, [200] * self.threads)
+        pet = self.app.db.get_pet(self.couple_id)
+        level, experience = RULES.level_up(1, 0, self.threads * gain)
+        self.assertEqual((pet['level'], pet['experience']), (level, experience))
+        self.assertEqual(pet['version'], self.threads + 1)
+
+        actions = self.app.db.get_actions_page(pet['id'], limit=self.threads + 1)
+        self.assertEqual(len(actions), self.threads)
+
+
+class LastUpdatedFormatTest(unittest.TestCase):
+    def test_created_and_changed_pets_share_format(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        app = AppContext.create(os.path.join(directory, 'test.db'))
+        self.addCleanup(app.close)
+        couple_id = app.db.create_couple(1, 2, 'Аня', 'Боря')
+        app.pm.create_pet_for_couple(couple_id, 'cat')
+
+        created = app.db.get_pet(couple_id)['last_updated']
+        app.pm.perform_action(couple_id, 1, 'pet')
+        changed = app.db.get_pet(couple_id)['last_updated']
+
+        for value in (created, changed):
+            self.assertRegex(value, r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$')
+        self.assertLessEqual(created, changed)
+
+
+class LevelUpResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = AppContext.create(os.path.join(self.directory, 'test.db'))
+        self.couple_id = self.app.db.create_couple(1, 2, 'Аня', 'Боря')
+        self.app.pm.create_pet_for_couple(self.couple_id, 'cat')
+        pet = self.app.db.get_pet(self.couple_id)
+        self.app.db.update_pet_stats(pet['id'], level=1, experience=95)
+
+    def tearDown(self):
+        self.app.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def act(self) -> dict:
+        status, response = api_endpoints.pet_action(
+            self.app, {}, {'couple_id': self.couple_id, 'user_id': 1, 'action': 'pet'})
+        self.assertEqual(status, 200)
+        return response
+
+    def test_one_level(self):
+        response = self.act()
+        self.assertTrue(response['level_up'])
+        self.assertEqual(response['levels_gained'], 1)
+        self.assertEqual(response['pet']['level'], 2)
+
+    def test_several_levels_in_one_action(self):
+        # Действие на 210 опыта и бонус 5 за полное счастье (время
+        # остановлено, затухания нет) поднимают с 95 опыта первого уровня
+        # на третий уровень
+        now = parse_timestamp(self.app.db.get_pet(self.couple_id)['last_updated'])
+        experience = list(RULES.experience)
+        experience[RULES.action_codes['pet']] = 210
+        with mock.patch.object(RULES, 'experience', tuple(experience)), \
+                mock.patch.object(pet_manager, 'utcnow', return_value=now):
+            response = self.act()
+
+        self.assertEqual(response['experience_gain'], 215)
+        self.assertEqual(response['levels_gained'], 2)
+        self.assertEqual((response['pet']['level'], response['pet']['experience']), (3, 10))
+        pet = self.app.db.get_pet(self.couple_id)
+        self.assertEqual((pet['level'], pet['experience']), (3, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Поток изменений питомца: начальное состояние совпадает с GET /api/pet
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_endpoints
+import pet_manager
+from api_endpoints import APIError
+from api_server import configure_event_streams
+from app_context import AppContext
+
+
+def event_data(chunk: bytes) -> dict:
+    """Данные события pet из начала потока"""
+    for line in chunk.decode('utf-8').split('\n'):
+        if line.startswith('data: '):
+            return json.loads(line[len('data: '):])
+    raise AssertionError(f"нет события pet: {chunk!r}")
+
+
+class PetStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = AppContext.create(os.path.join(self.directory, 'test.db'))
+        self.couple_id = self.app.db.create_couple(1, 2, 'Аня', 'Боря')
+        self.app.pm.create_pet_for_couple(self.couple_id, 'cat')
+
+    def tearDown(self):
+        self.app.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_pet(self) -> dict:
+        status, response = api_endpoints.get_pet(self.app, {'couple_id': [str(self.couple_id)]}, {})
+        self.assertEqual(status, 200)
+        return response.build()
+
+    def test_start_event_matches_decayed_pet(self):
+        later = pet_manager.utcnow() + timedelta(hours=10)
+        with mock.patch.object(pet_manager, 'utcnow', return_value=later):
+            pet = self.get_pet()
+            status, stream = api_endpoints.pet_stream(
+                self.app, {'couple_id': [str(self.couple_id)]}, {})
+            try:
+                started = event_data(stream.start())
+            finally:
+                stream.close()
+
+        self.assertEqual(status, 200)
+        self.assertLess(pet['hunger'], 100)
+        for stat in ('hunger', 'happiness', 'energy', 'level', 'experience'):
+            self.assertEqual(started[stat], pet[stat], stat)
+
+    def test_storage_poll_uses_decayed_pet(self):
+        status, stream = api_endpoints.pet_stream(self.app, {'couple_id': [str(self.couple_id)]}, {})
+        try:
+            stream.start()
+            later = pet_manager.utcnow() + timedelta(hours=10)
+            with mock.patch.object(pet_manager, 'utcnow', return_value=later):
+                loaded = stream.load()
+                pet = self.get_pet()
+        finally:
+            stream.close()
+
+        self.assertEqual(loaded.hunger, pet['hunger'])
+
+
+class ThreadedEventStreamsTest(unittest.TestCase):
+    """Потоки событий на сервере с пулом потоков"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = AppContext.create(os.path.join(self.directory, 'test.db'))
+        self.couple_id = self.app.db.create_couple(1, 2, 'Аня', 'Боря')
+        self.app.pm.create_pet_for_couple(self.couple_id, 'cat')
+
+    def tearDown(self):
+        self.app.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def user_events(self) -> bool:
+        status, response = api_endpoints.get_user(self.app, {'user_id': ['1']}, {})
+        return response['events']
+
+    def test_disabled_by_default(self):
+        with mock.patch.dict(os.environ, {'STREAM_THREADED': '0'}):
+            configure_event_streams(self.app, {'mode': 'threaded', 'threads': 16, 'workers': 1})
+
+        self.assertIsNone(self.app.events)
+        self.assertFalse(self.user_events())
+        with self.assertRaises(APIError) as raised:
+            api_endpoints.pet_stream(self.app, {'couple_id': [str(self.couple_id)]}, {})
+        self.assertEqual(raised.exception.status, 503)
+        # Действия работают и без хаба
+        self.app.pm.perform_action(self.couple_id, 1, 'pet')
+
+    def test_enabled_with_half_of_threads(self):
+        with mock.patch.dict(os.environ, {'STREAM_THREADED': '1'}):
+            configure_event_streams(self.app, {'mode': 'threaded', 'threads': 16, 'workers': 1})
+
+        self.assertEqual(self.app.events.max_subscribers, 8)
+        self.assertTrue(self.user_events())
+
+    def test_single_mode_never_enabled(self):
+        with mock.patch.dict(os.environ, {'STREAM_THREADED': '1'}):
+            configure_event_streams(self.app, {'mode': 'single', 'threads': 16, 'workers': 1})
+
+        self.assertIsNone(self.app.events)
+
+
+if __name__ == '__main__':
+    unittest.main()
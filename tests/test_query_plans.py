@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Горячие запросы не просматривают таблицы целиком
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import HOT_QUERIES, Database
+
+
+class QueryPlansTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.directory, 'test.db'))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_hot_queries_use_indexes(self):
+        self.assertEqual(self.db.find_full_scans(), [])
+
+    def test_every_hot_query_is_checked(self):
+        # Каждый запрос по отдельности, чтобы ошибка называла запрос
+        for name in HOT_QUERIES:
+            with self.subTest(query=name):
+                scans = [scan for scan in self.db.find_full_scans() if scan['query'] == name]
+                self.assertEqual(scans, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Игровые правила: опыт за действие и повышение уровня
+"""
+
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rules
+from rules import RULES
+
+
+class LevelUpTest(unittest.TestCase):
+    def test_within_level(self):
+        self.assertEqual(RULES.level_up(1, 10, 20), (1, 30))
+
+    def test_single_level(self):
+        self.assertEqual(RULES.level_up(1, 95, 10), (2, 5))
+
+    def test_several_levels_carry_remainder(self):
+        # 100 опыта до второго уровня и 200 до третьего
+        self.assertEqual(RULES.level_up(1, 95, 215), (3, 10))
+
+    def test_beyond_table(self):
+        small = rules.Rules(table_levels=3)
+        self.assertEqual(small.level_up(5, 0, 500 + 600 + 1), (7, 1))
+        self.assertEqual(small.level_up(1, 95, 215), RULES.level_up(1, 95, 215))
+
+
+class ExperienceGainTest(unittest.TestCase):
+    def rows(self, count: int = 200) -> list:
+        rnd = random.Random(1)
+        return [(rnd.randrange(len(RULES.deltas)), rnd.uniform(0, 100), rnd.uniform(0, 100),
+                 rnd.uniform(0, 100), rnd.randrange(1, 20), rnd.randrange(0, 100))
+                for _ in range(count)]
+
+    def test_evaluate_uses_experience_gain(self):
+        code = RULES.action_codes['pet']
+        self.assertEqual(RULES.evaluate(code, 50, 100, 50, 1, 0)[5],
+                         RULES.experience_gain(code, 100))
+        self.assertEqual(RULES.experience_gain(code, 100), RULES.experience_gain(code, 19) + 5)
+
+    def assert_batch_matches_evaluate(self):
+        rows = self.rows()
+        batch = RULES.evaluate_batch(*zip(*rows))
+        for index, row in enumerate(rows):
+            if not batch['allowed'][index]:
+                self.assertEqual(batch['gain'][index], 0)
+                continue
+            expected = RULES.evaluate(*row)
+            self.assertEqual(batch['gain'][index], RULES.experience_gain(row[0], row[2]))
+            self.assertEqual((batch['level'][index], batch['experience'][index]), expected[3:5])
+
+    @unittest.skipIf(rules.np is None, "numpy не установлен")
+    def test_batch_numpy(self):
+        self.assert_batch_matches_evaluate()
+
+    def test_batch_array(self):
+        with mock.patch.object(rules, 'np', None):
+            self.assert_batch_matches_evaluate()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Постоянные соединения сервера с пулом потоков
+"""
+
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_endpoints
+from api_server import MiniAppAPIHandler, create_app
+from app_context import AppContext
+from serving import make_server
+
+
+class QuietHandler(MiniAppAPIHandler):
+    # Дольше, чем ожидается ответ в тесте: соединения освобождают потоки
+    # не по истечении простоя, а потому что их ждут новые соединения
+    idle_timeout = 10
+
+    def log_message(self, format, *args):
+        pass
+
+
+class IdleKeepAliveTest(unittest.TestCase):
+    threads = 2
+
+    def setUp(self):
+        self.httpd = make_server(('127.0.0.1', 0), QuietHandler,
+                                 {'mode': 'threaded', 'threads': self.threads, 'workers': 1})
+        # Демо-режим: /api/health не обращается к хранилищу
+        self.httpd.app = AppContext()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def request(self, client: http.client.HTTPConnection) -> int:
+        client.request('GET', '/api/health')
+        response = client.getresponse()
+        response.read()
+        return response.status
+
+    def connect(self) -> http.client.HTTPConnection:
+        client = http.client.HTTPConnection('127.0.0.1', self.httpd.server_address[1], timeout=5)
+        self.clients.append(client)
+        return client
+
+    def test_new_request_completes_with_more_idle_clients_than_threads(self):
+        # Каждый клиент после ответа оставляет соединение открытым
+        for _ in range(self.threads * 2):
+            self.assertEqual(self.request(self.connect()), 200)
+
+        started = time.monotonic()
+        self.assertEqual(self.request(self.connect()), 200)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_idle_connection_is_reused_when_pool_is_free(self):
+        client = self.connect()
+        self.assertEqual(self.request(client), 200)
+        sock = client.sock
+        self.assertEqual(self.request(client), 200)
+        self.assertIs(client.sock, sock)
+
+
+class PreforkReadCacheTest(unittest.TestCase):
+    """Процессы prefork пишут в одну БД: кэш одного не должен скрывать
+    изменения другого"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.db')
+        self.apps = []
+
+    def tearDown(self):
+        for app in self.apps:
+            app.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def create(self, mode: str):
+        app = create_app({'mode': mode, 'threads': 4, 'workers': 2}, self.path)
+        self.apps.append(app)
+        return app
+
+    def etag(self, app, couple_id: int) -> str:
+        status, response = api_endpoints.get_pet(app, {'couple_id': [str(couple_id)]}, {})
+        return response.etag
+
+    def test_prefork_workers_see_each_others_writes(self):
+        first, second = self.create('prefork'), self.create('prefork')
+        self.assertFalse(first.db.pet_cache.enabled)
+        self.assertFalse(first.db.couple_cache.enabled)
+
+        couple_id = first.db.create_couple(1, 2, 'Аня', 'Боря')
+        first.pm.create_pet_for_couple(couple_id, 'cat')
+        before = self.etag(second, couple_id)
+        first.pm.perform_action(couple_id, 1, 'pet')
+
+        self.assertNotEqual(self.etag(second, couple_id), before)
+        self.assertEqual(second.db.get_pet(couple_id).version, first.db.get_pet(couple_id).version)
+
+    def test_threaded_keeps_read_cache(self):
+        app = self.create('threaded')
+        self.assertTrue(app.db.pet_cache.enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()